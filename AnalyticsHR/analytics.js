@@ -10,6 +10,8 @@ class HRAnalytics {
             period: '6months',
             view: 'leaves'
         };
+        this.employeeSearchTimer = null;
+        this.employeeSearchSeq = 0;
         this.init();
     }
 
@@ -32,6 +34,12 @@ class HRAnalytics {
             this.refreshData();
         });
         
+        // Typeahead: refill the employee dropdown with the best matches
+        document.getElementById('employeeSearch')?.addEventListener('input', (e) => {
+            clearTimeout(this.employeeSearchTimer);
+            this.employeeSearchTimer = setTimeout(() => this.loadEmployeeSuggestions(e.target.value), 150);
+        });
+        
         document.getElementById('employeeFilter')?.addEventListener('change', (e) => {
             this.currentFilters.employee = e.target.value;
             this.refreshData();
@@ -119,35 +127,50 @@ class HRAnalytics {
             }
         }
 
-        // Update employee dropdown
+        // Employee dropdown: matches for the current search within the department
+        this.loadEmployeeSuggestions(document.getElementById('employeeSearch')?.value || '');
+    }
+
+    async loadEmployeeSuggestions(query) {
         const employeeSelect = document.getElementById('employeeFilter');
-        if (employeeSelect) {
-            // Keep current selection
-            const currentEmployee = employeeSelect.value;
-            
-            // Clear existing options except "All Employees"
-            while (employeeSelect.options.length > 1) {
-                employeeSelect.remove(1);
+        if (!employeeSelect) return;
+
+        // Only the latest request may fill the dropdown
+        const seq = ++this.employeeSearchSeq;
+        try {
+            const params = new URLSearchParams({
+                q: query.trim(),
+                department: this.currentFilters.department,
+                limit: 20
+            });
+            const response = await fetch(`http://127.0.0.1:5000/api/employees/suggest?${params}`, {
+                method: 'GET',
+                credentials: 'include'
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
             }
-            
-            // Add employees from database
-            this.analyticsData.filters.allEmployees.forEach(emp => {
+            const data = await response.json();
+            if (seq !== this.employeeSearchSeq) return;
+
+            // Keep "All Employees" and the current selection, replace the rest
+            const currentEmployee = String(this.currentFilters.employee);
+            Array.from(employeeSelect.options).forEach(option => {
+                if (option.value !== 'all' && option.value !== currentEmployee) {
+                    option.remove();
+                }
+            });
+
+            data.suggestions.forEach(emp => {
+                if (String(emp.user_id) === currentEmployee) return;
                 const option = document.createElement('option');
                 option.value = emp.user_id;
                 option.textContent = `${emp.user_name} (${emp.department_name})`;
                 employeeSelect.appendChild(option);
             });
-            
-            // Restore selection if it still exists
-            if (currentEmployee !== 'all') {
-                const optionExists = Array.from(employeeSelect.options).some(opt => opt.value === currentEmployee);
-                if (optionExists) {
-                    employeeSelect.value = currentEmployee;
-                } else {
-                    employeeSelect.value = 'all';
-                    this.currentFilters.employee = 'all';
-                }
-            }
+            employeeSelect.value = currentEmployee;
+        } catch (error) {
+            console.error('Error loading employee suggestions:', error);
         }
     }
 
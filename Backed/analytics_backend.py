@@ -1,325 +1,139 @@
 from flask import Blueprint, jsonify, session, request
 import mysql.connector
+from database import Query
+from parallel import run_parallel
+from http_caching import conditional
+from cache import cache
+from reference_data import registry
+from leave_index import index as leave_index
 from datetime import datetime, timedelta
+from collections import defaultdict
 import json
 
 analytics_bp = Blueprint('analytics', __name__)
 
-# Database configuration - UPDATE THESE CREDENTIALS
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',      
-    'database': 'dayoffly',
-    'port': 3306
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Look-back window (days) for each period filter; anything else means all time
+PERIOD_DAYS = {
+    '6months': 180,
+    '4quarters': 365,
+    '3years': 1095
 }
 
-def get_db_connection():
-    """Create database connection with better error handling"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        print(f"✅ Database connection successful to {DB_CONFIG['database']}")
-        return conn
-    except mysql.connector.Error as e:
-        print(f"❌ Database connection failed: {e}")
-        print(f"🔧 Connection details: {DB_CONFIG}")
-        return None
+LEAVE_FACT_FROM = """
+    FROM leave_fact lf
+    LEFT JOIN department d ON lf.department_id = d.department_id
+"""
 
-@analytics_bp.route('/hr/analytics-data')
-def get_hr_analytics_data():
-    """Get comprehensive HR analytics data with employee filtering"""
-    
-    print("📊 HR Analytics endpoint called")
+
+def leave_facts_query(conditions, params):
+    """
+    The filtered leave_fact rows in one grouped query.
+    Each row is one (leave_type, status, department, applied month) cell with
+    its request count and total working days.
+    """
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    return Query(f"""
+        SELECT 
+            lf.leave_type,
+            lf.leave_status,
+            d.department_name,
+            lf.applied_month,
+            COUNT(*) as leave_count,
+            SUM(lf.working_days) as total_days
+        {LEAVE_FACT_FROM}
+        {where_clause}
+        GROUP BY lf.leave_type, lf.leave_status, d.department_name, lf.applied_month
+    """, params)
+
+
+def aggregate_leave_facts(fact_rows):
+    """Compute every KPI and chart series from the grouped fact rows in a single pass"""
+    total_leaves = 0
+    approved_leaves = 0
+    approved_days = 0
+    leave_types = defaultdict(int)
+    departments = defaultdict(int)
+    monthly_leaves = [0] * 12
+    month_totals = defaultdict(int)
+    month_approved = defaultdict(int)
+
+    for row in fact_rows:
+        count = row['leave_count']
+        approved = row['leave_status'] == 'approved'
+
+        total_leaves += count
+        leave_types[row['leave_type']] += count
+        if row['department_name'] is not None:
+            departments[row['department_name']] += count
+
+        applied_month = row['applied_month']
+        if applied_month:
+            monthly_leaves[int(applied_month[5:7]) - 1] += count
+            month_totals[applied_month] += count
+
+        if approved:
+            approved_leaves += count
+            approved_days += float(row['total_days'] or 0)
+            if applied_month:
+                month_approved[applied_month] += count
+
+    approval_trend_months = sorted(month_totals)
+    approval_rates = [
+        round(month_approved[month] / month_totals[month] * 100, 1)
+        for month in approval_trend_months
+    ]
+
+    return {
+        'total_leaves': total_leaves,
+        'avg_duration': round(approved_days / approved_leaves, 1) if approved_leaves else 0,
+        'approval_rate': round(approved_leaves / total_leaves * 100, 1) if total_leaves else 0,
+        'leave_types': dict(leave_types),
+        'department_distribution': dict(departments),
+        'monthly_leaves': monthly_leaves,
+        'approval_trend_months': approval_trend_months,
+        'approval_rates': approval_rates
+    }
+
+
+def hr_analytics_queries(department_filter, employee_filter, period_filter):
+    """The independent reads behind the HR analytics page for one filter combination"""
+    # Build WHERE conditions based on filters
+    filter_conditions = []
+    filter_params = []
     
-    # Get filter parameters
-    department_filter = request.args.get('department', 'all')
-    employee_filter = request.args.get('employee', 'all')
-    period_filter = request.args.get('period', '6months')
-    view_filter = request.args.get('view', 'leaves')
+    if employee_filter != 'all':
+        filter_conditions.append("lf.user_id = %s")
+        filter_params.append(employee_filter)
+    elif department_filter != 'all':
+        filter_conditions.append("d.department_name = %s")
+        filter_params.append(department_filter)
     
-    print(f"🔍 Filters - Department: {department_filter}, Employee: {employee_filter}, Period: {period_filter}")
+    # Date range based on period filter
+    period_days = PERIOD_DAYS.get(period_filter)
+    date_conditions = []
+    date_params = []
+    if period_days:
+        date_conditions.append("lf.applied_on >= %s")
+        date_params.append(datetime.now() - timedelta(days=period_days))
     
-    conn = get_db_connection()
-    if not conn:
-        error_msg = f"Database connection failed. Check if MySQL is running and credentials are correct."
-        print(f"❌ {error_msg}")
-        return jsonify({'error': error_msg}), 500
+    today = datetime.now().date()
+    on_leave_conditions = filter_conditions + [
+        "lf.leave_status = 'approved'", "lf.start_date <= %s", "lf.end_date >= %s"
+    ]
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-        print("✅ Database cursor created successfully")
-        
-        # Get all departments for filter dropdown
-        cursor.execute("SELECT department_name FROM department")
-        departments = [dept['department_name'] for dept in cursor.fetchall()]
-        
-        # Get all employees for filter dropdown
-        cursor.execute("""
-            SELECT u.user_id, u.user_name, d.department_name 
-            FROM users_master u 
-            LEFT JOIN department d ON u.department_id = d.department_id 
-            WHERE u.is_active = 1
-            ORDER BY u.user_name
-        """)
-        all_employees = cursor.fetchall()
-        
-        # Build WHERE conditions based on filters
-        where_conditions = []
-        params = []
-        
-        if employee_filter != 'all':
-            where_conditions.append("la.user_id = %s")
-            params.append(employee_filter)
-        elif department_filter != 'all':
-            where_conditions.append("d.department_name = %s")
-            params.append(department_filter)
-        
-        # Date range based on period filter
-        date_condition = ""
-        date_params = []
-        if period_filter == '6months':
-            date_range = datetime.now() - timedelta(days=180)
-            date_condition = " AND la.applied_on >= %s"
-            date_params.append(date_range)
-        elif period_filter == '4quarters':
-            date_range = datetime.now() - timedelta(days=365)
-            date_condition = " AND la.applied_on >= %s"
-            date_params.append(date_range)
-        elif period_filter == '3years':
-            date_range = datetime.now() - timedelta(days=1095)
-            date_condition = " AND la.applied_on >= %s"
-            date_params.append(date_range)
-        
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        # Combine all parameters for the main query
-        all_params = params + date_params
-        
-        # 1. Get total leaves based on filters
-        total_leaves_query = f"""
-            SELECT COUNT(*) as total_leaves 
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} {date_condition}
-        """
-        print(f"🔍 Total leaves query: {total_leaves_query}")
-        print(f"🔍 Parameters: {all_params}")
-        
-        # Handle case where there are no WHERE conditions but we have date params
-        if where_clause == "" and date_condition != "":
-            # Remove the " AND " from date_condition and replace with "WHERE"
-            date_condition = date_condition.replace(" AND ", "WHERE ", 1)
-            total_leaves_query = f"""
-                SELECT COUNT(*) as total_leaves 
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition}
-            """
-        
-        cursor.execute(total_leaves_query, all_params)
-        total_leaves_result = cursor.fetchone()
-        total_leaves = total_leaves_result['total_leaves'] if total_leaves_result else 0
-        
-        # 2. Get average duration
-        avg_duration_query = f"""
-            SELECT AVG(DATEDIFF(la.end_date, la.start_date) + 1) as avg_duration 
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} AND la.leave_status = 'approved' {date_condition}
-        """
-        
-        # Fix avg duration query parameter issue
-        if where_clause == "" and date_condition != "":
-            date_condition_avg = date_condition.replace(" AND ", "WHERE ", 1)
-            avg_duration_query = f"""
-                SELECT AVG(DATEDIFF(la.end_date, la.start_date) + 1) as avg_duration 
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition_avg} AND la.leave_status = 'approved'
-            """
-        
-        cursor.execute(avg_duration_query, all_params)
-        avg_duration_result = cursor.fetchone()
-        avg_duration = round(avg_duration_result['avg_duration'], 1) if avg_duration_result and avg_duration_result['avg_duration'] else 0
-        
-        # 3. Get approval rate
-        approval_query = f"""
-            SELECT 
-                COUNT(*) as total_requests,
-                SUM(CASE WHEN la.leave_status = 'approved' THEN 1 ELSE 0 END) as approved_requests
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} {date_condition}
-        """
-        
-        # Fix approval query parameter issue
-        if where_clause == "" and date_condition != "":
-            date_condition_approval = date_condition.replace(" AND ", "WHERE ", 1)
-            approval_query = f"""
-                SELECT 
-                    COUNT(*) as total_requests,
-                    SUM(CASE WHEN la.leave_status = 'approved' THEN 1 ELSE 0 END) as approved_requests
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition_approval}
-            """
-        
-        cursor.execute(approval_query, all_params)
-        approval_data = cursor.fetchone()
-        if approval_data and approval_data['total_requests'] > 0:
-            approval_rate = round((approval_data['approved_requests'] / approval_data['total_requests']) * 100, 1)
-        else:
-            approval_rate = 0
-        
-        # 4. Get employees on leave now
-        today = datetime.now().date()
-        on_leave_query = f"""
-            SELECT COUNT(DISTINCT la.user_id) as on_leave_now
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} AND la.start_date <= %s AND la.end_date >= %s AND la.leave_status = 'approved'
-        """
-        on_leave_params = params + [today, today]  # Only use filter params, not date params for this query
-        
-        # Fix on leave query parameter issue
-        if where_clause == "":
-            on_leave_query = f"""
-                SELECT COUNT(DISTINCT la.user_id) as on_leave_now
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                WHERE la.start_date <= %s AND la.end_date >= %s AND la.leave_status = 'approved'
-            """
-        
-        cursor.execute(on_leave_query, on_leave_params)
-        on_leave_result = cursor.fetchone()
-        on_leave_now = on_leave_result['on_leave_now'] if on_leave_result else 0
-        
-        # 5. Get leave types distribution
-        leave_types_query = f"""
-            SELECT la.leave_type, COUNT(*) as count
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} {date_condition}
-            GROUP BY la.leave_type
-        """
-        
-        # Fix leave types query parameter issue
-        if where_clause == "" and date_condition != "":
-            date_condition_types = date_condition.replace(" AND ", "WHERE ", 1)
-            leave_types_query = f"""
-                SELECT la.leave_type, COUNT(*) as count
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition_types}
-                GROUP BY la.leave_type
-            """
-        
-        cursor.execute(leave_types_query, all_params)
-        leave_types_data = cursor.fetchall()
-        leave_types_distribution = {item['leave_type']: item['count'] for item in leave_types_data}
-        
-        # 6. Get monthly trends
-        monthly_query = f"""
-            SELECT MONTH(la.applied_on) as month, COUNT(*) as count
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} {date_condition}
-            GROUP BY MONTH(la.applied_on)
-            ORDER BY month
-        """
-        
-        # Fix monthly query parameter issue
-        if where_clause == "" and date_condition != "":
-            date_condition_monthly = date_condition.replace(" AND ", "WHERE ", 1)
-            monthly_query = f"""
-                SELECT MONTH(la.applied_on) as month, COUNT(*) as count
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition_monthly}
-                GROUP BY MONTH(la.applied_on)
-                ORDER BY month
-            """
-        
-        cursor.execute(monthly_query, all_params)
-        monthly_data = cursor.fetchall()
-        
-        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        monthly_leaves = [0] * 12
-        for item in monthly_data:
-            if 1 <= item['month'] <= 12:
-                monthly_leaves[item['month'] - 1] = item['count']
-        
-        # 7. Get department-wise distribution (only when not filtering by employee)
-        department_distribution = {}
-        if employee_filter == 'all':
-            dept_query = """
-                SELECT d.department_name, COUNT(la.leave_id) as leave_count
-                FROM leave_application la
-                JOIN users_master u ON la.user_id = u.user_id
-                JOIN department d ON u.department_id = d.department_id
-                GROUP BY d.department_name
-            """
-            cursor.execute(dept_query)
-            department_data = cursor.fetchall()
-            department_distribution = {item['department_name']: item['leave_count'] for item in department_data}
-        
-        # 8. Get approval trends
-        approval_trends_query = f"""
-            SELECT 
-                DATE_FORMAT(la.applied_on, '%Y-%m') as month,
-                COUNT(*) as total_requests,
-                SUM(CASE WHEN la.leave_status = 'approved' THEN 1 ELSE 0 END) as approved_requests
-            FROM leave_application la
-            LEFT JOIN users_master u ON la.user_id = u.user_id
-            LEFT JOIN department d ON u.department_id = d.department_id
-            {where_clause} {date_condition}
-            GROUP BY DATE_FORMAT(la.applied_on, '%Y-%m')
-            ORDER BY month
-        """
-        
-        # Fix approval trends query parameter issue
-        if where_clause == "" and date_condition != "":
-            date_condition_trends = date_condition.replace(" AND ", "WHERE ", 1)
-            approval_trends_query = f"""
-                SELECT 
-                    DATE_FORMAT(la.applied_on, '%Y-%m') as month,
-                    COUNT(*) as total_requests,
-                    SUM(CASE WHEN la.leave_status = 'approved' THEN 1 ELSE 0 END) as approved_requests
-                FROM leave_application la
-                LEFT JOIN users_master u ON la.user_id = u.user_id
-                LEFT JOIN department d ON u.department_id = d.department_id
-                {date_condition_trends}
-                GROUP BY DATE_FORMAT(la.applied_on, '%Y-%m')
-                ORDER BY month
-            """
-        
-        cursor.execute(approval_trends_query, all_params)
-        approval_trends_data = cursor.fetchall()
-        
-        approval_trends_months = []
-        approval_rates = []
-        for item in approval_trends_data:
-            approval_trends_months.append(item['month'])
-            if item['total_requests'] > 0:
-                rate = round((item['approved_requests'] / item['total_requests']) * 100, 1)
-            else:
-                rate = 0
-            approval_rates.append(rate)
-        
-        # 9. Get employee leave summary
-        employee_summary_query = """
+    return {
+        # 1. The filtered leave facts, pre-grouped on every dimension the KPIs and charts need
+        'fact_rows': leave_facts_query(filter_conditions + date_conditions, filter_params + date_params),
+        # 2. Employees on leave now (respects employee/department filter, not the period)
+        'on_leave': Query(f"""
+            SELECT COUNT(DISTINCT lf.user_id) as on_leave_now
+            {LEAVE_FACT_FROM}
+            WHERE {' AND '.join(on_leave_conditions)}
+        """, filter_params + [today, today], one=True),
+        # 3. Employee leave summary
+        'employee_summary': Query("""
             SELECT 
                 u.user_id,
                 u.user_name,
@@ -337,46 +151,112 @@ def get_hr_analytics_data():
             LEFT JOIN leave_balance lb ON u.user_id = lb.user_id
             WHERE u.is_active = 1
             ORDER BY u.user_name
-        """
-        cursor.execute(employee_summary_query)
-        employee_summary = cursor.fetchall()
-        
-        # Format employee data
-        formatted_employees = []
-        for emp in employee_summary:
-            formatted_employees.append({
-                'employee': emp['user_name'],
-                'department': emp['department_name'],
-                'leavesTaken': emp['used_leaves'],
-                'remainingBalance': emp['remaining_leaves'],
-                'utilizationRate': emp['utilization_rate']
-            })
-        
-        analytics_data = {
-            'summary': {
-                'totalLeaves': total_leaves,
-                'avgDuration': avg_duration,
-                'approvalRate': approval_rate,
-                'onLeaveNow': on_leave_now
-            },
-            'charts': {
-                'leaveTypes': leave_types_distribution,
-                'monthlyTrends': {
-                    'months': months,
-                    'leaves': monthly_leaves
-                },
-                'departmentDistribution': department_distribution,
-                'approvalTrends': {
-                    'months': approval_trends_months,
-                    'rates': approval_rates
-                }
+        """)
+    }
+
+
+def indexed_on_leave(department_filter, employee_filter):
+    """The 'on_leave' result from the interval index, or None to run the SQL query"""
+    if employee_filter != 'all':
+        on_leave_ids = leave_index.users_on_leave()
+        if on_leave_ids is None or not employee_filter.isdigit():
+            return None
+        return {'on_leave_now': int(int(employee_filter) in on_leave_ids)}
+    
+    department_id = None
+    if department_filter != 'all':
+        department_id = registry.department_id(department_filter)
+        if department_id is None:
+            return {'on_leave_now': 0}
+    on_leave_ids = leave_index.users_on_leave(department_id=department_id)
+    return None if on_leave_ids is None else {'on_leave_now': len(on_leave_ids)}
+
+
+def build_hr_analytics(results, departments, employee_filter):
+    """Shape the query results into the HR analytics payload"""
+    # Roll the grouped fact rows up in a single pass
+    aggregates = aggregate_leave_facts(results['fact_rows'])
+    
+    on_leave_result = results['on_leave']
+    on_leave_now = on_leave_result['on_leave_now'] if on_leave_result else 0
+    
+    # Format employee data
+    formatted_employees = []
+    for emp in results['employee_summary']:
+        formatted_employees.append({
+            'employee': emp['user_name'],
+            'department': emp['department_name'],
+            'leavesTaken': emp['used_leaves'],
+            'remainingBalance': emp['remaining_leaves'],
+            'utilizationRate': emp['utilization_rate']
+        })
+    
+    # Department-wise distribution (only when not filtering by employee)
+    department_distribution = aggregates['department_distribution'] if employee_filter == 'all' else {}
+    
+    return {
+        'summary': {
+            'totalLeaves': aggregates['total_leaves'],
+            'avgDuration': aggregates['avg_duration'],
+            'approvalRate': aggregates['approval_rate'],
+            'onLeaveNow': on_leave_now
+        },
+        'charts': {
+            'leaveTypes': aggregates['leave_types'],
+            'monthlyTrends': {
+                'months': MONTHS,
+                'leaves': aggregates['monthly_leaves']
             },
-            'employees': formatted_employees,
-            'filters': {
-                'departments': departments,
-                'allEmployees': all_employees
+            'departmentDistribution': department_distribution,
+            'approvalTrends': {
+                'months': aggregates['approval_trend_months'],
+                'rates': aggregates['approval_rates']
             }
+        },
+        'employees': formatted_employees,
+        # The employee picker queries /api/employees/suggest
+        'filters': {
+            'departments': departments
         }
+    }
+
+
+@analytics_bp.route('/hr/analytics-data')
+@conditional
+def get_hr_analytics_data():
+    """Get comprehensive HR analytics data with employee filtering"""
+    
+    print("📊 HR Analytics endpoint called")
+    
+    # Get filter parameters
+    department_filter = request.args.get('department', 'all')
+    employee_filter = request.args.get('employee', 'all')
+    period_filter = request.args.get('period', '6months')
+    view_filter = request.args.get('view', 'leaves')
+    
+    print(f"🔍 Filters - Department: {department_filter}, Employee: {employee_filter}, Period: {period_filter}")
+    
+    # Results are shared between HR users until the next leave/user write
+    cache_key = f"hr:{department_filter}:{employee_filter}:{period_filter}"
+    analytics_data = cache.get('analytics', cache_key)
+    if analytics_data is not None:
+        return jsonify(analytics_data)
+    
+    try:
+        # Get all departments for filter dropdown
+        departments = [dept['name'] for dept in registry.departments()]
+        
+        # Facts, on-leave count and employee summary are independent - run them side by side
+        queries = hr_analytics_queries(department_filter, employee_filter, period_filter)
+        on_leave = indexed_on_leave(department_filter, employee_filter)
+        if on_leave is not None:
+            del queries['on_leave']
+        results = run_parallel(queries)
+        if on_leave is not None:
+            results['on_leave'] = on_leave
+        analytics_data = build_hr_analytics(results, departments, employee_filter)
+        
+        cache.set('analytics', cache_key, analytics_data)
         
         print("✅ Analytics data prepared successfully")
         return jsonify(analytics_data)
@@ -387,8 +267,3 @@ def get_hr_analytics_data():
         import traceback
         print(f"🔍 Full traceback: {traceback.format_exc()}")
         return jsonify({'error': error_msg}), 500
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        conn.close()
-        print("✅ Database connection closed")
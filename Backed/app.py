@@ -1,9 +1,22 @@
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for
 import mysql.connector
 import os
-from datetime import datetime, date
+from datetime import datetime, date, timedelta
 import json
 from flask_cors import CORS  
+import database
+import reference_data
+import leave_index
+import http_caching
+import business_days
+import leave_facts
+import employee_directory
+import report_export
+from database import get_db_connection, pool_metrics
+from cache import cache
+from reference_data import registry
+from business_days import business_days as business_calendar
+from streaming import ExportBusy, export_format, stream_export
 
 # all the Imports for blueprints
 
@@ -15,6 +28,9 @@ from analytics_backend import analytics_bp
 from employeeHR import employee_bp
 from settingsHR_backend import settingsHR_bp
 from reports_analytics_backendEmployee import reports_analytics_bp
+from events import events_bp
+from calendar_backend import calendar_bp
+from leave_application_backend import leave_application_bp
 
 
 print("=== DayOffly Flask Application Starting ===")
@@ -23,12 +39,15 @@ print("Current directory:", os.getcwd())
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-here'
 
+# Frontend origins allowed to call the API with cookies (also used by asgi.py)
+CORS_ORIGINS = ["http://localhost:5000", "http://127.0.0.1:5000", 
+                "http://127.0.0.1:5500", "http://localhost:5500",
+                "http://127.0.0.1:3000", "http://localhost:3000"]
+
 # In app.py - update CORS configuration
 CORS(app, 
      supports_credentials=True, 
-     origins=["http://localhost:5000", "http://127.0.0.1:5000", 
-              "http://127.0.0.1:5500", "http://localhost:5500",
-              "http://127.0.0.1:3000", "http://localhost:3000"],
+     origins=CORS_ORIGINS,
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
      allow_headers=["Content-Type", "Authorization", "X-Requested-With"],
      expose_headers=["Set-Cookie"])
@@ -44,25 +63,34 @@ app.register_blueprint(analytics_bp)
 app.register_blueprint(employee_bp)
 app.register_blueprint(settingsHR_bp)
 app.register_blueprint(reports_analytics_bp)
+app.register_blueprint(events_bp)
+app.register_blueprint(calendar_bp)
+app.register_blueprint(leave_application_bp)
+
+# Hand pooled connections back at the end of every request
+database.init_app(app)
+
+# Load department/role/leave type lookups once per worker
+reference_data.init_app(app)
+
+# Interval index of approved leaves for "who is on leave" checks
+leave_index.init_app(app)
+
+# Prefix tries for the employee pickers (/api/employees/suggest)
+employee_directory.init_app(app)
+
+# Working-day calendar (weekends + holidays table) for leave durations
+business_days.init_app(app)
+
+# Working days of leave facts loaded without them (the SQL dump)
+leave_facts.init_app(app)
+
+# Report directory for the PDF/XLSX analytics exports
+report_export.init_app(app)
+
+# gzip/brotli for large JSON and page responses
+http_caching.init_app(app)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',      
-    'database': 'dayoffly',
-    'port': 3306
-}
-
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        print("✓ Database connected successfully")
-        return conn
-    except mysql.connector.Error as e:
-        print(f"✗ Database connection failed: {e}")
-        return None
 
 # Add these API routes to app.py to handle the missing endpoints
 @app.route('/api/employees')
@@ -95,11 +123,29 @@ def api_add_employee():
     """API endpoint to add employee - redirect to blueprint"""
     return employee_bp.add_employee()
 
+def current_user_id():
+    """user_id of the logged-in session user (falls back to the demo employee)"""
+    return session.get('user', {}).get('user_id', 30002)
+
 def get_dashboard_data(user_id=30002):
-    """Get dashboard data from database"""
+    """Get dashboard data, served from the per-user cache when possible"""
+    dashboard_data = cache.get('dashboard', user_id)
+    if dashboard_data is not None:
+        return dashboard_data
+
+    dashboard_data = load_dashboard_data(user_id)
+    if dashboard_data is None:
+        # Mock data is never cached so the next request retries the database
+        return get_mock_data()
+
+    cache.set('dashboard', user_id, dashboard_data)
+    return dashboard_data
+
+def load_dashboard_data(user_id):
+    """Load dashboard data from database; returns None if it cannot be loaded"""
     conn = get_db_connection()
     if not conn:
-        return get_mock_data()
+        return None
     
     try: 
         cursor = conn.cursor(dictionary=True)
@@ -135,16 +181,11 @@ def get_dashboard_data(user_id=30002):
             total_used = 15
             total_remaining = 5
         
-        # Holidays data
-        holidays = [
-            {"name": "Republic Day", "date": "2024-01-26"},
-            {"name": "Holi", "date": "2024-03-25"},
-            {"name": "Independence Day", "date": "2024-08-15"},
-            {"name": "Diwali", "date": "2024-11-12"}
-        ]
-        
+        # Holidays of the employee's region, this year and the next 12 months
+        region = registry.department_region(registry.department_id(user_info.get('department_name')))
         today = date.today()
-        upcoming_holidays_count = sum(1 for h in holidays if datetime.strptime(h['date'], '%Y-%m-%d').date() >= today)
+        holidays = business_calendar.holidays(date(today.year, 1, 1), today + timedelta(days=365), region)
+        upcoming_holidays_count = sum(1 for h in holidays if h['date'] >= today.isoformat())
         
         # Chart data - Simple dynamic approach
         months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
@@ -171,10 +212,19 @@ def get_dashboard_data(user_id=30002):
                 if month_index < 12:
                     leaves_taken[month_index] = record['leaves_count']
             
-            # Calculate days present (simplified)
-            working_days_per_month = 22
-            for i in range(12):
-                days_present[i] = working_days_per_month - leaves_taken[i]
+            # Days present: the month's working days minus the working days on approved leave
+            year_start, year_end = date(today.year, 1, 1), date(today.year, 12, 31)
+            cursor.execute("""
+                SELECT start_date, end_date
+                FROM leave_fact
+                WHERE user_id = %s AND leave_status = 'approved'
+                    AND start_date <= %s AND end_date >= %s
+            """, (user_id, year_end, year_start))
+            leave_spans = [(row['start_date'], row['end_date']) for row in cursor.fetchall()]
+            work_calendar = business_calendar.calendar(region, year_start, year_end)
+            working_days = work_calendar.working_days_per_month(today.year)
+            leave_days = work_calendar.working_days_per_month(today.year, leave_spans)
+            days_present = [working - away for working, away in zip(working_days, leave_days)]
                 
             print("✓ Dynamic chart data loaded successfully")
             
@@ -205,7 +255,7 @@ def get_dashboard_data(user_id=30002):
         
     except Exception as e:
         print(f"✗ Error loading dashboard data: {e}")
-        return get_mock_data()
+        return None
     finally:
         if 'cursor' in locals():
             cursor.close()
@@ -213,20 +263,17 @@ def get_dashboard_data(user_id=30002):
 
 def get_mock_data():
     """Return mock data if database fails"""
+    # Last loaded holiday calendar (weekends only if it never loaded)
+    holidays = business_calendar.upcoming_holidays()
     return {
         "user_info": {"user_name": "Jane Austen", "designation": "Web Developer"},
-        "stats": {"totalAllowed": 20, "totalUsed": 15, "totalRemaining": 5, "upcomingHolidays": 4},
+        "stats": {"totalAllowed": 20, "totalUsed": 15, "totalRemaining": 5, "upcomingHolidays": len(holidays)},
         "chartData": {
             "months": ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"],
             "leavesTaken": [2, 3, 1, 4, 2, 3, 1, 2, 3, 2, 1, 0],
             "daysPresent": [20, 19, 21, 18, 20, 19, 21, 20, 19, 20, 21, 22]
         },
-        "holidays": [
-            {"name": "Republic Day", "date": "2024-01-26"},
-            {"name": "Holi", "date": "2024-03-25"},
-            {"name": "Independence Day", "date": "2024-08-15"},
-            {"name": "Diwali", "date": "2024-11-12"}
-        ]
+        "holidays": holidays
     }
 
 def get_leave_status_data(user_id=30002):
@@ -419,7 +466,7 @@ def dashboard():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
+    dashboard_data = get_dashboard_data(current_user_id())
     return render_template('EmployeeDashboard.html', 
                          dashboard_data=dashboard_data,
                          user_info=dashboard_data['user_info'])
@@ -434,7 +481,7 @@ def employee_dashboard():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
+    dashboard_data = get_dashboard_data(current_user_id())
     return render_template('EmployeeDashboard/EmployeeDashboard.html', 
                            dashboard_data=dashboard_data,
                            user_info=dashboard_data['user_info'])
@@ -444,7 +491,7 @@ def leave_application():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
+    dashboard_data = get_dashboard_data(current_user_id())
     return render_template('leaveapplication.html',
                          user_info=dashboard_data['user_info'])
 
@@ -453,7 +500,7 @@ def calendar():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
+    dashboard_data = get_dashboard_data(current_user_id())
     return render_template('calendar.html',
                          user_info=dashboard_data['user_info'])
 
@@ -462,7 +509,7 @@ def reports_analytics():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
+    dashboard_data = get_dashboard_data(current_user_id())
     return render_template('report&analytics.html',
                          user_info=dashboard_data['user_info'])
     
@@ -486,8 +533,8 @@ def leave_status():
     if 'logged_in' not in session or not session['logged_in']:
         return redirect('/login-page')
     
-    dashboard_data = get_dashboard_data()
-    leave_status_data = get_leave_status_data()
+    dashboard_data = get_dashboard_data(current_user_id())
+    leave_status_data = get_leave_status_data(current_user_id())
     
     # Convert data to JSON for JavaScript
     leave_status_json = json.dumps(leave_status_data)
@@ -512,7 +559,18 @@ def hr_leave_requests_page():
     
 @app.route('/debug/all-leave-requests')
 def debug_all_leave_requests():
-    """Debug route to check all leave requests"""
+    """Debug route to check all leave requests (?format=ndjson|csv streams them instead)"""
+    try:
+        fmt = export_format(request.args)
+        if fmt:
+            return stream_export("SELECT * FROM leave_application ORDER BY leave_id", (), fmt, 'all-leave-requests')
+    except ValueError as e:
+        return f"Error: {e}", 400
+    except ExportBusy as e:
+        return f"Error: {e}", 429
+    except mysql.connector.Error as e:
+        return f"Error: {e}", 500
+
     conn = get_db_connection()
     if not conn:
         return "Database connection failed"
@@ -562,6 +620,33 @@ def hr_dashboard():
     
     return render_template('HRDashboard.html')
 
+# Connection pool metrics
+@app.route('/debug/db-pool')
+def debug_db_pool():
+    """Report connection pool usage (in-use, waiters, checkout latency)"""
+    return jsonify(pool_metrics())
+
+# Cache metrics
+@app.route('/debug/cache')
+def debug_cache():
+    """Report cache backend, namespace versions and hit/miss counters"""
+    return jsonify(cache.stats())
+
+@app.route('/debug/leave-index')
+def debug_leave_index():
+    """Report the size and change log position of this worker's leave index"""
+    return jsonify(leave_index.index.stats())
+
+@app.route('/debug/employee-directory')
+def debug_employee_directory():
+    """Report the size and version of this worker's employee picker tries"""
+    return jsonify(employee_directory.directory.stats())
+
+@app.route('/debug/report-exports')
+def debug_report_exports():
+    """Report the export formats available and this worker's export jobs"""
+    return jsonify(report_export.reports.stats())
+
 # Debug route to check database connection
 @app.route('/debug-leave-data')
 def debug_leave_data():
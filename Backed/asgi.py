@@ -0,0 +1,179 @@
+# asgi.py - Async serving mode
+#
+# The I/O-bound analytics endpoints run as Quart (async Flask) views on the
+# aiomysql pool in asyncdb.py: each handler issues its independent queries
+# together with asyncio.gather, and one worker multiplexes many requests while
+# they wait on MySQL. Every other path is handed to the unchanged Flask app
+# through asgiref's WSGI adapter, so both apps share the session cookie, the
+# cache, ETags and compression rules. Cache and ETag calls block (the version
+# counters live in MySQL or Redis), so the async views run them in threads.
+#
+#   hypercorn asgi:application --workers 4 --bind 0.0.0.0:5000
+#   uvicorn asgi:application --workers 4 --port 5000
+#
+# The sync mode (python app.py, gunicorn app:app, serve.py) is unchanged.
+# Requires the optional quart, asgiref and aiomysql packages.
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+from quart import Quart, jsonify, request, session
+import asyncdb
+from app import app as flask_app, CORS_ORIGINS
+from analytics_backend import hr_analytics_queries, build_hr_analytics, indexed_on_leave
+from reports_analytics_backendEmployee import user_analytics_queries, build_user_analytics
+from http_caching import etag_for, etag_matches, compress_body, COMPRESSIBLE_MIMETYPES
+from reference_data import registry
+from cache import cache
+
+# Paths served by the async app; everything else goes to Flask
+ASYNC_PATH_PREFIXES = ('/api/user-analytics/', '/hr/analytics-data', '/debug/async-pool')
+
+quart_app = Quart(__name__)
+# Same key and cookie format as Flask, so sessions from /login work here
+quart_app.secret_key = flask_app.secret_key
+
+
+@quart_app.before_serving
+async def open_pool():
+    await asyncdb.init_pool()
+
+
+@quart_app.after_serving
+async def close_pool():
+    await asyncdb.close_pool()
+
+
+def _session_user_id():
+    return session.get('user', {}).get('user_id', '')
+
+
+async def _conditional_json(load):
+    """
+    Async counterpart of http_caching.conditional: 304 when the ETag still
+    matches, otherwise the JSON from load() (a coroutine returning
+    (payload, status)), compressed when the client accepts it.
+    """
+    try:
+        # The cache version reads behind the ETag may wait on the counter
+        # database or Redis, so they run off the event loop like the other cache calls
+        etag = await asyncio.to_thread(etag_for, request.path, request.query_string.decode(), _session_user_id())
+    except Exception as e:
+        print(f"⚠ ETag unavailable: {e}")
+        etag = None
+
+    if etag and etag_matches(request.if_none_match, etag):
+        response = quart_app.response_class('', status=304)
+    else:
+        payload, status = await load()
+        response = jsonify(payload)
+        response.status_code = status
+        if status != 200:
+            return response
+
+        if response.mimetype in COMPRESSIBLE_MIMETYPES:
+            response.vary.add('Accept-Encoding')
+            data, encoding = compress_body(await response.get_data(), request.headers.get('Accept-Encoding', ''))
+            if encoding is not None:
+                response.set_data(data)
+                response.headers['Content-Encoding'] = encoding
+                etag = f"{etag}-{encoding}" if etag else etag
+
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+    return response
+
+
+@quart_app.route('/api/user-analytics/<int:user_id>')
+async def get_user_analytics(user_id):
+    """Async /api/user-analytics/<id>: the eight reads run concurrently"""
+    if 'logged_in' not in session or not session['logged_in']:
+        return jsonify({'error': 'Authentication required'}), 401
+    if _session_user_id() != user_id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    async def load():
+        try:
+            analytics_data = await asyncio.to_thread(cache.get, 'analytics', f"user:{user_id}")
+            if analytics_data is not None:
+                return analytics_data, 200
+
+            results = await asyncdb.run_queries(user_analytics_queries(user_id))
+            analytics_data = build_user_analytics(user_id, results)
+            if analytics_data is None:
+                return {'error': 'User not found'}, 404
+
+            await asyncio.to_thread(cache.set, 'analytics', f"user:{user_id}", analytics_data)
+            return analytics_data, 200
+        except Exception as e:
+            print(f"✗ Error in async get_user_analytics: {e}")
+            return {'error': 'Failed to load analytics data'}, 500
+
+    return await _conditional_json(load)
+
+
+@quart_app.route('/hr/analytics-data')
+async def get_hr_analytics_data():
+    """Async /hr/analytics-data: facts, on-leave count and employee summary run concurrently"""
+    department_filter = request.args.get('department', 'all')
+    employee_filter = request.args.get('employee', 'all')
+    period_filter = request.args.get('period', '6months')
+
+    async def load():
+        cache_key = f"hr:{department_filter}:{employee_filter}:{period_filter}"
+        try:
+            analytics_data = await asyncio.to_thread(cache.get, 'analytics', cache_key)
+            if analytics_data is not None:
+                return analytics_data, 200
+
+            # The registry and the leave index may reload from MySQL (blocking),
+            # so keep them off the event loop
+            departments, on_leave = await asyncio.gather(
+                asyncio.to_thread(lambda: [dept['name'] for dept in registry.departments()]),
+                asyncio.to_thread(indexed_on_leave, department_filter, employee_filter)
+            )
+            queries = hr_analytics_queries(department_filter, employee_filter, period_filter)
+            if on_leave is not None:
+                del queries['on_leave']
+            results = await asyncdb.run_queries(queries)
+            if on_leave is not None:
+                results['on_leave'] = on_leave
+            analytics_data = build_hr_analytics(results, departments, employee_filter)
+
+            await asyncio.to_thread(cache.set, 'analytics', cache_key, analytics_data)
+            return analytics_data, 200
+        except Exception as e:
+            print(f"❌ Error loading HR analytics data (async): {e}")
+            return {'error': f"Error loading HR analytics data: {e}"}, 500
+
+    return await _conditional_json(load)
+
+
+@quart_app.route('/debug/async-pool')
+async def async_pool_status():
+    return jsonify(asyncdb.pool_metrics())
+
+
+@quart_app.after_request
+async def add_cors_headers(response):
+    """Same CORS policy as the Flask app (flask_cors) for the async routes"""
+    origin = request.headers.get('Origin')
+    if origin in CORS_ORIGINS:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Credentials'] = 'true'
+        response.headers['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+        response.headers['Access-Control-Allow-Headers'] = 'Content-Type, Authorization, X-Requested-With'
+        response.vary.add('Origin')
+    return response
+
+
+wsgi_fallback = WsgiToAsgi(flask_app)
+
+
+async def application(scope, receive, send):
+    """ASGI entry point: async routes to Quart, everything else to Flask"""
+    if scope['type'] == 'lifespan' or (
+            scope['type'] == 'http' and scope['path'].startswith(ASYNC_PATH_PREFIXES)):
+        await quart_app(scope, receive, send)
+    else:
+        await wsgi_fallback(scope, receive, send)
@@ -0,0 +1,83 @@
+# asyncdb.py - asyncio MySQL pool for the async request path (asgi.py)
+#
+# Runs the same database.Query specs as the sync views, but each query gets
+# its own pooled connection so the independent reads of one handler are in
+# flight together and a worker can interleave many requests while they wait
+# on MySQL. Requires the optional `aiomysql` package.
+import asyncio
+import os
+from database import DB_CONFIG
+
+try:
+    import aiomysql
+except ImportError:
+    aiomysql = None
+
+ASYNC_POOL_CONFIG = {
+    'minsize': int(os.environ.get('DAYOFFLY_ASYNC_POOL_MIN', 2)),
+    'maxsize': int(os.environ.get('DAYOFFLY_ASYNC_POOL_SIZE', 20)),
+    'checkout_timeout': float(os.environ.get('DAYOFFLY_DB_CHECKOUT_TIMEOUT', 5))
+}
+
+_pool = None
+
+
+async def init_pool():
+    """Open the pool; called once per worker at startup"""
+    global _pool
+    if aiomysql is None:
+        raise RuntimeError("The aiomysql package is required for the async server")
+    if _pool is None:
+        _pool = await aiomysql.create_pool(
+            host=DB_CONFIG['host'],
+            port=DB_CONFIG['port'],
+            user=DB_CONFIG['user'],
+            password=DB_CONFIG['password'],
+            db=DB_CONFIG['database'],
+            minsize=ASYNC_POOL_CONFIG['minsize'],
+            maxsize=ASYNC_POOL_CONFIG['maxsize'],
+            # Reads only; autocommit keeps pooled connections off stale snapshots
+            autocommit=True,
+            pool_recycle=3600
+        )
+        print(f"✓ Async database pool ready (max {ASYNC_POOL_CONFIG['maxsize']} connections)")
+    return _pool
+
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        await _pool.wait_closed()
+        _pool = None
+
+
+async def fetch(query):
+    """Run one Query on its own pooled connection"""
+    pool = _pool or await init_pool()
+    conn = await asyncio.wait_for(pool.acquire(), ASYNC_POOL_CONFIG['checkout_timeout'])
+    try:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query.sql, query.params)
+            return await cursor.fetchone() if query.one else await cursor.fetchall()
+    finally:
+        pool.release(conn)
+
+
+async def run_queries(queries):
+    """Async counterpart of database.run_queries: all queries run concurrently"""
+    names = list(queries)
+    rows = await asyncio.gather(*(fetch(queries[name]) for name in names))
+    return dict(zip(names, rows))
+
+
+def pool_metrics():
+    if _pool is None:
+        return {'open': 0}
+    return {
+        'minsize': _pool.minsize,
+        'maxsize': _pool.maxsize,
+        'open': _pool.size,
+        'idle': _pool.freesize,
+        'in_use': _pool.size - _pool.freesize
+    }
@@ -0,0 +1,220 @@
+# business_days.py - Holiday calendar and working-day counts
+#
+# Leave durations are charged in working days: weekdays that are not a public
+# holiday of the employee's region (department.region, holidays table).
+#
+# Every worker keeps one BusinessCalendar per region covering whole years
+# around today: a bitmap of working days and its prefix sums, so the working
+# days in [start, end] are cumulative[end + 1] - cumulative[start] - O(1) for
+# one leave, and a single vectorized gather for a whole batch when NumPy is
+# installed (plain lists otherwise). Calendars are rebuilt when the cache
+# 'reference' version moves (cache.invalidate_reference_data) or after
+# CALENDAR_REFRESH seconds, and widened on demand for dates outside their span.
+# Request dates are checked against SUPPORTED_YEARS first (check_supported),
+# so a far-off year cannot widen a calendar to millions of days.
+import os
+import threading
+import time
+from datetime import date, timedelta
+import mysql.connector
+from cache import cache
+from database import connection
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+DEFAULT_REGION = os.environ.get('DAYOFFLY_HOLIDAY_REGION', 'IN')
+WEEKEND = (5, 6)            # date.weekday(): Saturday, Sunday
+YEARS_BEFORE = 5            # default span: this year -5 .. +2
+YEARS_AFTER = 2
+CALENDAR_REFRESH = 300      # seconds
+SUPPORTED_YEARS = 10        # requests may ask about this year -10 .. +10
+
+
+class BusinessCalendar:
+    """Working-day bitmap and prefix sums for one region over whole years"""
+
+    def __init__(self, region, first_year, last_year, holidays=(), version=0):
+        self.region = region
+        self.first = date(first_year, 1, 1)
+        self.last = date(last_year, 12, 31)
+        self.base = self.first.toordinal()
+        self.holidays = sorted(holidays, key=lambda holiday: holiday['date'])
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+        holiday_dates = {holiday['date'] for holiday in self.holidays}
+        size = self.last.toordinal() - self.base + 1
+        working = []
+        cumulative = [0]
+        day = self.first
+        for _ in range(size):
+            is_working = day.weekday() not in WEEKEND and day not in holiday_dates
+            working.append(is_working)
+            cumulative.append(cumulative[-1] + is_working)
+            day += timedelta(days=1)
+
+        if np is not None:
+            self.working = np.array(working, dtype=bool)
+            self.cumulative = np.array(cumulative, dtype=np.int32)
+        else:
+            self.working = working
+            self.cumulative = cumulative
+
+    def covers(self, start, end):
+        return self.first <= start and end <= self.last
+
+    def is_working_day(self, day):
+        return bool(self.working[day.toordinal() - self.base])
+
+    def count(self, start, end):
+        """Working days in [start, end]; 0 when end is before start"""
+        if end < start:
+            return 0
+        return int(self.cumulative[end.toordinal() - self.base + 1] - self.cumulative[start.toordinal() - self.base])
+
+    def count_many(self, starts, ends):
+        """
+        Working days for many (start, end) pairs at once. starts/ends are
+        sequences of dates or, with NumPy, datetime64[D] arrays. Returns a
+        NumPy int array (a list without NumPy).
+        """
+        if np is None:
+            return [self.count(start, end) for start, end in zip(starts, ends)]
+
+        first = np.datetime64(self.first, 'D')
+        start_offsets = (np.asarray(starts, dtype='datetime64[D]') - first).astype(np.int64)
+        end_offsets = (np.asarray(ends, dtype='datetime64[D]') - first).astype(np.int64)
+        valid = end_offsets >= start_offsets
+        # Reversed pairs may lie outside the span; they count 0 anyway
+        last = len(self.working) - 1
+        counts = (self.cumulative[np.clip(end_offsets, 0, last) + 1]
+                  - self.cumulative[np.clip(start_offsets, 0, last)])
+        return np.where(valid, counts, 0)
+
+    def working_days_per_month(self, year, spans=None):
+        """
+        Working days in each of the 12 months of a year, or with spans
+        [(start, end)] only the working days the spans cover
+        """
+        counts = []
+        for month in range(1, 13):
+            month_start = date(year, month, 1)
+            month_end = date(year + (month == 12), month % 12 + 1, 1) - timedelta(days=1)
+            if spans is None:
+                counts.append(self.count(month_start, month_end))
+            else:
+                counts.append(sum(self.count(max(start, month_start), min(end, month_end)) for start, end in spans))
+        return counts
+
+    def holidays_between(self, start, end):
+        """[{'name', 'date'}] of the region's holidays in [start, end]"""
+        return [{'name': holiday['name'], 'date': holiday['date'].isoformat()}
+                for holiday in self.holidays if start <= holiday['date'] <= end]
+
+
+class BusinessDays:
+    """Per-region business calendars, loaded from the holidays table"""
+
+    def __init__(self):
+        self._calendars = {}    # region -> BusinessCalendar
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load(region, first_year, last_year):
+        version = cache.version('reference')
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("""
+                    SELECT holiday_date, holiday_name
+                    FROM holidays
+                    WHERE region = %s AND holiday_date BETWEEN %s AND %s
+                """, (region, date(first_year, 1, 1), date(last_year, 12, 31)))
+                holidays = [{'name': row['holiday_name'], 'date': row['holiday_date']}
+                            for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+        print(f"✓ Business calendar {region} {first_year}-{last_year}: {len(holidays)} holidays")
+        return BusinessCalendar(region, first_year, last_year, holidays, version)
+
+    def _is_stale(self, calendar):
+        return (calendar.version != cache.version('reference')
+                or time.monotonic() - calendar.loaded_at > CALENDAR_REFRESH)
+
+    def calendar(self, region=None, start=None, end=None):
+        """The region's calendar, (re)loaded first if it is stale or does not cover [start, end]"""
+        region = region or DEFAULT_REGION
+        this_year = date.today().year
+        start = start or date(this_year, 1, 1)
+        end = end or start
+
+        calendar = self._calendars.get(region)
+        if calendar is not None and calendar.covers(start, end) and not self._is_stale(calendar):
+            return calendar
+
+        with self._lock:
+            calendar = self._calendars.get(region)
+            if calendar is not None and calendar.covers(start, end) and not self._is_stale(calendar):
+                return calendar
+
+            first_year = min(this_year - YEARS_BEFORE, start.year, calendar.first.year if calendar else this_year)
+            last_year = max(this_year + YEARS_AFTER, end.year, calendar.last.year if calendar else this_year)
+            try:
+                calendar = self._load(region, first_year, last_year)
+            except mysql.connector.Error as e:
+                print(f"⚠ Could not load holidays for {region}: {e}")
+                if calendar is None or not calendar.covers(start, end):
+                    # Weekends only until the holidays can be read
+                    calendar = BusinessCalendar(region, first_year, last_year)
+                # Retry after the next refresh interval
+                calendar.version = cache.version('reference')
+                calendar.loaded_at = time.monotonic()
+            self._calendars[region] = calendar
+            return calendar
+
+    def working_days(self, start, end, region=None):
+        """Working days in [start, end] for one leave"""
+        return self.calendar(region, start, end).count(start, end)
+
+    def working_days_many(self, starts, ends, region=None):
+        """Vectorized working_days over parallel sequences of start and end dates"""
+        if len(starts) == 0:
+            return []
+        if np is not None:
+            starts = np.asarray(starts, dtype='datetime64[D]')
+            ends = np.asarray(ends, dtype='datetime64[D]')
+            # Span only over well-formed pairs; the rest count 0 anyway
+            valid = ends >= starts
+            if not valid.any():
+                return np.zeros(len(starts), dtype=np.int64)
+            first, last = starts[valid].min().astype(date), ends[valid].max().astype(date)
+        else:
+            first, last = min(starts), max(ends)
+        return self.calendar(region, first, last).count_many(starts, ends)
+
+    def holidays(self, start, end, region=None):
+        return self.calendar(region, start, end).holidays_between(start, end)
+
+    def upcoming_holidays(self, region=None, days=365):
+        """The region's holidays from today over the next `days` days"""
+        today = date.today()
+        return self.holidays(today, today + timedelta(days=days), region)
+
+
+business_days = BusinessDays()
+
+
+def check_supported(start, end):
+    """Raise ValueError if [start, end] falls outside this year +-SUPPORTED_YEARS"""
+    this_year = date.today().year
+    first_year, last_year = this_year - SUPPORTED_YEARS, this_year + SUPPORTED_YEARS
+    if start.year < first_year or end.year > last_year:
+        raise ValueError(f"Dates must be between {first_year} and {last_year}")
+
+
+def init_app(app):
+    """Preload the default region's calendar (weekends-only until holidays can be read)"""
+    business_days.calendar()
@@ -0,0 +1,440 @@
+# cache.py - Namespaced application cache with pluggable backends
+#
+# Keys are "<prefix>:<namespace>:v<version>:<key>". Invalidating a whole
+# namespace bumps its version counter (so every older key becomes unreachable
+# and ages out) and broadcasts the new version to all workers.
+#
+# Backends:
+#   MemoryBackend - in-process LRU with TTL (default). Entries stay in the
+#                   worker, but the version counters live in the database
+#                   (cache_counters), which every worker polls every
+#                   VERSION_POLL seconds - so a write in one gunicorn worker
+#                   invalidates the others' entries and ETags too
+#   RedisBackend  - shared key-value store on any Redis-compatible server,
+#                   selected with DAYOFFLY_CACHE_URL=redis://host:port/db
+#                   (requires the optional `redis` package); versions are
+#                   pushed to the workers over pub/sub
+from collections import OrderedDict, defaultdict
+import os
+import pickle
+import threading
+import time
+import uuid
+import mysql.connector
+from database import DB_CONFIG
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CACHE_CONFIG = {
+    'url': os.environ.get('DAYOFFLY_CACHE_URL', ''),
+    'prefix': os.environ.get('DAYOFFLY_CACHE_PREFIX', 'dayoffly'),
+    'maxsize': int(os.environ.get('DAYOFFLY_CACHE_SIZE', 4096)),   # memory backend entries
+    'ttl': int(os.environ.get('DAYOFFLY_CACHE_TTL', 300)),         # seconds
+    # Namespaces never served from cache, e.g. "analytics" to benchmark the query path
+    'bypass': {ns for ns in os.environ.get('DAYOFFLY_CACHE_BYPASS', '').split(',') if ns}
+}
+
+# Per-namespace entry lifetimes (seconds); others use CACHE_CONFIG['ttl']
+NAMESPACE_TTL = {
+    'reference': 3600,
+    'dashboard': 300,
+    'analytics': 120,
+    'calendar': 600
+}
+
+# How long a worker trusts its local copy of a namespace version without a
+# broadcast (safety net for missed pub/sub messages)
+VERSION_REFRESH = 30
+# ... and without any broadcast across processes (memory backend)
+VERSION_POLL = 1
+# Seconds between attempts to reach the counters after a database failure
+COUNTERS_RETRY = 5
+
+
+class DatabaseCounters:
+    """
+    Counters in the cache_counters table, shared by every worker. Uses its
+    own autocommit connection (reads always see the latest value); while
+    the database is unreachable the counters of this process stand in.
+    """
+
+    def __init__(self):
+        self._conn = None
+        self._pid = None
+        self._local = {}
+        self._lock = threading.Lock()
+        self._failing = False
+        self._retry_at = 0
+
+    def _cursor(self):
+        # One connection per process: a forked worker must not share its parent's socket
+        if self._conn is None or self._pid != os.getpid() or not self._conn.is_connected():
+            self._conn = mysql.connector.connect(**DB_CONFIG, autocommit=True, connection_timeout=2)
+            self._pid = os.getpid()
+        return self._conn.cursor(buffered=True)
+
+    def _run(self, statements, fallback):
+        """Execute (sql, params) pairs and return the last fetchone()[0]; fallback() if the database fails"""
+        with self._lock:
+            # Do not hold every request up on connect timeouts while the database is down
+            if time.monotonic() < self._retry_at:
+                return fallback()
+            try:
+                cursor = self._cursor()
+                try:
+                    for sql, params in statements:
+                        cursor.execute(sql, params)
+                    row = cursor.fetchone()
+                finally:
+                    cursor.close()
+                if self._failing:
+                    self._failing = False
+                    print("✓ Cache counters reachable again")
+                return row[0] if row else 0
+            except mysql.connector.Error as e:
+                self._conn = None
+                self._retry_at = time.monotonic() + COUNTERS_RETRY
+                if not self._failing:
+                    self._failing = True
+                    print(f"⚠ Cache counters unavailable, other workers will not see invalidations: {e}")
+                return fallback()
+
+    def get(self, key):
+        value = self._run([("SELECT value FROM cache_counters WHERE name = %s", (key,))],
+                          lambda: self._local.get(key, 0))
+        self._local[key] = value
+        return value
+
+    def incr(self, key):
+        def local_incr():
+            self._local[key] = self._local.get(key, 0) + 1
+            return self._local[key]
+        value = self._run([
+            ("""INSERT INTO cache_counters (name, value) VALUES (%s, 1)
+                ON DUPLICATE KEY UPDATE value = value + 1""", (key,)),
+            ("SELECT value FROM cache_counters WHERE name = %s", (key,))
+        ], local_incr)
+        self._local[key] = value
+        return value
+
+    def setdefault(self, key, value):
+        """Store value (a hex token) unless key is set; returns the stored token"""
+        stored = self._run([
+            ("INSERT IGNORE INTO cache_counters (name, value) VALUES (%s, %s)", (key, int(value, 16))),
+            ("SELECT value FROM cache_counters WHERE name = %s", (key,))
+        ], lambda: int(value, 16))
+        return format(stored, 'x')
+
+
+class MemoryBackend:
+    """
+    Thread-safe in-process LRU store whose entries also expire after a TTL;
+    version counters in `counters` (DatabaseCounters) or, without, in process
+    """
+
+    shared = False
+    version_refresh = VERSION_POLL
+
+    def __init__(self, maxsize=4096, ttl=300, counters=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.counters = counters
+        self._data = OrderedDict()
+        self._counters = {}
+        self._subscribers = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_counter(self, key):
+        if self.counters is not None:
+            return self.counters.get(key)
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key):
+        if self.counters is not None:
+            return self.counters.incr(key)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def setdefault(self, key, value):
+        if self.counters is not None:
+            return self.counters.setdefault(key, value)
+        with self._lock:
+            return self._counters.setdefault(key, value)
+
+    def publish(self, channel, message):
+        for callback in list(self._subscribers[channel]):
+            callback(message)
+
+    def subscribe(self, channel, callback):
+        self._subscribers[channel].append(callback)
+
+    def info(self):
+        with self._lock:
+            return {'backend': 'memory', 'size': len(self._data), 'maxsize': self.maxsize}
+
+
+class RedisBackend:
+    """Shared store on a Redis-compatible server; values are pickled"""
+
+    shared = True
+    version_refresh = VERSION_REFRESH
+
+    def __init__(self, url, ttl=300):
+        if redis is None:
+            raise RuntimeError("The redis package is required for DAYOFFLY_CACHE_URL")
+        self.url = url
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    def get(self, key):
+        raw = self.client.get(key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self.client.set(key, pickle.dumps(value), ex=self.ttl if ttl is None else ttl)
+
+    def delete(self, key):
+        self.client.delete(key)
+
+    def get_counter(self, key):
+        raw = self.client.get(key)
+        return int(raw) if raw is not None else 0
+
+    def incr(self, key):
+        return self.client.incr(key)
+
+    def setdefault(self, key, value):
+        self.client.set(key, value, nx=True)
+        return self.client.get(key).decode()
+
+    def publish(self, channel, message):
+        self.client.publish(channel, message)
+
+    def subscribe(self, channel, callback):
+        """Deliver messages on `channel` to callback from a daemon thread, reconnecting on errors"""
+        def listen():
+            while True:
+                try:
+                    pubsub = redis.Redis.from_url(self.url).pubsub(ignore_subscribe_messages=True)
+                    pubsub.subscribe(channel)
+                    # Anything broadcast while we were disconnected is lost - resync
+                    callback(None)
+                    for message in pubsub.listen():
+                        data = message.get('data')
+                        callback(data.decode() if isinstance(data, bytes) else data)
+                except Exception as e:
+                    print(f"⚠ Cache subscriber lost connection: {e}")
+                    time.sleep(1)
+
+        thread = threading.Thread(target=listen, name='cache-invalidation', daemon=True)
+        thread.start()
+
+    def info(self):
+        return {'backend': 'redis', 'url': self.url}
+
+
+class Cache:
+    """Namespaced, versioned cache front-end with per-namespace hit/miss counters"""
+
+    def __init__(self, backend, prefix='dayoffly', bypass=()):
+        self.backend = backend
+        self.prefix = prefix
+        self.bypass = frozenset(bypass)
+        self.channel = f"{prefix}:invalidate"
+        self._versions = {}     # namespace -> (version, fetched_at)
+        self._stats = defaultdict(lambda: {'hits': 0, 'misses': 0, 'sets': 0, 'errors': 0})
+        self._lock = threading.Lock()
+        self._subscribed_pid = None
+        self._generation = None
+
+    def _ensure_subscribed(self):
+        # Subscribe lazily so each forked worker gets its own listener
+        pid = os.getpid()
+        if self._subscribed_pid == pid:
+            return
+        with self._lock:
+            if self._subscribed_pid != pid:
+                self._versions.clear()
+                self.backend.subscribe(self.channel, self._on_invalidate)
+                self._subscribed_pid = pid
+
+    def _on_invalidate(self, message):
+        """Apply a '<namespace>:<version>' broadcast; None means resync everything"""
+        with self._lock:
+            if message is None:
+                self._versions.clear()
+                self._generation = None
+                return
+            namespace, _, version = message.rpartition(':')
+            current = self._versions.get(namespace, (0, 0))[0]
+            if int(version) > current:
+                self._versions[namespace] = (int(version), time.monotonic())
+
+    def _version_key(self, namespace):
+        return f"{self.prefix}:version:{namespace}"
+
+    def version(self, namespace):
+        """Current version of a namespace as seen by this worker"""
+        self._ensure_subscribed()
+        cached = self._versions.get(namespace)
+        if cached and time.monotonic() - cached[1] < self.backend.version_refresh:
+            return cached[0]
+
+        version = self.backend.get_counter(self._version_key(namespace))
+        with self._lock:
+            self._versions[namespace] = (version, time.monotonic())
+        return version
+
+    def generation(self):
+        """Token that changes whenever the backend's version counters start over"""
+        if self._generation is None:
+            self._generation = self.backend.setdefault(f"{self.prefix}:generation", uuid.uuid4().hex[:12])
+        return self._generation
+
+    def data_version(self, *namespaces):
+        """Watermark of the given namespaces, e.g. for ETags"""
+        versions = '.'.join(str(self.version(namespace)) for namespace in namespaces)
+        return f"{self.generation()}.{versions}"
+
+    def _key(self, namespace, key):
+        return f"{self.prefix}:{namespace}:v{self.version(namespace)}:{key}"
+
+    def get(self, namespace, key):
+        """Return the cached value or None"""
+        stats = self._stats[namespace]
+        if namespace in self.bypass:
+            stats['misses'] += 1
+            return None
+        try:
+            value = self.backend.get(self._key(namespace, key))
+        except Exception as e:
+            stats['errors'] += 1
+            print(f"⚠ Cache get failed for {namespace}:{key}: {e}")
+            value = None
+
+        if value is None:
+            stats['misses'] += 1
+        else:
+            stats['hits'] += 1
+        return value
+
+    def set(self, namespace, key, value, ttl=None):
+        if namespace in self.bypass:
+            return
+        if ttl is None:
+            ttl = NAMESPACE_TTL.get(namespace)
+        try:
+            self.backend.set(self._key(namespace, key), value, ttl)
+            self._stats[namespace]['sets'] += 1
+        except Exception as e:
+            self._stats[namespace]['errors'] += 1
+            print(f"⚠ Cache set failed for {namespace}:{key}: {e}")
+
+    def delete(self, namespace, key):
+        try:
+            self.backend.delete(self._key(namespace, key))
+        except Exception as e:
+            self._stats[namespace]['errors'] += 1
+            print(f"⚠ Cache delete failed for {namespace}:{key}: {e}")
+
+    def get_or_load(self, namespace, key, loader, ttl=None):
+        """Return the cached value, or call loader() and cache its result unless it is None"""
+        value = self.get(namespace, key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(namespace, key, value, ttl)
+        return value
+
+    def bump_version(self, namespace):
+        """Invalidate every key of a namespace in all workers"""
+        try:
+            version = self.backend.incr(self._version_key(namespace))
+            with self._lock:
+                self._versions[namespace] = (version, time.monotonic())
+            self.backend.publish(self.channel, f"{namespace}:{version}")
+        except Exception as e:
+            self._stats[namespace]['errors'] += 1
+            print(f"⚠ Cache invalidation failed for {namespace}: {e}")
+
+    def stats(self):
+        return {
+            **self.backend.info(),
+            'bypass': sorted(self.bypass),
+            'versions': {namespace: version for namespace, (version, _) in self._versions.items()},
+            'namespaces': {namespace: dict(counts) for namespace, counts in self._stats.items()}
+        }
+
+
+def create_cache(config=CACHE_CONFIG):
+    """Build the cache on the configured backend, falling back to memory"""
+    if config['url']:
+        try:
+            backend = RedisBackend(config['url'], ttl=config['ttl'])
+            print(f"✓ Using shared cache at {config['url']}")
+            return Cache(backend, config['prefix'], config['bypass'])
+        except Exception as e:
+            print(f"⚠ Shared cache unavailable ({e}), using in-process cache")
+    backend = MemoryBackend(config['maxsize'], config['ttl'], DatabaseCounters())
+    return Cache(backend, config['prefix'], config['bypass'])
+
+
+cache = create_cache()
+
+
+def invalidate_user_dashboard(*user_ids):
+    """Drop cached dashboard payloads after a write that touches these users"""
+    if not cache.backend.shared:
+        # A delete would only reach this worker's entries; a version bump reaches all
+        cache.bump_version('dashboard')
+        return
+    for user_id in user_ids:
+        cache.delete('dashboard', user_id)
+
+
+def invalidate_user_data(*user_ids):
+    """After leave, balance or user writes: drop the users' dashboards, all analytics results and calendar tiles"""
+    invalidate_user_dashboard(*user_ids)
+    cache.bump_version('analytics')
+    cache.bump_version('calendar')
+
+
+def invalidate_directory():
+    """After users are added, renamed, moved or deactivated: rebuild the employee pickers' tries"""
+    cache.bump_version('directory')
+
+
+def invalidate_reference_data():
+    """After department/role changes"""
+    cache.bump_version('reference')
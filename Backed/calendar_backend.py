@@ -0,0 +1,313 @@
+# calendar_backend.py - Team availability calendar
+#
+# /api/calendar returns, for a date range and a department or approver scope,
+# every day's absent employees and the number still available. The range is
+# cut into month tiles; each tile is built once from the approved leaves
+# overlapping its month and cached in the 'calendar' namespace until the next
+# leave or user write (cache.invalidate_user_data).
+#
+# A tile is built in O(members + leaves + days): each employee's leaves are
+# clipped to the month and merged into disjoint spans, the spans go into a
+# difference array (+1 on the first day, -1 after the last) whose prefix sums
+# are the daily absent counts, and one sweep over the same span boundaries
+# yields the per-day absent lists.
+#
+# Working days and holiday names come from the scope's business calendar
+# (business_days) when the response is assembled, so holiday edits do not
+# have to touch the tiles. /api/holidays lists a region's holidays.
+from flask import Blueprint, jsonify, request, session
+from calendar import monthrange
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from functools import wraps
+import mysql.connector
+from business_days import business_days, check_supported
+from cache import cache
+from database import connection
+from http_caching import conditional
+from leave_index import index as leave_index
+from reference_data import registry
+
+calendar_bp = Blueprint('calendar', __name__)
+
+# Longest range one request may ask for
+MAX_RANGE_DAYS = 400
+
+
+def login_required(f):
+    """Decorator to check if user is logged in"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if 'logged_in' not in session or not session['logged_in']:
+            return jsonify({'error': 'Authentication required'}), 401
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _months(start, end):
+    """(year, month) of every month touching [start, end]"""
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _resolve_scope(args, user):
+    """
+    ('all' | 'department' | 'approver', id) from the query string.
+    Employees default to their own department; HR to everyone.
+    """
+    approver = args.get('approver')
+    if approver:
+        if not approver.isdigit():
+            raise ValueError("approver must be a user id")
+        return 'approver', int(approver)
+
+    department = args.get('department')
+    if not department and user.get('role_name') != 'HR':
+        department = user.get('department_name')
+    if not department or department == 'all':
+        return 'all', None
+    department_id = int(department) if department.isdigit() else registry.department_id(department)
+    if department_id is None:
+        raise ValueError(f"Unknown department: {department}")
+    return 'department', department_id
+
+
+def _scope_region(scope):
+    """Holiday region of the scope: the department's, otherwise the default"""
+    kind, scope_id = scope
+    return registry.department_region(scope_id) if kind == 'department' else None
+
+
+def _scope_members(cursor, scope):
+    """{user_id: user_name} of the active employees in the scope"""
+    kind, scope_id = scope
+    query = "SELECT user_id, user_name FROM users_master WHERE is_active = 1"
+    params = []
+    if kind == 'department':
+        query += " AND department_id = %s"
+        params.append(scope_id)
+    elif kind == 'approver':
+        query += " AND approver_id = %s"
+        params.append(scope_id)
+    cursor.execute(query, params)
+    return {row['user_id']: row['user_name'] for row in cursor.fetchall()}
+
+
+def _approved_leaves(cursor, scope, start, end, members):
+    """(user_id, start_date, end_date) of the members' approved leaves overlapping [start, end]"""
+    kind, scope_id = scope
+    leaves = leave_index.overlapping(start, end, scope_id if kind == 'department' else None)
+    if leaves is not None:
+        return [(leave.user_id, leave.start, leave.end) for leave in leaves if leave.user_id in members]
+
+    query = """
+        SELECT lf.user_id, lf.start_date, lf.end_date
+        FROM leave_fact lf
+        JOIN users_master u ON lf.user_id = u.user_id
+        WHERE lf.leave_status = 'approved' AND lf.start_date <= %s AND lf.end_date >= %s
+    """
+    params = [end, start]
+    if kind == 'department':
+        query += " AND u.department_id = %s"
+        params.append(scope_id)
+    elif kind == 'approver':
+        query += " AND u.approver_id = %s"
+        params.append(scope_id)
+    cursor.execute(query, params)
+    return [(row['user_id'], row['start_date'], row['end_date'])
+            for row in cursor.fetchall() if row['user_id'] in members]
+
+
+def build_month_tile(year, month, members, leaves):
+    """
+    Daily availability for one month: absent counts from a difference array
+    over each employee's merged leave spans, absent user_ids per day from a
+    sweep over the same span boundaries.
+    """
+    days_in_month = monthrange(year, month)[1]
+    first = date(year, month, 1)
+
+    # Clip to the month as day offsets, grouped per employee
+    spans_by_user = defaultdict(list)
+    for user_id, start, end in leaves:
+        lo = max((start - first).days, 0)
+        hi = min((end - first).days, days_in_month - 1)
+        if lo <= hi:
+            spans_by_user[user_id].append((lo, hi))
+
+    diff = [0] * (days_in_month + 1)
+    joins = defaultdict(list)
+    leaves_after = defaultdict(list)
+    for user_id, spans in spans_by_user.items():
+        # Overlapping or adjacent leaves of one employee count once per day
+        spans.sort()
+        merged = [list(spans[0])]
+        for lo, hi in spans[1:]:
+            if lo <= merged[-1][1] + 1:
+                merged[-1][1] = max(merged[-1][1], hi)
+            else:
+                merged.append([lo, hi])
+        for lo, hi in merged:
+            diff[lo] += 1
+            diff[hi + 1] -= 1
+            joins[lo].append(user_id)
+            leaves_after[hi + 1].append(user_id)
+
+    absent_counts = []
+    absent_lists = []
+    running = 0
+    away = set()
+    for day in range(days_in_month):
+        running += diff[day]
+        if day in leaves_after:
+            away.difference_update(leaves_after[day])
+        if day in joins:
+            away.update(joins[day])
+        absent_counts.append(running)
+        absent_lists.append(sorted(away))
+
+    return {
+        'month': f"{year:04d}-{month:02d}",
+        'headcount': len(members),
+        'absent_counts': absent_counts,
+        'absent': absent_lists,
+        'names': {user_id: members[user_id] for user_id in spans_by_user}
+    }
+
+
+def load_month_tiles(scope, start, end):
+    """Month tiles covering [start, end]: cached ones as is, the rest built together and cached"""
+    scope_key = f"{scope[0]}:{scope[1] or ''}"
+    tiles = {}
+    missing = []
+    for year, month in _months(start, end):
+        tile = cache.get('calendar', f"{scope_key}:{year:04d}-{month:02d}")
+        if tile is None:
+            missing.append((year, month))
+        else:
+            tiles[(year, month)] = tile
+    if not missing:
+        return tiles
+
+    # One members read and one leaves read for all missing months
+    first = date(*missing[0], 1)
+    last = date(*missing[-1], monthrange(*missing[-1])[1])
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            members = _scope_members(cursor, scope)
+            leaves = _approved_leaves(cursor, scope, first, last, members)
+        finally:
+            cursor.close()
+
+    for year, month in missing:
+        month_start = date(year, month, 1)
+        month_end = date(year, month, monthrange(year, month)[1])
+        month_leaves = [leave for leave in leaves if leave[1] <= month_end and leave[2] >= month_start]
+        tile = build_month_tile(year, month, members, month_leaves)
+        cache.set('calendar', f"{scope_key}:{year:04d}-{month:02d}", tile)
+        tiles[(year, month)] = tile
+    return tiles
+
+
+@calendar_bp.route('/api/calendar')
+@login_required
+@conditional
+def get_calendar():
+    """
+    Team availability per day.
+    Query: start, end (YYYY-MM-DD, default this month), department (name or id)
+    or approver (user id).
+    """
+    try:
+        today = date.today()
+        start = _parse_date(request.args.get('start'), today.replace(day=1))
+        end = _parse_date(request.args.get('end'), date(today.year, today.month, monthrange(today.year, today.month)[1]))
+        if end < start:
+            return jsonify({'error': 'end must not be before start'}), 400
+        if (end - start).days >= MAX_RANGE_DAYS:
+            return jsonify({'error': f"Range is limited to {MAX_RANGE_DAYS} days"}), 400
+        check_supported(start, end)
+        scope = _resolve_scope(request.args, session.get('user', {}))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        tiles = load_month_tiles(scope, start, end)
+        work_calendar = business_days.calendar(_scope_region(scope), start, end)
+        holiday_names = {holiday['date']: holiday['name'] for holiday in work_calendar.holidays_between(start, end)}
+
+        days = []
+        employees = {}
+        day = start
+        while day <= end:
+            tile = tiles[(day.year, day.month)]
+            absent = tile['absent'][day.day - 1]
+            days.append({
+                'date': day.isoformat(),
+                'workingDay': work_calendar.is_working_day(day),
+                'holiday': holiday_names.get(day.isoformat()),
+                'absent': absent,
+                'absentCount': tile['absent_counts'][day.day - 1],
+                'available': tile['headcount'] - tile['absent_counts'][day.day - 1],
+                'headcount': tile['headcount']
+            })
+            for user_id in absent:
+                employees[user_id] = tile['names'][user_id]
+            day += timedelta(days=1)
+
+        return jsonify({
+            'scope': {'type': scope[0], 'id': scope[1]},
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'days': days,
+            'employees': employees
+        })
+
+    except mysql.connector.Error as e:
+        print(f"✗ Database error in get_calendar: {e}")
+        return jsonify({'error': 'Calendar unavailable'}), 503
+    except Exception as e:
+        print(f"✗ Error in get_calendar: {e}")
+        return jsonify({'error': 'Failed to load calendar'}), 500
+
+
+@calendar_bp.route('/api/holidays')
+@login_required
+@conditional
+def get_holidays():
+    """
+    Public holidays of a region.
+    Query: year (default: the next 12 months), region (default: the user's department's)
+    """
+    try:
+        region = request.args.get('region')
+        if not region:
+            user = session.get('user', {})
+            region = registry.department_region(registry.department_id(user.get('department_name')))
+        year = request.args.get('year')
+        if year:
+            if not year.isdigit():
+                return jsonify({'error': 'year must be a number'}), 400
+            start, end = date(int(year), 1, 1), date(int(year), 12, 31)
+            try:
+                check_supported(start, end)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            holidays = business_days.holidays(start, end, region)
+        else:
+            holidays = business_days.upcoming_holidays(region)
+
+        return jsonify({'holidays': holidays})
+
+    except Exception as e:
+        print(f"✗ Error in get_holidays: {e}")
+        return jsonify({'error': 'Failed to load holidays'}), 500
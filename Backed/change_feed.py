@@ -0,0 +1,238 @@
+# change_feed.py - leave_application change log and "changed since" queries
+#
+# Every write that goes through leave_facts.refresh_leave_facts appends one
+# leave_change_log row per changed leave (old -> new status). Clients keep an
+# opaque token and ask for everything after it; the scan is a primary-key
+# range on leave_change_log.seq.
+#
+# AUTO_INCREMENT values are allocated before commit, so a transaction holding
+# a lower seq can become visible after a higher one was already read. Tokens
+# therefore also carry the seqs skipped below their high-water mark and keep
+# asking for them for GAP_TIMEOUT seconds (rolled-back inserts never appear).
+#
+# Rows older than CHANGE_LOG_KEEP_DAYS are deleted by prune_change_log, which
+# feed reads and the event reader trigger at most once per PRUNE_INTERVAL per
+# worker (maybe_prune_change_log); a token from before the pruned range gets
+# a reset instead of a partial list.
+import threading
+import time
+from database import connection
+from leave_listing import LEAVE_LISTING_FROM, STATUS_FILTER_MAP, build_leave_filters
+from pagination import encode_cursor, decode_cursor
+
+# More changes than this since a token -> the client should reload the listing
+FEED_MAX_CHANGES = 500
+# How far back the first token looks for in-flight (uncommitted) seqs
+GAP_WINDOW = 100
+GAP_TIMEOUT = 60        # seconds
+MAX_GAPS = 200
+CHANGE_LOG_KEEP_DAYS = 7
+PRUNE_INTERVAL = 3600   # seconds between prunes per worker
+PRUNE_BATCH = 5000      # rows per DELETE so a large backlog never holds long locks
+
+_pruned_at = 0
+_prune_lock = threading.Lock()
+
+
+def status_label(status):
+    """Frontend status label for a database leave_status (as in the listing counts)"""
+    status = (status or '').lower()
+    return 'rejected' if status in ('declined', 'rejected') else status
+
+
+def record_leave_changes(cursor, changes):
+    """Append (leave_id, user_id, old_status, new_status) rows; runs in the caller's transaction"""
+    if changes:
+        cursor.executemany("""
+            INSERT INTO leave_change_log (leave_id, user_id, old_status, new_status)
+            VALUES (%s, %s, %s, %s)
+        """, changes)
+
+
+def _encode_token(high_water, gaps):
+    return encode_cursor(high_water, [[seq, seen] for seq, seen in sorted(gaps.items())])
+
+
+def _decode_token(token):
+    """Returns (high_water, {gap seq: first seen}); raises ValueError"""
+    try:
+        values = decode_cursor(token, (int, list))
+    except ValueError:
+        raise ValueError("Invalid change token")
+    try:
+        return values[0], {int(seq): float(seen) for seq, seen in values[1]}
+    except (TypeError, ValueError):
+        raise ValueError("Invalid change token")
+
+
+def advance_position(high_water, gaps, seen_seqs, now):
+    """New high-water mark and outstanding gaps after reading seen_seqs"""
+    seen = set(seen_seqs)
+    gaps = {seq: first for seq, first in gaps.items() if seq not in seen and now - first < GAP_TIMEOUT}
+    new_high = max(seen | {high_water})
+    for seq in range(high_water + 1, new_high):
+        if seq not in seen:
+            gaps.setdefault(seq, now)
+    # Keep the token bounded; the oldest gaps are the least likely to still commit
+    for seq in sorted(gaps, key=gaps.get)[:max(0, len(gaps) - MAX_GAPS)]:
+        del gaps[seq]
+    return new_high, gaps
+
+
+def current_position(cursor):
+    """(high_water, gaps) of the change log right now; gaps are recent seqs not yet visible"""
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) as seq FROM leave_change_log")
+    high_water = cursor.fetchone()['seq']
+    start = max(0, high_water - GAP_WINDOW)
+    cursor.execute("SELECT seq FROM leave_change_log WHERE seq > %s", (start,))
+    seen = [row['seq'] for row in cursor.fetchall()]
+    return advance_position(start, {}, seen, time.time())
+
+
+def current_change_token(cursor):
+    """Token for "now", to hand out with a full listing (read it before the listing query)"""
+    return _encode_token(*current_position(cursor))
+
+
+def fetch_log_rows(cursor, high_water, gaps, limit, user_id=None):
+    """Change log rows after a position, oldest first (at most `limit`)"""
+    conditions = ["seq > %s"]
+    params = [high_water]
+    if gaps:
+        conditions.append(f"seq IN ({', '.join(['%s'] * len(gaps))})")
+        params.extend(gaps)
+    where_clause = f"({' OR '.join(conditions)})"
+    if user_id is not None:
+        where_clause += " AND user_id = %s"
+        params.append(user_id)
+    cursor.execute(f"""
+        SELECT seq, leave_id, user_id, old_status, new_status, changed_at
+        FROM leave_change_log
+        WHERE {where_clause}
+        ORDER BY seq
+        LIMIT %s
+    """, params + [limit])
+    return cursor.fetchall()
+
+
+def log_pruned_before(cursor, high_water):
+    """True if rows after high_water were already removed by prune_change_log"""
+    cursor.execute("SELECT MIN(seq) as seq FROM leave_change_log")
+    oldest = cursor.fetchone()['seq']
+    return oldest is not None and oldest > high_water + 1 and high_water > 0
+
+
+def fetch_leave_changes(cursor, columns, args, format_row):
+    """
+    Changes after args['since'] under the listing filters (status/type/department/from/to).
+    `columns` must select la.leave_id and la.leave_status as status.
+    Returns a dict with:
+      changes       - current rows (formatted by format_row) of changed leaves matching the filters
+      removed       - changed leave_ids that no longer match (or no longer exist)
+      count_deltas  - {total, pending, approved, rejected} increments for the status counts
+      next_token    - token for the next call
+      reset         - True if the client is too far behind and should reload the listing
+    Raises ValueError on malformed tokens or filters.
+    """
+    high_water, gaps = _decode_token(args.get('since', ''))
+
+    status = (args.get('status') or 'all').lower()
+    wanted = STATUS_FILTER_MAP.get(status) if status != 'all' else None
+    if status != 'all' and wanted is None:
+        raise ValueError(f"Invalid status filter: {args.get('status')}")
+
+    # Everything up to the token was pruned (see prune_change_log) -> start over
+    if log_pruned_before(cursor, high_water):
+        return {'changes': [], 'removed': [], 'count_deltas': {}, 'reset': True,
+                'next_token': current_change_token(cursor)}
+
+    log_rows = fetch_log_rows(cursor, high_water, gaps, FEED_MAX_CHANGES + 1)
+
+    if len(log_rows) > FEED_MAX_CHANGES:
+        return {'changes': [], 'removed': [], 'count_deltas': {}, 'reset': True,
+                'next_token': current_change_token(cursor)}
+
+    next_high, next_gaps = advance_position(high_water, gaps, [row['seq'] for row in log_rows], time.time())
+    result = {
+        'changes': [],
+        'removed': [],
+        'count_deltas': {'total': 0, 'pending': 0, 'approved': 0, 'rejected': 0},
+        'reset': False,
+        'next_token': _encode_token(next_high, next_gaps)
+    }
+    if not log_rows:
+        return result
+
+    # Current state of the changed leaves under every filter except status
+    leave_ids = list(dict.fromkeys(row['leave_id'] for row in log_rows))
+    filter_args = {key: value for key, value in args.items() if key != 'status'}
+    conditions, params = build_leave_filters(filter_args)
+    conditions.append(f"la.leave_id IN ({', '.join(['%s'] * len(leave_ids))})")
+    cursor.execute(f"""
+        SELECT {columns}
+        {LEAVE_LISTING_FROM}
+        WHERE {' AND '.join(conditions)}
+        ORDER BY la.applied_on DESC, la.leave_id DESC
+    """, params + leave_ids)
+    current = {row['leave_id']: row for row in cursor.fetchall()}
+
+    deltas = result['count_deltas']
+    for row in log_rows:
+        if row['leave_id'] not in current:
+            continue
+        if row['old_status'] is None:
+            deltas['total'] += 1
+        elif status_label(row['old_status']) in deltas:
+            deltas[status_label(row['old_status'])] -= 1
+        if status_label(row['new_status']) in deltas:
+            deltas[status_label(row['new_status'])] += 1
+
+    for leave_id in leave_ids:
+        row = current.get(leave_id)
+        if row is not None and (wanted is None or row['status'] == wanted):
+            result['changes'].append(format_row(row))
+        else:
+            result['removed'].append(leave_id)
+    return result
+
+
+def prune_change_log(conn, keep_days=CHANGE_LOG_KEEP_DAYS):
+    """Drop change log rows older than keep_days; stale client tokens then get a reset"""
+    cursor = conn.cursor()
+    deleted = 0
+    try:
+        while True:
+            cursor.execute("""
+                DELETE FROM leave_change_log
+                WHERE changed_at < NOW() - INTERVAL %s DAY
+                ORDER BY seq
+                LIMIT %s
+            """, (keep_days, PRUNE_BATCH))
+            conn.commit()
+            deleted += cursor.rowcount
+            if cursor.rowcount < PRUNE_BATCH:
+                return deleted
+    finally:
+        cursor.close()
+
+
+def _prune_in_background():
+    try:
+        with connection() as conn:
+            deleted = prune_change_log(conn)
+        if deleted:
+            print(f"✓ Pruned {deleted} leave_change_log rows older than {CHANGE_LOG_KEEP_DAYS} days")
+    except Exception as e:
+        print(f"⚠ Could not prune leave_change_log: {e}")
+    finally:
+        _prune_lock.release()
+
+
+def maybe_prune_change_log():
+    """Start prune_change_log on its own connection if PRUNE_INTERVAL has passed"""
+    global _pruned_at
+    now = time.time()
+    if now - _pruned_at < PRUNE_INTERVAL or not _prune_lock.acquire(blocking=False):
+        return
+    _pruned_at = now
+    threading.Thread(target=_prune_in_background, name='change-log-prune', daemon=True).start()
@@ -0,0 +1,248 @@
+# database.py - Shared MySQL connection pool for all blueprints
+from flask import g, has_app_context
+from collections import deque, namedtuple
+from contextlib import contextmanager
+import mysql.connector
+import mysql.connector.errors
+import threading
+import time
+import os
+
+# Database configuration
+DB_CONFIG = {
+    'host': os.environ.get('DAYOFFLY_DB_HOST', 'localhost'),
+    'user': os.environ.get('DAYOFFLY_DB_USER', 'root'),
+    'password': os.environ.get('DAYOFFLY_DB_PASSWORD', ''),
+    'database': os.environ.get('DAYOFFLY_DB_NAME', 'dayoffly'),
+    'port': int(os.environ.get('DAYOFFLY_DB_PORT', 3306))
+}
+
+# Pool configuration
+POOL_CONFIG = {
+    'pool_size': int(os.environ.get('DAYOFFLY_DB_POOL_SIZE', 10)),
+    'checkout_timeout': float(os.environ.get('DAYOFFLY_DB_CHECKOUT_TIMEOUT', 5)),
+    'health_check_on_borrow': os.environ.get('DAYOFFLY_DB_HEALTH_CHECK', '1') == '1'
+}
+
+
+class PoolTimeout(mysql.connector.errors.PoolError):
+    """Raised when no connection becomes free within the checkout timeout"""
+
+
+class ConnectionPool:
+    """Bounded pool of MySQL connections, created lazily up to pool_size"""
+
+    def __init__(self, config, pool_size=10, checkout_timeout=5.0, health_check_on_borrow=True):
+        self._config = dict(config)
+        self.pool_size = pool_size
+        self.checkout_timeout = checkout_timeout
+        self.health_check_on_borrow = health_check_on_borrow
+
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._open = 0
+        self._in_use = 0
+        self._waiters = 0
+
+        # Metrics
+        self._checkouts = 0
+        self._timeouts = 0
+        self._discarded = 0
+        self._latencies = deque(maxlen=1000)
+
+    def acquire(self):
+        """Check out a connection, waiting up to checkout_timeout for a free slot"""
+        started = time.perf_counter()
+        deadline = started + self.checkout_timeout
+        conn = None
+
+        with self._cond:
+            while not self._idle and self._open >= self.pool_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        msg=f"No database connection free after {self.checkout_timeout}s "
+                            f"(pool size {self.pool_size})")
+                self._waiters += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiters -= 1
+
+            if self._idle:
+                # LIFO keeps the most recently used (warmest) connections busy
+                conn = self._idle.pop()
+            else:
+                self._open += 1
+            self._in_use += 1
+
+        try:
+            if conn is None:
+                conn = mysql.connector.connect(**self._config)
+            elif self.health_check_on_borrow and not conn.is_connected():
+                self._close_quietly(conn)
+                with self._cond:
+                    self._discarded += 1
+                conn = mysql.connector.connect(**self._config)
+        except Exception:
+            with self._cond:
+                self._open -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._checkouts += 1
+            self._latencies.append(time.perf_counter() - started)
+        return conn
+
+    def release(self, conn, discard=False):
+        """Return a connection to the pool, rolling back any open transaction"""
+        if not discard:
+            try:
+                if conn.in_transaction:
+                    conn.rollback()
+            except mysql.connector.Error:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._open -= 1
+                self._discarded += 1
+            else:
+                self._idle.append(conn)
+            self._cond.notify()
+
+        if discard:
+            self._close_quietly(conn)
+
+    def metrics(self):
+        """Snapshot of pool usage and checkout latency"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            snapshot = {
+                'pool_size': self.pool_size,
+                'open': self._open,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'waiters': self._waiters,
+                'checkouts': self._checkouts,
+                'timeouts': self._timeouts,
+                'discarded': self._discarded
+            }
+
+        def percentile(p):
+            if not latencies:
+                return 0
+            index = min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))
+            return round(latencies[index] * 1000, 3)
+
+        snapshot['checkout_latency_ms'] = {
+            'avg': round(sum(latencies) / len(latencies) * 1000, 3) if latencies else 0,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': percentile(100)
+        }
+        return snapshot
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class PooledConnection:
+    """Checked-out connection whose close() hands it back to the pool"""
+
+    def __init__(self, pool, conn, request_scoped=False):
+        self._pool = pool
+        self._conn = conn
+        self._request_scoped = request_scoped
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def close(self):
+        # Request-scoped connections are shared by every helper in the request
+        # and are only released at teardown
+        if not self._request_scoped:
+            self.release()
+
+    def release(self, discard=False):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, discard=discard)
+
+
+# One independent read: run by run_queries here and by asyncdb.run_queries
+# (concurrently) on the async path
+Query = namedtuple('Query', ['sql', 'params', 'one'], defaults=[(), False])
+
+
+def run_queries(cursor, queries):
+    """Execute {name: Query} one after another on a dictionary cursor; returns {name: rows}"""
+    results = {}
+    for name, query in queries.items():
+        cursor.execute(query.sql, query.params)
+        results[name] = cursor.fetchone() if query.one else cursor.fetchall()
+    return results
+
+
+def kill_query(connection_id):
+    """Abort the statement running on another connection (KILL QUERY keeps that connection open)"""
+    # A separate short-lived connection: the pool may be exhausted by the very queries being killed
+    conn = mysql.connector.connect(**DB_CONFIG, connection_timeout=2)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"KILL QUERY {int(connection_id)}")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+pool = ConnectionPool(DB_CONFIG, **POOL_CONFIG)
+
+
+def get_db_connection():
+    """Get a pooled database connection, shared for the rest of the current request"""
+    try:
+        if has_app_context():
+            conn = g.get('_db_conn')
+            if conn is None:
+                conn = PooledConnection(pool, pool.acquire(), request_scoped=True)
+                g._db_conn = conn
+            return conn
+        return PooledConnection(pool, pool.acquire())
+    except mysql.connector.Error as e:
+        print(f"✗ Database connection failed: {e}")
+        return None
+
+
+@contextmanager
+def connection():
+    """Check out a dedicated pooled connection for the duration of a with-block"""
+    conn = PooledConnection(pool, pool.acquire())
+    try:
+        yield conn
+    finally:
+        conn.release()
+
+
+def release_request_connection(exc=None):
+    """Teardown handler returning the request's connection to the pool"""
+    conn = g.pop('_db_conn', None)
+    if conn is not None:
+        conn.release()
+
+
+def pool_metrics():
+    return pool.metrics()
+
+
+def init_app(app):
+    app.teardown_appcontext(release_request_connection)
@@ -1,33 +1,76 @@
 from flask import Blueprint, request, jsonify
 import mysql.connector
+from database import get_db_connection, Query
+from parallel import run_parallel
+from cache import invalidate_directory, invalidate_reference_data, invalidate_user_data
+from employee_directory import directory
+from reference_data import registry
+from leave_index import index as leave_index
 from datetime import datetime, date
+import re
 
 employee_bp = Blueprint('employee', __name__)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',      
-    'database': 'dayoffly',
-    'port': 3306
-}
+# Above this many people on leave, filter with the SQL EXISTS instead of an id list
+ON_LEAVE_IN_LIST_MAX = 1000
 
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"Database connection failed: {e}")
-        return None
+# Shortest word the FULLTEXT index holds (innodb_ft_min_token_size); shorter
+# searches use the name/email prefix indexes instead
+FT_MIN_TOKEN = 3
+SEARCH_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+def employee_search(search):
+    """
+    WHERE condition, its params and the ORDER BY for the employee search box.
+    Words of FT_MIN_TOKEN+ characters are prefix terms against the FULLTEXT
+    index on name, email and designation, ranked by relevance; anything
+    shorter (or an email address) is a LIKE prefix on name and email, which
+    their B-tree indexes answer. Department names are matched in memory
+    (reference_data); their members are a UNION branch on the department_id
+    index, since an OR with the text match cannot use either index.
+    """
+    needle = search.strip().lower()
+    department_ids = [dept['id'] for dept in registry.departments() if needle in dept['name'].lower()]
+    words = [word for word in SEARCH_TOKEN.findall(needle) if len(word) >= FT_MIN_TOKEN]
+
+    def text_match(alias):
+        if '@' in needle:
+            # An email address: prefix scan of the unique email index
+            prefix = re.sub(r'([%_\\])', r'\\\1', needle) + '%'
+            return f"{alias}.email LIKE %s", [prefix]
+        if words:
+            # Boolean mode: every word required, as a prefix
+            terms = ' '.join(f'+{word}*' for word in words)
+            return f"MATCH({alias}.user_name, {alias}.email, {alias}.designation) AGAINST (%s IN BOOLEAN MODE)", [terms]
+        prefix = re.sub(r'([%_\\])', r'\\\1', needle) + '%'
+        return f"({alias}.user_name LIKE %s OR {alias}.email LIKE %s)", [prefix, prefix]
+
+    if '@' not in needle and words:
+        match, terms = text_match('u')
+        order, order_params = f"{match} DESC, u.user_name", terms
+    else:
+        order, order_params = "u.user_name", []
+
+    if not department_ids:
+        condition, params = text_match('u')
+        return condition, params, order, order_params
+
+    # Each branch on its own index; the derived table is materialized once and
+    # joined back on the primary key
+    branch, params = text_match('s')
+    condition = f"""u.user_id IN (
+        SELECT m.user_id FROM (
+            SELECT s.user_id FROM users_master s WHERE {branch}
+            UNION
+            SELECT s.user_id FROM users_master s WHERE s.department_id IN ({', '.join(['%s'] * len(department_ids))})
+        ) m
+    )"""
+    return condition, params + department_ids, order, order_params
 
 @employee_bp.route('/api/employees')
 def get_employees():
     """Get employees with pagination and filtering"""
     try:
-        print("=== DEBUG: Starting get_employees ===")
-        
         # Get query parameters
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 8))
@@ -35,145 +78,124 @@ def get_employees():
         department_filter = request.args.get('department', 'all')
         search = request.args.get('search', '')
         
-        print(f"DEBUG: Page: {page}, Per Page: {per_page}, Status: {status_filter}, Department: {department_filter}, Search: {search}")
-        
         conn = get_db_connection()
         if not conn:
-            print("DEBUG: Database connection failed")
             return jsonify({'error': 'Database connection failed'}), 500
         
         cursor = conn.cursor(dictionary=True)
         
-        # Build base query
-        base_query = """
-            SELECT 
-                u.user_id as id,
-                u.user_name as name,
-                u.email,
-                u.contact_number as contact,
-                u.designation as position,
-                d.department_name as department,
-                u.date_of_birth,
-                u.gender,
-                u.is_active
+        # Leave stats and status are computed per row inside the page query, and
+        # the status filter is applied in SQL before LIMIT/OFFSET so the totals match
+        today = date.today()
+        on_leave_ids = leave_index.users_on_leave(today)
+        if on_leave_ids is not None and len(on_leave_ids) <= ON_LEAVE_IN_LIST_MAX:
+            # Who is on leave comes from the interval index; SQL only filters by id
+            on_leave_today = (f"u.user_id IN ({', '.join(str(int(user_id)) for user_id in on_leave_ids)})"
+                              if on_leave_ids else "FALSE")
+            on_leave_params = []
+        else:
+            on_leave_today = """
+                EXISTS (
+                    SELECT 1 FROM leave_application ol
+                    WHERE ol.user_id = u.user_id
+                    AND ol.leave_status = 'approved'
+                    AND ol.start_date <= %s AND ol.end_date >= %s
+                )
+            """
+            on_leave_params = [today, today]
+        
+        from_clause = """
             FROM users_master u
             LEFT JOIN department d ON u.department_id = d.department_id
             WHERE 1=1
         """
-        
-        params = []
+        where_params = []
         
         # Apply department filter
         if department_filter != 'all':
-            base_query += " AND d.department_name = %s"
-            params.append(department_filter)
-        
-        # Apply search filter
-        if search:
-            base_query += " AND (u.user_name LIKE %s OR u.email LIKE %s OR u.designation LIKE %s OR d.department_name LIKE %s)"
-            params.extend([f'%{search}%', f'%{search}%', f'%{search}%', f'%{search}%'])
-        
-        # Add ORDER BY
-        base_query += " ORDER BY u.user_name"
-        
-        print(f"DEBUG: Final query: {base_query}")
-        print(f"DEBUG: Query params: {params}")
+            from_clause += " AND d.department_name = %s"
+            where_params.append(department_filter)
+        
+        # Apply search filter (FULLTEXT index, best matches first)
+        order_by, order_params = "u.user_name", []
+        if search.strip():
+            search_condition, search_params, order_by, order_params = employee_search(search)
+            from_clause += f" AND {search_condition}"
+            where_params.extend(search_params)
+        
+        # Apply status filter (On-Leave takes precedence over Active/Inactive)
+        status_filter = status_filter.lower()
+        if status_filter == 'on-leave':
+            from_clause += f" AND {on_leave_today}"
+            where_params.extend(on_leave_params)
+        elif status_filter == 'active':
+            from_clause += f" AND u.is_active = 1 AND NOT {on_leave_today}"
+            where_params.extend(on_leave_params)
+        elif status_filter == 'inactive':
+            from_clause += f" AND (u.is_active = 0 OR u.is_active IS NULL) AND NOT {on_leave_today}"
+            where_params.extend(on_leave_params)
         
         # Count total records for pagination
-        count_query = "SELECT COUNT(*) as total FROM users_master u LEFT JOIN department d ON u.department_id = d.department_id WHERE 1=1"
-        count_params = []
-        
-        if department_filter != 'all':
-            count_query += " AND d.department_name = %s"
-            count_params.append(department_filter)
-        
-        if search:
-            count_query += " AND (u.user_name LIKE %s OR u.email LIKE %s OR u.designation LIKE %s OR d.department_name LIKE %s)"
-            count_params.extend([f'%{search}%', f'%{search}%', f'%{search}%', f'%{search}%'])
-        
-        cursor.execute(count_query, count_params)
+        cursor.execute(f"SELECT COUNT(*) as total {from_clause}", where_params)
         total_count_result = cursor.fetchone()
         total_count = total_count_result['total'] if total_count_result else 0
         
-        # Add pagination to main query
+        # Page query with the per-employee aggregates as correlated subqueries,
+        # so they are only evaluated for the rows on this page
         offset = (page - 1) * per_page
-        base_query += " LIMIT %s OFFSET %s"
-        params.extend([per_page, offset])
+        page_query = f"""
+            SELECT 
+                u.user_id as id,
+                u.user_name as name,
+                u.email,
+                u.contact_number as contact,
+                u.designation as position,
+                d.department_name as department,
+                u.date_of_birth,
+                u.gender,
+                u.is_active,
+                (
+                    SELECT COUNT(*) FROM leave_application lt
+                    WHERE lt.user_id = u.user_id AND lt.leave_status = 'approved'
+                ) as leaves_taken,
+                (
+                    SELECT SUM(lb.remaining_leaves) FROM leave_balance lb
+                    WHERE lb.user_id = u.user_id
+                ) as total_remaining,
+                {on_leave_today} as on_leave
+            {from_clause}
+            ORDER BY {order_by}
+            LIMIT %s OFFSET %s
+        """
+        params = on_leave_params + where_params + order_params + [per_page, offset]
         
-        # Execute main query
-        cursor.execute(base_query, params)
+        cursor.execute(page_query, params)
         employees = cursor.fetchall()
         
-        print(f"DEBUG: Found {len(employees)} employees")
-        
-        # For each employee, get additional stats and determine status
-        filtered_employees = []
-        today = date.today()
-        
         for employee in employees:
-            # Get total approved leaves count
-            cursor.execute("""
-                SELECT COUNT(*) as total_leaves 
-                FROM leave_application 
-                WHERE user_id = %s AND leave_status = 'approved'
-            """, (employee['id'],))
-            leave_count = cursor.fetchone()
-            employee['leaves_taken'] = leave_count['total_leaves'] if leave_count else 0
-            
-            # Get remaining leaves from leave_balance table
-            cursor.execute("""
-                SELECT SUM(remaining_leaves) as total_remaining
-                FROM leave_balance 
-                WHERE user_id = %s
-            """, (employee['id'],))
-            remaining_result = cursor.fetchone()
-            employee['remaining_leaves'] = remaining_result['total_remaining'] if remaining_result and remaining_result['total_remaining'] else 20 - employee['leaves_taken']
-            
-            # Check if on leave today
-            cursor.execute("""
-                SELECT COUNT(*) as on_leave 
-                FROM leave_application 
-                WHERE user_id = %s 
-                AND %s BETWEEN start_date AND end_date 
-                AND leave_status = 'approved'
-            """, (employee['id'], today))
-            on_leave = cursor.fetchone()
+            total_remaining = employee.pop('total_remaining')
+            employee['remaining_leaves'] = total_remaining if total_remaining else 20 - employee['leaves_taken']
             
             # Determine status
-            if on_leave and on_leave['on_leave'] > 0:
+            if employee.pop('on_leave'):
                 employee['status'] = 'On-Leave'
             elif employee['is_active']:
                 employee['status'] = 'Active'
             else:
                 employee['status'] = 'Inactive'
-            
-            # Apply status filter
-            if status_filter == 'all':
-                filtered_employees.append(employee)
-            elif status_filter.lower() == 'active' and employee['status'] == 'Active':
-                filtered_employees.append(employee)
-            elif status_filter.lower() == 'on-leave' and employee['status'] == 'On-Leave':
-                filtered_employees.append(employee)
-            elif status_filter.lower() == 'inactive' and employee['status'] == 'Inactive':
-                filtered_employees.append(employee)
-        
-        # Recalculate pagination based on filtered results
-        total_filtered = len(filtered_employees)
-        total_pages = (total_filtered + per_page - 1) // per_page if total_filtered > 0 else 1
+        
+        total_pages = (total_count + per_page - 1) // per_page if total_count > 0 else 1
         
         cursor.close()
         conn.close()
         
-        print(f"DEBUG: After filtering: {len(filtered_employees)} employees")
-        print("DEBUG: Successfully returning employee data")
-        
         return jsonify({
-            'employees': filtered_employees,
+            'employees': employees,
             'pagination': {
                 'current_page': page,
                 'per_page': per_page,
                 'total_pages': total_pages,
-                'total_count': total_filtered,
+                'total_count': total_count,
                 'has_prev': page > 1,
                 'has_next': page < total_pages
             }
@@ -191,75 +213,69 @@ def get_employee_stats():
     try:
         print("=== DEBUG: Starting get_employee_stats ===")
         
-        conn = get_db_connection()
-        if not conn:
-            print("DEBUG: Database connection failed")
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cursor = conn.cursor(dictionary=True)
         today = date.today()
         
-        # Total employees
-        print("DEBUG: Getting total employees...")
-        cursor.execute("SELECT COUNT(*) as total FROM users_master")
-        total_employees_result = cursor.fetchone()
+        # The six counts are independent - run them side by side
+        queries = {
+            # Total employees
+            'total': Query("SELECT COUNT(*) as total FROM users_master", one=True),
+            # Employees on leave today
+            'on_leave': Query("""
+                SELECT COUNT(DISTINCT user_id) as on_leave_count 
+                FROM leave_fact 
+                WHERE leave_status = 'approved'
+                AND start_date <= %s AND end_date >= %s
+            """, (today, today), one=True),
+            # Active employees (not on leave today)
+            'active': Query("SELECT COUNT(*) as active FROM users_master WHERE is_active = 1", one=True),
+            # Average leaves per employee
+            'avg_leaves': Query("""
+                SELECT COUNT(*) / NULLIF(COUNT(DISTINCT user_id), 0) as avg_leaves 
+                FROM leave_fact 
+                WHERE leave_status = 'approved'
+            """, one=True),
+            # Department distribution for chart
+            'departments': Query("""
+                SELECT d.department_name as department, COUNT(*) as count
+                FROM users_master u
+                JOIN department d ON u.department_id = d.department_id
+                GROUP BY d.department_name
+                ORDER BY count DESC
+            """),
+            # Leave type distribution
+            'leave_types': Query("""
+                SELECT NULLIF(leave_type, '') as leave_type, CAST(SUM(leave_count) AS SIGNED) as count
+                FROM leave_summary_monthly
+                WHERE leave_status = 'approved'
+                GROUP BY leave_type
+                ORDER BY count DESC
+            """)
+        }
+        
+        # Served by the interval index when it is available
+        on_leave_ids = leave_index.users_on_leave(today)
+        if on_leave_ids is not None:
+            del queries['on_leave']
+        
+        results = run_parallel(queries)
+        if on_leave_ids is not None:
+            results['on_leave'] = {'on_leave_count': len(on_leave_ids)}
+        
+        total_employees_result = results['total']
         total_employees = total_employees_result['total'] if total_employees_result else 0
         
-        # Employees on leave today
-        print("DEBUG: Getting employees on leave...")
-        cursor.execute("""
-            SELECT COUNT(DISTINCT user_id) as on_leave_count 
-            FROM leave_application 
-            WHERE %s BETWEEN start_date AND end_date 
-            AND leave_status = 'approved'
-        """, (today,))
-        on_leave_result = cursor.fetchone()
+        on_leave_result = results['on_leave']
         on_leave = on_leave_result['on_leave_count'] if on_leave_result else 0
         
-        # Active employees (not on leave today)
-        cursor.execute("SELECT COUNT(*) as active FROM users_master WHERE is_active = 1")
-        active_result = cursor.fetchone()
+        active_result = results['active']
         total_active = active_result['active'] if active_result else total_employees
         active_employees = total_active - on_leave
         
-        # Average leaves per employee
-        print("DEBUG: Getting average leaves...")
-        cursor.execute("""
-            SELECT AVG(leave_count) as avg_leaves 
-            FROM (
-                SELECT user_id, COUNT(*) as leave_count 
-                FROM leave_application 
-                WHERE leave_status = 'approved' 
-                GROUP BY user_id
-            ) as user_leaves
-        """)
-        avg_leaves_result = cursor.fetchone()
+        avg_leaves_result = results['avg_leaves']
         avg_leaves = round(avg_leaves_result['avg_leaves'] or 0, 1)
         
-        # Department distribution for chart
-        print("DEBUG: Getting department distribution...")
-        cursor.execute("""
-            SELECT d.department_name as department, COUNT(*) as count
-            FROM users_master u
-            JOIN department d ON u.department_id = d.department_id
-            GROUP BY d.department_name
-            ORDER BY count DESC
-        """)
-        department_distribution = cursor.fetchall()
-        
-        # Leave type distribution
-        print("DEBUG: Getting leave type distribution...")
-        cursor.execute("""
-            SELECT leave_type, COUNT(*) as count
-            FROM leave_application
-            WHERE leave_status = 'approved'
-            GROUP BY leave_type
-            ORDER BY count DESC
-        """)
-        leave_type_distribution = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
+        department_distribution = results['departments']
+        leave_type_distribution = results['leave_types']
         
         print(f"DEBUG: Stats - Total: {total_employees}, Active: {active_employees}, On Leave: {on_leave}, Avg Leaves: {avg_leaves}")
         print(f"DEBUG: Department dist: {department_distribution}")
@@ -279,21 +295,15 @@ def get_employee_stats():
         import traceback
         traceback.print_exc()
         return jsonify({'error': f'Failed to fetch employee statistics: {str(e)}'}), 500
+
 @employee_bp.route('/api/departments')
 def get_departments():
     """Get all departments"""
     try:
-        conn = get_db_connection()
-        if not conn:
+        departments = registry.departments()
+        if not departments:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT department_id as id, department_name as name FROM department ORDER BY department_name")
-        departments = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
         # Return both names and IDs for flexibility
         return jsonify({
             'departments': [dept['name'] for dept in departments],
@@ -312,23 +322,56 @@ def get_departments():
 def get_roles():
     """Get all roles"""
     try:
-        conn = get_db_connection()
-        if not conn:
+        roles = registry.roles()
+        if not roles:
             return jsonify({'error': 'Database connection failed'}), 500
         
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT role_id as id, role_name as name FROM role ORDER BY role_name")
-        roles = cursor.fetchall()
-        
-        cursor.close()
-        conn.close()
-        
         return jsonify([role['name'] for role in roles])
         
     except Exception as e:
         print(f"Error fetching roles: {e}")
         return jsonify(['Manager', 'HR', 'Senior', 'Junior', 'Intern'])
 
+@employee_bp.route('/api/employees/suggest')
+def suggest_employees():
+    """
+    Typeahead for employee and approver pickers (employee_directory tries).
+    Query: q (name or email prefix), department and role (name or id), limit (max 20)
+    """
+    try:
+        query = request.args.get('q', '')
+        limit = int(request.args.get('limit', 10))
+        scope = {}
+        for name, lookup in (('department', registry.department_id), ('role', registry.role_id)):
+            value = request.args.get(name, 'all')
+            if value == 'all' or not value:
+                scope[name] = None
+            else:
+                scope[name] = int(value) if value.isdigit() else lookup(value)
+                if scope[name] is None:
+                    return jsonify({'error': f'Unknown {name}: {value}'}), 400
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+
+    try:
+        matches = directory.suggest(query, scope['department'], scope['role'], limit)
+        if matches is None:
+            return jsonify({'error': 'Employee directory unavailable'}), 503
+
+        return jsonify({
+            'suggestions': [{
+                'user_id': entry.user_id,
+                'user_name': entry.user_name,
+                'email': entry.email,
+                'department_name': registry.department_name(entry.department_id),
+                'role_name': registry.role_name(entry.role_id)
+            } for entry in matches]
+        })
+
+    except Exception as e:
+        print(f"Error suggesting employees: {e}")
+        return jsonify({'error': 'Failed to suggest employees'}), 500
+
 @employee_bp.route('/api/employees/<int:employee_id>')
 def get_employee_details(employee_id):
     """Get detailed employee information"""
@@ -365,15 +408,19 @@ def get_employee_details(employee_id):
             return jsonify({'error': 'Employee not found'}), 404
         
         # Determine status
-        cursor.execute("""
-            SELECT COUNT(*) as on_leave 
-            FROM leave_application 
-            WHERE user_id = %s 
-            AND %s BETWEEN start_date AND end_date 
-            AND leave_status = 'approved'
-        """, (employee_id, today))
+        on_leave_ids = leave_index.users_on_leave(today)
+        if on_leave_ids is not None:
+            on_leave = {'on_leave': int(employee['id'] in on_leave_ids)}
+        else:
+            cursor.execute("""
+                SELECT COUNT(*) as on_leave 
+                FROM leave_application 
+                WHERE user_id = %s 
+                AND %s BETWEEN start_date AND end_date 
+                AND leave_status = 'approved'
+            """, (employee_id, today))
+            on_leave = cursor.fetchone()
         
-        on_leave = cursor.fetchone()
         if on_leave and on_leave['on_leave'] > 0:
             employee['status'] = 'On-Leave'
         elif employee['is_active']:
@@ -461,13 +508,10 @@ def add_employee():
         new_user_id = max_id + 1
         
         # Get or create department ID
-        cursor.execute("SELECT department_id FROM department WHERE department_name = %s", (data['department'],))
-        dept_result = cursor.fetchone()
+        department_id = registry.department_id(data['department'])
+        created_department = department_id is None
         
-        if dept_result:
-            # Department exists, use existing ID
-            department_id = dept_result[0]
-        else:
+        if created_department:
             # Department doesn't exist, create new department
             print(f"DEBUG: Department '{data['department']}' not found, creating new department")
             
@@ -533,6 +577,11 @@ def add_employee():
         cursor.close()
         conn.close()
         
+        if created_department:
+            invalidate_reference_data()
+        invalidate_user_data(new_user_id)
+        invalidate_directory()
+        
         return jsonify({
             'success': True,
             'message': 'Employee added successfully',
@@ -0,0 +1,273 @@
+# employee_directory.py - In-memory prefix trie for employee pickers
+#
+# /api/employees/suggest answers "employees whose name or email starts with
+# what was typed", optionally within one department or role, without SQL.
+# Every worker keeps the active users in prefix tries - one over everybody,
+# one per department, per role and per department and role - keyed by each
+# word of the name, the email and the words of its local part. Every trie
+# node keeps the TOP_K
+# best-ranked entries below it, so a lookup of up to TRIE_DEPTH characters is
+# a walk of len(prefix) nodes plus a slice; longer prefixes scan the keys
+# sharing their first TRIE_DEPTH characters. A second word filters the node
+# list, falling back to the entries of the subtree if that leaves too few.
+#
+# The tries are rebuilt when the cache 'directory' version moves
+# (cache.invalidate_directory, after user adds/edits/deactivations) or after
+# DIRECTORY_REFRESH seconds. A rebuild runs in one request thread while the
+# others keep answering from the previous tries.
+import re
+import threading
+import time
+from cache import cache
+from database import connection
+
+DIRECTORY_REFRESH = 300     # seconds
+RETRY_INTERVAL = 30         # after a failed build
+TOP_K = 20                  # best entries kept per trie node = largest suggest limit
+TRIE_DEPTH = 4              # trie levels; longer prefixes scan the bucket at this depth
+KEY_SPLIT = re.compile(r"[\s._\-@+]+")
+
+
+class DirectoryEntry:
+    """One active employee as stored in the tries"""
+    __slots__ = ('user_id', 'user_name', 'email', 'department_id', 'role_id', 'keys', 'rank')
+
+    def __init__(self, user_id, user_name, email, department_id, role_id):
+        self.user_id = user_id
+        self.user_name = user_name
+        self.email = email
+        self.department_id = department_id
+        self.role_id = role_id
+        email = (email or '').lower()
+        words = KEY_SPLIT.split((user_name or '').lower()) + KEY_SPLIT.split(email.split('@')[0])
+        self.keys = {key for key in words + [email] if key}
+        # Alphabetical by name; ties by id so the order is total
+        self.rank = ((user_name or '').lower(), user_id)
+
+    def __lt__(self, other):
+        return self.rank < other.rank
+
+    def matches(self, word):
+        """Whether some key of this entry starts with word"""
+        return any(key.startswith(word) for key in self.keys)
+
+
+class _Node:
+    __slots__ = ('children', 'top', 'bucket')
+
+    def __init__(self):
+        self.children = {}
+        self.top = []           # best TOP_K entries in this subtree, sorted
+        self.bucket = []        # (key, entry) of keys ending here - or, at TRIE_DEPTH, continuing below - in rank order
+
+
+def key_paths(entry):
+    """
+    (prefixes, ends) of an entry's keys in a trie: every distinct prefix of
+    up to TRIE_DEPTH characters, shortest first, and (key, prefix of the
+    node whose bucket holds it)
+    """
+    prefixes = {''}
+    ends = []
+    for key in entry.keys:
+        end = key[:TRIE_DEPTH]
+        prefixes.update(end[:length] for length in range(1, len(end) + 1))
+        ends.append((key, end))
+    return sorted(prefixes, key=len), ends
+
+
+class PrefixTrie:
+    """
+    Prefix trie over entry keys, TRIE_DEPTH characters deep, with per-node
+    top-k lists. Keys longer than that share the bucket of their first
+    TRIE_DEPTH characters, which longer prefixes scan in rank order. Nodes
+    are also indexed by their prefix, so a lookup is one dict access.
+    """
+
+    def __init__(self):
+        self.root = _Node()
+        self.nodes = {'': self.root}
+        self.size = 0
+
+    def add(self, entry, paths=None):
+        """Add an entry; entries must arrive best-ranked first"""
+        prefixes, ends = paths or key_paths(entry)
+        nodes = self.nodes
+        for prefix in prefixes:
+            node = nodes.get(prefix)
+            if node is None:
+                # Shortest first, so the parent exists
+                node = nodes[prefix] = nodes[prefix[:-1]].children[prefix[-1]] = _Node()
+            # In rank order, so the first TOP_K to arrive are the best
+            if len(node.top) < TOP_K:
+                node.top.append(entry)
+        for key, end in ends:
+            nodes[end].bucket.append((key, entry))
+        self.size += 1
+
+    def find(self, prefix):
+        return self.nodes.get(prefix[:TRIE_DEPTH])
+
+    @staticmethod
+    def subtree_entries(node):
+        """Every entry below node (each once), best first"""
+        found = {}
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            for _, entry in node.bucket:
+                found[entry.user_id] = entry
+            pending.extend(node.children.values())
+        return sorted(found.values())
+
+    def search(self, words, limit):
+        """
+        Best `limit` entries matching every word as a prefix. The longest
+        word walks the trie, the rest filter.
+        """
+        walk = max(words, key=len) if words else ''
+        node = self.find(walk)
+        if node is None:
+            return []
+        rest = list(words)
+        if words:
+            rest.remove(walk)
+
+        def wanted(entry):
+            return all(entry.matches(word) for word in rest)
+
+        if len(walk) > TRIE_DEPTH:
+            # Past the trie: scan the bucket, already in rank order
+            found = {}
+            for key, entry in node.bucket:
+                if key.startswith(walk) and entry.user_id not in found and wanted(entry):
+                    found[entry.user_id] = entry
+                    if len(found) == limit:
+                        break
+            return list(found.values())
+
+        if not rest:
+            return node.top[:limit]
+        found = [entry for entry in node.top if wanted(entry)]
+        if len(found) >= limit or len(node.top) < TOP_K:
+            # Either enough, or node.top already holds the whole subtree
+            return found[:limit]
+        found = []
+        for entry in self.subtree_entries(node):
+            if wanted(entry):
+                found.append(entry)
+                if len(found) == limit:
+                    break
+        return found
+
+
+class EmployeeDirectory:
+    """Tries over the active employees, by scope; rebuilt when users change"""
+
+    def __init__(self):
+        self._tries = None          # {(department_id or None, role_id or None): trie}
+        self._version = None
+        self._built_at = 0
+        self._failed_at = 0
+        self._refresh_lock = threading.Lock()
+
+    @staticmethod
+    def _load():
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("""
+                    SELECT user_id, user_name, email, department_id, role_id
+                    FROM users_master
+                    WHERE is_active = 1
+                """)
+                return [DirectoryEntry(row['user_id'], row['user_name'], row['email'],
+                                       row['department_id'], row['role_id'])
+                        for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+    def rebuild(self):
+        """Load the active employees and swap in new tries"""
+        started = time.perf_counter()
+        version = cache.version('directory')
+        entries = sorted(self._load(), key=lambda entry: entry.rank)
+        tries = {}
+        for entry in entries:
+            # Everybody, the department, the role, and the department's role
+            paths = key_paths(entry)
+            for scope in {(None, None), (entry.department_id, None),
+                          (None, entry.role_id), (entry.department_id, entry.role_id)}:
+                trie = tries.get(scope)
+                if trie is None:
+                    trie = tries[scope] = PrefixTrie()
+                trie.add(entry, paths)
+        self._tries = tries
+        self._version = version
+        self._built_at = time.monotonic()
+        print(f"✓ Employee directory built: {len(entries)} employees "
+              f"({time.perf_counter() - started:.2f}s)")
+
+    def _is_stale(self):
+        return (self._tries is None
+                or self._version != cache.version('directory')
+                or time.monotonic() - self._built_at > DIRECTORY_REFRESH)
+
+    def _refresh(self):
+        """Rebuild if stale; False if there are no tries to answer from"""
+        if not self._is_stale():
+            return True
+        # Another thread is already rebuilding - answer from the current tries meanwhile
+        if not self._refresh_lock.acquire(blocking=False):
+            return self._tries is not None
+        try:
+            if not self._is_stale() or time.monotonic() - self._failed_at < RETRY_INTERVAL:
+                return self._tries is not None
+            try:
+                self.rebuild()
+            except Exception as e:
+                self._failed_at = time.monotonic()
+                print(f"⚠ Employee directory unavailable: {e}")
+            return self._tries is not None
+        finally:
+            self._refresh_lock.release()
+
+    def suggest(self, query, department_id=None, role_id=None, limit=10):
+        """
+        Up to `limit` active employees matching every word of query as a
+        prefix of a name word or the email, alphabetically; None if the
+        directory cannot be loaded.
+        """
+        if not self._refresh():
+            return None
+        tries = self._tries
+        words = [word for word in KEY_SPLIT.split(query.strip().lower()) if word]
+        # A whole email address is one key
+        if '@' in query:
+            words = [query.strip().lower()]
+        limit = max(1, min(limit, TOP_K))
+
+        trie = tries.get((department_id, role_id))
+        if trie is None:
+            return []
+        return trie.search(words, limit)
+
+    def stats(self):
+        tries = self._tries or {}
+        return {
+            'employees': tries[(None, None)].size if (None, None) in tries else 0,
+            'scopes': len(tries),
+            'version': self._version
+        }
+
+
+directory = EmployeeDirectory()
+
+
+def init_app(app):
+    """Build the tries at startup (suggestions retry lazily if the database is down)"""
+    try:
+        directory.rebuild()
+    except Exception as e:
+        directory._failed_at = time.monotonic()
+        print(f"⚠ Employee directory not built: {e}")
@@ -0,0 +1,297 @@
+# events.py - Server-Sent Events push of leave status changes
+#
+# GET /events/stream keeps a text/event-stream open and sends one
+# 'leave-change' event per leave_change_log row the viewer may see (HR: all
+# rows, employees: their own). Each worker runs a single reader thread that
+# tails leave_change_log with the change_feed helpers and fans new rows out to
+# its open streams, so the database sees one query per worker per wake-up, not
+# one per connection.
+#
+# Writers call notify_leave_changes() after commit. The wake-up travels over
+# the cache backend's pub/sub channel: in-process with the memory backend,
+# across every worker when DAYOFFLY_CACHE_URL points at Redis. The reader also
+# polls every POLL_INTERVAL seconds, so a lost wake-up only delays an event.
+#
+# Browsers reconnect with Last-Event-ID and get the rows they missed from the
+# log. Idle streams cost a thread each under the threaded dev server; run
+# serve.py (gevent) or `gunicorn -k gevent` to hold thousands of them.
+import json
+import os
+import queue
+import threading
+import time
+from flask import Blueprint, Response, jsonify, request, session
+from cache import cache
+from database import connection
+from change_feed import (advance_position, current_position, fetch_log_rows,
+                         log_pruned_before, maybe_prune_change_log, status_label)
+
+events_bp = Blueprint('events', __name__)
+
+POLL_INTERVAL = 5           # seconds between reader wake-ups without a notification
+HEARTBEAT_INTERVAL = 15     # seconds between keep-alive comments on an idle stream
+RETRY_MS = 3000             # browser reconnect delay
+READ_BATCH = 500            # log rows per reader query
+REPLAY_LIMIT = 200          # missed rows replayed on reconnect before asking for a reset
+SUBSCRIBER_QUEUE = 256      # buffered events per stream before it is told to reset
+
+
+class Subscriber:
+    """One open stream; user_id None receives every change"""
+
+    def __init__(self, user_id=None):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self.overflowed = False
+
+    def wants(self, row):
+        return self.user_id is None or row['user_id'] == self.user_id
+
+    def offer(self, row):
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            # Slow consumer - drop its backlog and tell it to reload instead
+            self.overflowed = True
+
+
+class EventHub:
+    """Per-worker fan-out of leave_change_log rows to open streams"""
+
+    def __init__(self, backend, channel):
+        self.backend = backend
+        self.channel = channel
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._started_pid = None
+        self._position = None      # (high_water, gaps) of the log as read so far
+
+    def _ensure_started(self):
+        # Start lazily so each forked worker gets its own reader and subscription
+        pid = os.getpid()
+        if self._started_pid == pid:
+            return
+        with self._lock:
+            if self._started_pid == pid:
+                return
+            self._position = None
+            self.backend.subscribe(self.channel, self._on_message)
+            thread = threading.Thread(target=self._run, name='leave-events', daemon=True)
+            thread.start()
+            self._started_pid = pid
+
+    def _on_message(self, message):
+        self._wake.set()
+
+    def notify(self):
+        """Wake the readers of all workers (call after commit)"""
+        try:
+            self.backend.publish(self.channel, 'leave')
+        except Exception as e:
+            print(f"⚠ Event notification failed: {e}")
+
+    def subscribe(self, user_id=None):
+        self._ensure_started()
+        subscriber = Subscriber(user_id)
+        with self._lock:
+            self._subscribers.add(subscriber)
+        try:
+            self._prime()
+        except Exception:
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _prime(self):
+        """Record the reader's start before a stream begins so nothing after this point is skipped"""
+        with self._read_lock:
+            if self._position is not None:
+                return
+            with connection() as conn:
+                cursor = conn.cursor(dictionary=True)
+                try:
+                    self._position = current_position(cursor)
+                finally:
+                    cursor.close()
+
+    def _read(self):
+        """Log rows since the last read; the first read only records the current position"""
+        with self._read_lock, connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                if self._position is None:
+                    # Start from "now"; older rows are the replay's job
+                    self._position = current_position(cursor)
+                    return []
+                high_water, gaps = self._position
+                rows = fetch_log_rows(cursor, high_water, list(gaps), READ_BATCH)
+                self._position = advance_position(high_water, gaps, [row['seq'] for row in rows], time.time())
+                return rows
+            finally:
+                cursor.close()
+
+    def _publish_rows(self, rows):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for row in rows:
+            for subscriber in subscribers:
+                if subscriber.wants(row):
+                    subscriber.offer(row)
+
+    def _run(self):
+        while True:
+            self._wake.wait(POLL_INTERVAL)
+            self._wake.clear()
+            maybe_prune_change_log()
+            with self._lock:
+                idle = not self._subscribers
+            if idle:
+                # Nobody is listening; the next stream records a fresh position
+                with self._read_lock:
+                    self._position = None
+                continue
+            try:
+                rows = self._read()
+                while rows:
+                    self._publish_rows(rows)
+                    rows = self._read() if len(rows) == READ_BATCH else []
+            except Exception as e:
+                print(f"⚠ Leave event reader failed: {e}")
+                time.sleep(1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'position': self._position[0] if self._position else None
+            }
+
+
+hub = EventHub(cache.backend, f"{cache.prefix}:events")
+
+
+def notify_leave_changes():
+    """Push committed leave_change_log rows to open streams"""
+    hub.notify()
+
+
+def _event_payload(row):
+    changed_at = row.get('changed_at')
+    return {
+        'seq': row['seq'],
+        'leave_id': row['leave_id'],
+        'user_id': row['user_id'],
+        'old_status': status_label(row['old_status']) if row['old_status'] else None,
+        'new_status': status_label(row['new_status']) if row['new_status'] else None,
+        'changed_at': changed_at.isoformat() if hasattr(changed_at, 'isoformat') else changed_at
+    }
+
+
+def _format_event(event, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+
+def _replay(last_event_id, user_id):
+    """Rows after Last-Event-ID for this viewer; None if the client should reload instead"""
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            if log_pruned_before(cursor, last_event_id):
+                return None
+            rows = fetch_log_rows(cursor, last_event_id, [], REPLAY_LIMIT + 1, user_id)
+            return rows if len(rows) <= REPLAY_LIMIT else None
+        finally:
+            cursor.close()
+
+
+def _stream(subscriber, last_event_id):
+    """Generator behind /events/stream; unsubscribes when the client goes away"""
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+
+        # Subscribed first, so nothing committed during the replay is missed
+        sent = set()
+        last_id = last_event_id or 0
+        if last_event_id is not None:
+            try:
+                rows = _replay(last_event_id, subscriber.user_id)
+            except Exception as e:
+                print(f"⚠ Event replay failed: {e}")
+                rows = None
+            if rows is None:
+                yield _format_event('reset', {})
+            else:
+                for row in rows:
+                    sent.add(row['seq'])
+                    last_id = max(last_id, row['seq'])
+                    yield _format_event('leave-change', _event_payload(row), last_id)
+
+        while True:
+            if subscriber.overflowed:
+                subscriber.overflowed = False
+                while not subscriber.queue.empty():
+                    subscriber.queue.get_nowait()
+                yield _format_event('reset', {})
+                continue
+            try:
+                row = subscriber.queue.get(timeout=HEARTBEAT_INTERVAL)
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            if row['seq'] in sent:
+                sent.discard(row['seq'])
+                continue
+            # ids only move forward so a reconnect never replays what was already shown
+            last_id = max(last_id, row['seq'])
+            yield _format_event('leave-change', _event_payload(row), last_id)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+@events_bp.route('/events/stream')
+def event_stream():
+    """SSE stream of leave status changes for the logged-in user (HR: everyone)"""
+    if 'logged_in' not in session or not session['logged_in']:
+        return jsonify({"success": False, "message": "Not authenticated"}), 401
+
+    user = session.get('user', {})
+    user_id = None if user.get('role_name') == 'HR' else user.get('user_id')
+    if user.get('role_name') != 'HR' and user_id is None:
+        return jsonify({"success": False, "message": "Not authenticated"}), 401
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    try:
+        subscriber = hub.subscribe(user_id)
+    except Exception as e:
+        print(f"Error opening event stream: {e}")
+        return jsonify({"success": False, "message": "Event stream unavailable"}), 503
+
+    response = Response(_stream(subscriber, last_event_id), mimetype='text/event-stream')
+    # Also covers clients that disconnect before the generator first runs
+    response.call_on_close(lambda: hub.unsubscribe(subscriber))
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@events_bp.route('/debug/events')
+def event_stats():
+    """Open streams and reader position of this worker"""
+    return jsonify(hub.stats())
@@ -2,192 +2,144 @@
 from flask import Blueprint, request, jsonify, session
 from functools import wraps
 import mysql.connector
+from database import get_db_connection, Query
+from parallel import run_parallel
+from http_caching import conditional
+from leave_requests_backend import decide_leave_request
+from leave_listing import fetch_leave_page
+from change_feed import current_change_token
 from datetime import datetime
 import os
 
 # Create Blueprint for HR routes
 hr_bp = Blueprint('hr', __name__)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'dayoffly',
-    'port': 3306
-}
+def leave_requests_page(cursor, args=None):
+    """
+    Get one page of leave requests, newest first.
+    args: status/type/department/from/to filters plus limit and cursor.
+    Returns: (formatted requests, next_cursor, change token or None)
+    Raises ValueError on a bad filter or cursor.
+    """
+    args = args or {}
+    
+    # Token for /hr/leave-changes, read before the listing so no change is missed
+    change_token = current_change_token(cursor) if not args.get('cursor') else None
+    
+    # Query one page of leave requests with employee details
+    columns = """
+        la.leave_id,
+        u.user_name as employee,
+        la.leave_type as type,
+        la.start_date,
+        la.end_date,
+        DATEDIFF(la.end_date, la.start_date) + 1 as duration_days,
+        la.applied_on,
+        la.leave_status as status,
+        u.designation,
+        d.department_name,
+        approver.user_name as approver_name
+    """
+    
+    requests, next_cursor = fetch_leave_page(cursor, columns, args)
+    
+    # Format the data for frontend
+    formatted_requests = []
+    for req in requests:
+        # Format dates
+        start_date = req['start_date'].strftime('%b %d, %Y') if req['start_date'] else ''
+        end_date = req['end_date'].strftime('%b %d, %Y') if req['end_date'] else ''
+        dates = f"{start_date} – {end_date}" if start_date and end_date else ''
+        
+        # Format duration
+        duration = f"{req['duration_days']} day{'s' if req['duration_days'] != 1 else ''}"
+        
+        # Format status for frontend
+        status_map = {
+            'pending': 'Pending',
+            'approved': 'Approved',
+            'declined': 'Rejected'
+        }
+        status = status_map.get(req['status'].lower(), req['status'])
+        
+        formatted_requests.append({
+            'employee': req['employee'],
+            'type': req['type'],
+            'dates': dates,
+            'duration': duration,
+            'status': status,
+            'leave_id': req['leave_id'],
+            'designation': req['designation'],
+            'department': req['department_name'],
+            'applied_on': req['applied_on'].strftime('%Y-%m-%d %H:%M') if req['applied_on'] else '',
+            'approver': req['approver_name']
+        })
+    
+    return formatted_requests, next_cursor, change_token
 
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"✗ Database connection failed: {e}")
-        return None
+def dashboard_stats_queries():
+    """The reads behind the dashboard statistics"""
+    return {
+        # Total employees count
+        'total_employees': Query("SELECT COUNT(*) as total FROM users_master WHERE is_active = 1", one=True),
+        # Status counts, approved-type distribution and this year's monthly
+        # trends all come from the (small) monthly summary table
+        'summary_rows': Query("""
+            SELECT applied_month, leave_type, leave_status, SUM(leave_count) as count
+            FROM leave_summary_monthly
+            GROUP BY applied_month, leave_type, leave_status
+        """)
+    }
 
-def get_leave_requests():
-    """Get all leave requests from database"""
-    conn = get_db_connection()
-    if not conn:
-        return []
+def build_dashboard_stats(results):
+    """Get dashboard statistics from the dashboard_stats_queries results"""
+    total_employees = results['total_employees']['total']
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Query to get all leave requests with employee details
-        query = """
-        SELECT 
-            la.leave_id,
-            u.user_name as employee,
-            la.leave_type as type,
-            la.start_date,
-            la.end_date,
-            DATEDIFF(la.end_date, la.start_date) + 1 as duration_days,
-            la.applied_on,
-            la.leave_status as status,
-            u.designation,
-            d.department_name,
-            approver.user_name as approver_name
-        FROM leave_application la
-        JOIN users_master u ON la.user_id = u.user_id
-        LEFT JOIN department d ON u.department_id = d.department_id
-        LEFT JOIN users_master approver ON u.approver_id = approver.user_id
-        ORDER BY la.applied_on DESC
-        """
-        
-        cursor.execute(query)
-        requests = cursor.fetchall()
-        
-        # Format the data for frontend
-        formatted_requests = []
-        for req in requests:
-            # Format dates
-            start_date = req['start_date'].strftime('%b %d, %Y') if req['start_date'] else ''
-            end_date = req['end_date'].strftime('%b %d, %Y') if req['end_date'] else ''
-            dates = f"{start_date} – {end_date}" if start_date and end_date else ''
-            
-            # Format duration
-            duration = f"{req['duration_days']} day{'s' if req['duration_days'] != 1 else ''}"
-            
-            # Format status for frontend
-            status_map = {
-                'pending': 'Pending',
-                'approved': 'Approved',
-                'declined': 'Rejected'
-            }
-            status = status_map.get(req['status'].lower(), req['status'])
-            
-            formatted_requests.append({
-                'employee': req['employee'],
-                'type': req['type'],
-                'dates': dates,
-                'duration': duration,
-                'status': status,
-                'leave_id': req['leave_id'],
-                'designation': req['designation'],
-                'department': req['department_name'],
-                'applied_on': req['applied_on'].strftime('%Y-%m-%d %H:%M') if req['applied_on'] else '',
-                'approver': req['approver_name']
-            })
-        
-        return formatted_requests
-        
-    except mysql.connector.Error as e:
-        print(f"Database error: {e}")
-        return []
-    except Exception as e:
-        print(f"Unexpected error: {e}")
-        return []
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        conn.close()
-
-def get_dashboard_stats():
-    """Get dashboard statistics"""
-    conn = get_db_connection()
-    if not conn:
-        return {}
+    # Format monthly trends data
+    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+    monthly_trends = {
+        'approved': [0] * 12,
+        'pending': [0] * 12,
+        'rejected': [0] * 12
+    }
+    leave_stats = {'total': 0, 'pending': 0, 'approved': 0, 'rejected': 0}
+    leave_type_counts = {}
+    current_year = str(datetime.now().year)
     
-    try:
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get total employees count
-        cursor.execute("SELECT COUNT(*) as total FROM users_master WHERE is_active = 1")
-        total_employees = cursor.fetchone()['total']
-        
-        # Get leave requests counts by status
-        cursor.execute("""
-            SELECT 
-                COUNT(*) as total,
-                SUM(CASE WHEN leave_status = 'pending' THEN 1 ELSE 0 END) as pending,
-                SUM(CASE WHEN leave_status = 'approved' THEN 1 ELSE 0 END) as approved,
-                SUM(CASE WHEN leave_status = 'declined' THEN 1 ELSE 0 END) as rejected
-            FROM leave_application
-        """)
-        leave_stats = cursor.fetchone()
-        
-        # Get leave type distribution
-        cursor.execute("""
-            SELECT leave_type, COUNT(*) as count 
-            FROM leave_application 
-            WHERE leave_status = 'approved'
-            GROUP BY leave_type
-        """)
-        leave_types_data = cursor.fetchall()
-        
-        # Get monthly trends
-        cursor.execute("""
-            SELECT 
-                MONTH(applied_on) as month,
-                leave_status,
-                COUNT(*) as count
-            FROM leave_application 
-            WHERE YEAR(applied_on) = YEAR(CURDATE())
-            GROUP BY MONTH(applied_on), leave_status
-            ORDER BY month
-        """)
-        monthly_data = cursor.fetchall()
-        
-        # Format monthly trends data
-        months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-        monthly_trends = {
-            'approved': [0] * 12,
-            'pending': [0] * 12,
-            'rejected': [0] * 12
-        }
-        
-        for data in monthly_data:
-            month_index = data['month'] - 1
-            if month_index < 12:
-                status = data['leave_status']
-                if status in monthly_trends:
-                    monthly_trends[status][month_index] = data['count']
-        
-        return {
-            'total_employees': total_employees,
-            'leave_requests': {
-                'total': leave_stats['total'] or 0,
-                'pending': leave_stats['pending'] or 0,
-                'approved': leave_stats['approved'] or 0,
-                'rejected': leave_stats['rejected'] or 0
-            },
-            'leave_types': leave_types_data,
-            'monthly_trends': monthly_trends,
-            'months': months
-        }
-        
-    except mysql.connector.Error as e:
-        print(f"Database error in stats: {e}")
-        return {}
-    except Exception as e:
-        print(f"Unexpected error in stats: {e}")
-        return {}
-    finally:
-        if 'cursor' in locals():
-            cursor.close()
-        conn.close()
+    for data in results['summary_rows']:
+        status = data['leave_status']
+        count = int(data['count'])
+        
+        leave_stats['total'] += count
+        if status == 'pending':
+            leave_stats['pending'] += count
+        elif status == 'approved':
+            leave_stats['approved'] += count
+            leave_type = data['leave_type'] or None
+            leave_type_counts[leave_type] = leave_type_counts.get(leave_type, 0) + count
+        elif status == 'declined':
+            leave_stats['rejected'] += count
+        
+        if data['applied_month'].startswith(current_year) and status in monthly_trends:
+            monthly_trends[status][int(data['applied_month'][5:7]) - 1] += count
+    
+    leave_types_data = [
+        {'leave_type': leave_type, 'count': count}
+        for leave_type, count in sorted(leave_type_counts.items(), key=lambda item: item[0] or '')
+    ]
+    
+    return {
+        'total_employees': total_employees,
+        'leave_requests': {
+            'total': leave_stats['total'],
+            'pending': leave_stats['pending'],
+            'approved': leave_stats['approved'],
+            'rejected': leave_stats['rejected']
+        },
+        'leave_types': leave_types_data,
+        'monthly_trends': monthly_trends,
+        'months': months
+    }
 
 # TEMPORARILY REMOVED AUTHENTICATION - WILL BE ADDED BACK LATER
 def hr_required(f):
@@ -200,19 +152,33 @@ def hr_required(f):
 
 @hr_bp.route('/hr/dashboard-data', methods=['GET'])
 @hr_required
+@conditional
 def hr_dashboard_data():
     """Get HR dashboard data"""
     try:
-        # Get all data
-        leave_requests = get_leave_requests()
-        dashboard_stats = get_dashboard_stats()
+        # The first page of requests (or the page after ?cursor=) and the stats
+        # are independent - run them side by side
+        args = request.args
+        results = run_parallel({
+            'page': lambda cursor: leave_requests_page(cursor, args),
+            **dashboard_stats_queries()
+        })
+        leave_requests, next_cursor, change_token = results['page']
+        dashboard_stats = build_dashboard_stats(results)
         
         return jsonify({
             "success": True,
             "leave_requests": leave_requests,
+            "next_cursor": next_cursor,
+            "change_token": change_token,
             "dashboard_stats": dashboard_stats
         })
         
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
     except Exception as e:
         print(f"Error in HR dashboard: {e}")
         return jsonify({
@@ -221,73 +187,7 @@ def hr_dashboard_data():
         }), 500
 
 @hr_bp.route('/hr/update-leave-status', methods=['POST'])
-@hr_required  # Add the decorator here too
+@hr_required
 def update_leave_status():
-    """Update leave request status - TEMPORARILY NO AUTH"""
-    try:
-        # TEMPORARILY COMMENTED OUT AUTHENTICATION
-        # if 'logged_in' not in session or not session['logged_in']:
-        #     return jsonify({"success": False, "message": "Not authenticated"}), 401
-        
-        data = request.get_json()
-        leave_id = data.get('leave_id')
-        status = data.get('status')
-        employee_name = data.get('employee_name')
-        
-        if not leave_id or not status:
-            return jsonify({"success": False, "message": "Missing required fields"}), 400
-        
-        # Map frontend status to database status
-        status_map = {
-            'Approved': 'approved',
-            'Rejected': 'declined',
-            'Pending': 'pending'
-        }
-        db_status = status_map.get(status, status.lower())
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({"success": False, "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
-        
-        # Update leave status
-        update_query = "UPDATE leave_application SET leave_status = %s WHERE leave_id = %s"
-        cursor.execute(update_query, (db_status, leave_id))
-        conn.commit()
-        
-        # If approved, update leave balance (simplified - you might want to enhance this)
-        if db_status == 'approved':
-            # Get leave details to update balance
-            cursor.execute("""
-                SELECT user_id, leave_type, DATEDIFF(end_date, start_date) + 1 as days 
-                FROM leave_application 
-                WHERE leave_id = %s
-            """, (leave_id,))
-            leave_details = cursor.fetchone()
-            
-            if leave_details:
-                user_id, leave_type, days = leave_details
-                # Update leave balance
-                cursor.execute("""
-                    UPDATE leave_balance 
-                    SET used_leaves = used_leaves + %s, 
-                        remaining_leaves = total_leaves - (used_leaves + %s)
-                    WHERE user_id = %s AND leave_type = %s
-                """, (days, days, user_id, leave_type))
-                conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            "success": True,
-            "message": f"Leave {status.lower()} for {employee_name}"
-        })
-        
-    except Exception as e:
-        print(f"Error updating leave status: {e}")
-        return jsonify({
-            "success": False,
-            "message": "Internal server error"
-        }), 500
\ No newline at end of file
+    """Update leave request status (shared with leave_requests_backend)"""
+    return decide_leave_request(request.get_json(silent=True))
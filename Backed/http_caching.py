@@ -0,0 +1,138 @@
+# http_caching.py - Conditional GET (ETag / If-None-Match) and response compression
+#
+# ETags are derived from data versions rather than response bodies: the cache
+# 'analytics' namespace version is bumped after every leave, balance and user
+# write (cache.invalidate_user_data) and 'reference' after department/role
+# changes. A client presenting the current ETag gets a 304 before the view
+# runs any query or serializes anything.
+#
+# The versions and the counter generation are shared by every worker (the
+# cache_counters table, or Redis), so a write in one gunicorn worker changes
+# the ETag all of them compute within cache.VERSION_POLL seconds - no worker
+# keeps answering 304 for data another one has changed.
+from functools import wraps
+from datetime import date
+import gzip
+import hashlib
+import os
+from flask import request, session, make_response
+from cache import cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get('DAYOFFLY_COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = 6
+BROTLI_QUALITY = 5
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/x-ndjson',
+    'text/html',
+    'text/css',
+    'text/csv',
+    'text/plain'
+}
+
+# Data versions every conditional endpoint depends on
+DATA_NAMESPACES = ('analytics', 'reference')
+
+
+def etag_for(path, query_string, user_id):
+    """Strong ETag: data version + URL + viewer + day"""
+    parts = [
+        cache.data_version(*DATA_NAMESPACES),
+        path,
+        query_string,
+        str(user_id),
+        # Views derive "on leave now", periods and trends from today's date
+        date.today().isoformat()
+    ]
+    return hashlib.sha1('|'.join(parts).encode()).hexdigest()
+
+
+def compute_etag():
+    """ETag for the current Flask request"""
+    user_id = session.get('user', {}).get('user_id', '')
+    return etag_for(request.path, request.query_string.decode(), user_id)
+
+
+def etag_matches(if_none_match, etag):
+    # A compressed representation carries an encoding suffix (see compress_response)
+    return any(if_none_match.contains(candidate)
+               for candidate in (etag, f"{etag}-gzip", f"{etag}-br"))
+
+
+def conditional(f):
+    """Answer If-None-Match with 304 when the data version has not moved"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        try:
+            etag = compute_etag()
+        except Exception as e:
+            print(f"⚠ ETag unavailable: {e}")
+            etag = None
+
+        if etag and etag_matches(request.if_none_match, etag):
+            response = make_response('', 304)
+        else:
+            response = make_response(f(*args, **kwargs))
+            if not etag or response.status_code != 200:
+                return response
+
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        response.vary.add('Cookie')
+        return response
+    return decorated_function
+
+
+def _choose_encoding(accept_encoding):
+    if brotli is not None and 'br' in accept_encoding:
+        return 'br'
+    if 'gzip' in accept_encoding:
+        return 'gzip'
+    return None
+
+
+def compress_body(data, accept_encoding):
+    """(body, encoding) - encoding is None when the body is sent as is"""
+    encoding = _choose_encoding(accept_encoding)
+    if encoding is None or len(data) < COMPRESS_MIN_SIZE:
+        return data, None
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY), encoding
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL), encoding
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encode sizeable text responses"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    data, encoding = compress_body(response.get_data(), request.headers.get('Accept-Encoding', ''))
+    if encoding is None:
+        return response
+
+    response.set_data(data)
+    response.headers['Content-Encoding'] = encoding
+
+    # Each encoding is a different representation, so it needs its own strong ETag
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
+
+
+def init_app(app):
+    app.after_request(compress_response)
@@ -0,0 +1,236 @@
+# leave_application_backend.py - Leave application submission
+#
+# POST /api/leave-applications validates the request, rejects overlaps with
+# the user's pending or approved leaves, reserves the working days against the
+# balance and inserts the application - all in one transaction with a fixed
+# number of statements:
+#
+#   1. claim the idempotency key (if given)   INSERT, unique (user_id, key)
+#   2. lock the user                           SELECT ... FOR UPDATE
+#   3. overlap check                           range predicate on idx_user_status_dates
+#   4. reserve the days                        conditional UPDATE (leave_balance)
+#   5. insert the application, link the key, refresh leave_fact, commit
+#
+# The user row lock serializes one user's submissions, so two concurrent
+# requests cannot both pass the overlap check. A retry with the same
+# Idempotency-Key waits on the key's unique index until the first attempt
+# commits or rolls back, and then gets the original application back instead
+# of a duplicate - provided it carries the same fields: the key is stored with
+# a hash of the request, and a different body under a used key is a 422.
+from flask import Blueprint, jsonify, request, session
+from datetime import datetime
+import hashlib
+import json
+import mysql.connector
+from mysql.connector import errorcode
+from business_days import business_days, check_supported
+from cache import invalidate_user_data
+from database import get_db_connection
+from events import notify_leave_changes
+from leave_balance import InsufficientBalance, reserve_days
+from leave_facts import refresh_leave_facts
+from reference_data import registry
+
+leave_application_bp = Blueprint('leave_application', __name__)
+
+IDEMPOTENCY_KEY_MAX = 64
+# Keys are kept this long; after that the same key submits a new application
+IDEMPOTENCY_TTL_HOURS = 24
+
+
+class SubmissionRejected(Exception):
+    """Validation failure detected inside the transaction"""
+
+    def __init__(self, message, status=400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+
+def _parse_date(value):
+    try:
+        return datetime.strptime(value or '', '%Y-%m-%d').date()
+    except ValueError:
+        return None
+
+
+def _request_hash(leave_type, start_date, end_date, reason):
+    """SHA-1 of the fields a retry must repeat unchanged"""
+    payload = json.dumps([leave_type, start_date.isoformat(), end_date.isoformat(), reason])
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _replay(cursor, user_id, idempotency_key):
+    """The application created by an earlier request with this key, or None"""
+    cursor.execute("""
+        SELECT la.leave_id, la.leave_type, la.start_date, la.end_date, la.leave_status, lf.working_days,
+               k.request_hash
+        FROM leave_idempotency_keys k
+        JOIN leave_application la ON k.leave_id = la.leave_id
+        LEFT JOIN leave_fact lf ON la.leave_id = lf.leave_id
+        WHERE k.user_id = %s AND k.idempotency_key = %s
+    """, (user_id, idempotency_key))
+    return cursor.fetchone()
+
+
+def _format_application(leave, working_days):
+    return {
+        'leave_id': leave['leave_id'],
+        'leave_type': leave['leave_type'],
+        'start_date': leave['start_date'].isoformat(),
+        'end_date': leave['end_date'].isoformat(),
+        'status': leave['leave_status'],
+        'working_days': working_days
+    }
+
+
+def submit_application(conn, user_id, leave_type, start_date, end_date, reason, days, idempotency_key=None):
+    """
+    Run the submission transaction. Returns (application, replayed); raises
+    SubmissionRejected or InsufficientBalance (the transaction is rolled back).
+    """
+    cursor = conn.cursor(dictionary=True)
+    request_hash = _request_hash(leave_type, start_date, end_date, reason)
+    try:
+        # Read committed: the overlap check must see submissions committed while we waited for the user lock
+        conn.start_transaction(isolation_level='READ COMMITTED')
+
+        if idempotency_key:
+            cursor.execute("""
+                DELETE FROM leave_idempotency_keys
+                WHERE user_id = %s AND idempotency_key = %s
+                    AND created_at < NOW() - INTERVAL %s HOUR
+            """, (user_id, idempotency_key, IDEMPOTENCY_TTL_HOURS))
+            try:
+                cursor.execute("""
+                    INSERT INTO leave_idempotency_keys (user_id, idempotency_key, request_hash)
+                    VALUES (%s, %s, %s)
+                """, (user_id, idempotency_key, request_hash))
+            except mysql.connector.IntegrityError as e:
+                if e.errno != errorcode.ER_DUP_ENTRY:
+                    raise
+                conn.rollback()
+                previous = _replay(cursor, user_id, idempotency_key)
+                if previous is None:
+                    raise SubmissionRejected("A request with this idempotency key is still being processed", 409)
+                # Keys stored before request_hash existed have none to compare
+                if previous['request_hash'] and previous['request_hash'] != request_hash:
+                    raise SubmissionRejected("This idempotency key was already used for a different request", 422)
+                return _format_application(previous, previous['working_days']), True
+
+        cursor.execute("SELECT user_id FROM users_master WHERE user_id = %s AND is_active = 1 FOR UPDATE", (user_id,))
+        if cursor.fetchone() is None:
+            raise SubmissionRejected("User not found or inactive", 404)
+
+        cursor.execute("""
+            SELECT leave_id, start_date, end_date
+            FROM leave_application
+            WHERE user_id = %s AND leave_status IN ('pending', 'approved')
+                AND start_date <= %s AND end_date >= %s
+            LIMIT 1
+        """, (user_id, end_date, start_date))
+        overlapping = cursor.fetchone()
+        if overlapping:
+            raise SubmissionRejected(
+                f"Overlaps leave {overlapping['leave_id']} "
+                f"({overlapping['start_date'].isoformat()} to {overlapping['end_date'].isoformat()})",
+                409, conflicting_leave_id=overlapping['leave_id'])
+
+        reserve_days(conn, user_id, leave_type, days)
+
+        cursor.execute("""
+            INSERT INTO leave_application
+                (user_id, leave_type, start_date, end_date, reason, leave_status, reserved_days)
+            VALUES (%s, %s, %s, %s, %s, 'pending', %s)
+        """, (user_id, leave_type, start_date, end_date, reason, days))
+        leave_id = cursor.lastrowid
+
+        if idempotency_key:
+            cursor.execute("""
+                UPDATE leave_idempotency_keys SET leave_id = %s
+                WHERE user_id = %s AND idempotency_key = %s
+            """, (leave_id, user_id, idempotency_key))
+
+        refresh_leave_facts(conn, [leave_id])
+        conn.commit()
+
+        application = {'leave_id': leave_id, 'leave_type': leave_type, 'start_date': start_date,
+                       'end_date': end_date, 'leave_status': 'pending'}
+        return _format_application(application, days), False
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+@leave_application_bp.route('/api/leave-applications', methods=['POST'])
+def create_leave_application():
+    """
+    Submit a leave application for the logged-in user.
+    Body: leave_type, start_date, end_date (YYYY-MM-DD), reason.
+    Header: Idempotency-Key (optional) - retries with the same key return the original application.
+    """
+    if 'logged_in' not in session or not session['logged_in']:
+        return jsonify({"success": False, "message": "Authentication required"}), 401
+    user = session.get('user', {})
+    user_id = user.get('user_id')
+    if not user_id:
+        return jsonify({"success": False, "message": "Authentication required"}), 401
+
+    data = request.get_json(silent=True) or {}
+    leave_type = (data.get('leave_type') or '').strip()
+    start_date = _parse_date(data.get('start_date'))
+    end_date = _parse_date(data.get('end_date'))
+    reason = (data.get('reason') or '').strip()
+    idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+
+    if not leave_type or not reason or not start_date or not end_date:
+        return jsonify({"success": False, "message": "leave_type, start_date, end_date and reason are required"}), 400
+    if not registry.is_leave_type(leave_type):
+        return jsonify({
+            "success": False,
+            "message": f"Unknown leave type: {leave_type}",
+            "leave_types": sorted(registry.leave_types())
+        }), 400
+    if end_date < start_date:
+        return jsonify({"success": False, "message": "End date must not be before start date"}), 400
+    try:
+        check_supported(start_date, end_date)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    if idempotency_key and len(idempotency_key) > IDEMPOTENCY_KEY_MAX:
+        return jsonify({"success": False, "message": f"Idempotency key longer than {IDEMPOTENCY_KEY_MAX} characters"}), 400
+
+    try:
+        # Charged in working days of the employee's region
+        region = registry.department_region(registry.department_id(user.get('department_name')))
+        days = business_days.working_days(start_date, end_date, region)
+        if days == 0:
+            return jsonify({"success": False, "message": "The selected dates contain no working days"}), 400
+
+        conn = get_db_connection()
+        if not conn:
+            return jsonify({"success": False, "message": "Database connection failed"}), 500
+
+        application, replayed = submit_application(conn, user_id, leave_type, start_date, end_date,
+                                                   reason, days, idempotency_key)
+        if not replayed:
+            invalidate_user_data(user_id)
+            notify_leave_changes()
+            print(f"✓ Leave {application['leave_id']} submitted by {user_id}: {days} working day(s) reserved")
+
+        return jsonify({"success": True, "replayed": replayed, "application": application}), 200 if replayed else 201
+
+    except SubmissionRejected as e:
+        return jsonify({"success": False, "message": str(e), **e.details}), e.status
+    except InsufficientBalance as e:
+        return jsonify({
+            "success": False,
+            "message": f"Insufficient {leave_type} balance: {e}",
+            "available": e.available,
+            "requested": e.requested
+        }), 409
+    except Exception as e:
+        print(f"✗ Error submitting leave application: {e}")
+        return jsonify({"success": False, "message": "Internal server error"}), 500
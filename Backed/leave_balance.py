@@ -0,0 +1,253 @@
+# leave_balance.py - Leave balance reservations and settlement
+#
+# Submitting a leave reserves its working days against the user's balance for
+# that leave type (leave_balance.pending_leaves) in the same transaction as the
+# insert, and records the reservation on the application (reserved_days). The
+# days an employee can still request are remaining_leaves - pending_leaves.
+#
+# When HR decides, settle_decisions releases the reservations and moves the
+# days into used_leaves on approval (or back out when an approval is
+# reverted) - for one leave or a whole batch with set-based statements. A
+# leave moved back to pending reserves its days again, like a new request.
+#
+# Every mutation is a conditional statement on the (user_id, leave_type)
+# primary key - no read-modify-write: missing rows are created by an upsert
+# that leaves existing rows alone, and the days are moved by UPDATEs whose
+# WHERE clause re-checks the balance, so concurrent sessions only wait on
+# the one row they both touch. The functions run on the caller's
+# connection; the caller commits.
+
+from business_days import business_days
+from reference_data import registry
+
+# Allowance of balance rows created on first use of a leave type
+DEFAULT_ALLOWANCE = 20
+
+# Days available to request / approve, NULL-safe for rows from older imports
+AVAILABLE = "COALESCE(remaining_leaves, total_leaves - COALESCE(used_leaves, 0)) - pending_leaves"
+
+
+class InsufficientBalance(Exception):
+    """The leave needs more days than the balance has available"""
+
+    def __init__(self, available, requested, user_id=None, leave_type=None):
+        super().__init__(f"{requested} day(s) requested, {available} available")
+        self.available = available
+        self.requested = requested
+        self.user_id = user_id
+        self.leave_type = leave_type
+
+
+def _reserve(cursor, user_id, leave_type, days):
+    """The guarded reservation; True if the balance had the days"""
+    cursor.execute(f"""
+        UPDATE leave_balance
+        SET pending_leaves = pending_leaves + %s
+        WHERE user_id = %s AND leave_type = %s AND {AVAILABLE} >= %s
+    """, (days, user_id, leave_type, days))
+    return cursor.rowcount > 0
+
+
+def reserve_days(conn, user_id, leave_type, days):
+    """
+    Reserve days against the user's balance for leave_type, or raise
+    InsufficientBalance. The check and the reservation are one conditional
+    UPDATE; a leave type without a balance row starts at DEFAULT_ALLOWANCE.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        if _reserve(cursor, user_id, leave_type, days):
+            return
+
+        # First use of this leave type: create the row (a no-op if a
+        # concurrent request just did) and try once more
+        cursor.execute("""
+            INSERT INTO leave_balance
+                (user_id, leave_type, total_leaves, used_leaves, remaining_leaves, pending_leaves)
+            VALUES (%s, %s, %s, 0, %s, 0)
+            ON DUPLICATE KEY UPDATE total_leaves = total_leaves
+        """, (user_id, leave_type, DEFAULT_ALLOWANCE, DEFAULT_ALLOWANCE))
+        if _reserve(cursor, user_id, leave_type, days):
+            return
+
+        cursor.execute(f"SELECT {AVAILABLE} as available FROM leave_balance WHERE user_id = %s AND leave_type = %s",
+                       (user_id, leave_type))
+        balance = cursor.fetchone()
+        raise InsufficientBalance(max(balance['available'], 0) if balance else 0, days, user_id, leave_type)
+    finally:
+        cursor.close()
+
+
+def literal_rows(columns, rows):
+    """
+    A derived table of literal rows to JOIN against:
+    (sql, params) for SELECT %s AS col, ... UNION ALL SELECT %s, ...
+    """
+    first = "SELECT " + ", ".join(f"%s AS {column}" for column in columns)
+    rest = " UNION ALL SELECT " + ", ".join(["%s"] * len(columns))
+    sql = first + rest * (len(rows) - 1)
+    params = [value for row in rows for value in row]
+    return sql, params
+
+
+# Balance of a row after applying a delta d (released, used_change), each
+# from its own column only: MySQL does not order multi-table UPDATE
+# assignments, so no column may read one assigned in the same statement.
+# remaining_leaves is filled in beforehand where it is NULL (_fill_remaining).
+_NEW_REMAINING = "lb.remaining_leaves - d.used_change"
+_NEW_PENDING = "GREATEST(lb.pending_leaves - d.released, 0)"
+
+
+def _delta_rows(deltas):
+    return literal_rows(('user_id', 'leave_type', 'released', 'used_change'),
+                        [key + tuple(delta) for key, delta in deltas.items()])
+
+
+def _fill_remaining(cursor, deltas):
+    """Set remaining_leaves on the delta rows where older imports left it NULL"""
+    delta_sql, delta_params = _delta_rows(deltas)
+    cursor.execute(f"""
+        UPDATE leave_balance lb
+        JOIN ({delta_sql}) d ON lb.user_id = d.user_id AND lb.leave_type = d.leave_type
+        SET lb.remaining_leaves = lb.total_leaves - COALESCE(lb.used_leaves, 0)
+        WHERE lb.remaining_leaves IS NULL
+    """, delta_params)
+
+
+def _apply_deltas(cursor, deltas, guarded):
+    """
+    One UPDATE ... JOIN of leave_balance against {(user_id, leave_type):
+    (released, used_change)}. Guarded, rows that would end up with fewer
+    than 0 days available are left alone. Returns the rows updated.
+    """
+    delta_sql, delta_params = _delta_rows(deltas)
+    query = f"""
+        UPDATE leave_balance lb
+        JOIN ({delta_sql}) d ON lb.user_id = d.user_id AND lb.leave_type = d.leave_type
+        SET lb.pending_leaves = {_NEW_PENDING},
+            lb.used_leaves = COALESCE(lb.used_leaves, 0) + d.used_change,
+            lb.remaining_leaves = {_NEW_REMAINING}
+    """
+    if guarded:
+        query += f" WHERE {_NEW_REMAINING} - {_NEW_PENDING} >= 0"
+    cursor.execute(query, delta_params)
+    return cursor.rowcount
+
+
+def _insufficient(cursor, deltas):
+    """InsufficientBalance for the first (user, leave type) the deltas would overdraw"""
+    delta_sql, delta_params = _delta_rows(deltas)
+    # Requested: the days used plus those reserved again; available: the
+    # balance's available days plus what the batch releases
+    cursor.execute(f"""
+        SELECT lb.user_id, lb.leave_type, d.used_change - LEAST(d.released, 0) as requested,
+               lb.remaining_leaves - GREATEST(lb.pending_leaves - GREATEST(d.released, 0), 0) as available
+        FROM leave_balance lb
+        JOIN ({delta_sql}) d ON lb.user_id = d.user_id AND lb.leave_type = d.leave_type
+        WHERE {_NEW_REMAINING} - {_NEW_PENDING} < 0
+        ORDER BY lb.user_id, lb.leave_type
+        LIMIT 1
+    """, delta_params)
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return InsufficientBalance(max(row['available'], 0), row['requested'], row['user_id'], row['leave_type'])
+
+
+def settle_decisions(conn, decisions):
+    """
+    Apply status changes {leave_id: new_status} to the balances, before the
+    statuses themselves are updated, with a fixed number of statements:
+    the leave rows are locked and read in one SELECT ... FOR UPDATE, the days
+    are aggregated per (user, leave type) and applied with UPDATE ... JOIN -
+    guarded for the rows that gain used or reserved days, so a decision never
+    takes a balance below zero (InsufficientBalance) - and the leaves'
+    reserved_days are updated in one UPDATE.
+    Returns {leave_id: leave row as it was} for the leaves that exist.
+    """
+    if not decisions:
+        return {}
+    leave_ids = sorted(decisions)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        # Locked in primary key order, so concurrent batches cannot deadlock on each other
+        cursor.execute(f"""
+            SELECT la.leave_id, la.user_id, la.leave_type, la.leave_status, la.reserved_days,
+                   la.start_date, la.end_date, lf.department_id, lf.working_days as days
+            FROM leave_application la
+            LEFT JOIN leave_fact lf ON la.leave_id = lf.leave_id
+            WHERE la.leave_id IN ({', '.join(['%s'] * len(leave_ids))})
+            ORDER BY la.leave_id
+            FOR UPDATE
+        """, leave_ids)
+        leaves = {row['leave_id']: row for row in cursor.fetchall()}
+        for leave in leaves.values():
+            # Not counted yet (fact rows from the SQL dump): count it here
+            # rather than charge nothing
+            if not leave['days']:
+                region = registry.department_region(leave['department_id'])
+                leave['days'] = business_days.working_days(leave['start_date'], leave['end_date'], region)
+
+        # Net (released, used change) per balance row; a negative release
+        # reserves days (a decided leave moved back to pending)
+        deltas = {}
+        reservations = []
+        for leave_id, leave in leaves.items():
+            new_status = decisions[leave_id]
+            used_change = leave['days'] * ((new_status == 'approved') - (leave['leave_status'] == 'approved'))
+            if new_status != 'pending':
+                reserved = 0
+            elif leave['leave_status'] == 'pending':
+                reserved = leave['reserved_days']
+            else:
+                reserved = leave['days']
+            released = leave['reserved_days'] - reserved
+            if not used_change and not released:
+                continue
+            key = (leave['user_id'], leave['leave_type'])
+            delta = deltas.setdefault(key, [0, 0])
+            delta[0] += released
+            delta[1] += used_change
+            if released:
+                reservations.append((leave_id, reserved))
+
+        charged = {key: delta for key, delta in deltas.items() if delta[1] > 0 or delta[0] < 0}
+        credited = {key: delta for key, delta in deltas.items() if key not in charged}
+
+        if charged:
+            # First use of a leave type: create its row (a no-op for existing rows)
+            delta_sql, delta_params = literal_rows(('user_id', 'leave_type'), list(charged))
+            cursor.execute(f"""
+                INSERT INTO leave_balance
+                    (user_id, leave_type, total_leaves, used_leaves, remaining_leaves, pending_leaves)
+                SELECT d.user_id, d.leave_type, %s, 0, %s, 0
+                FROM ({delta_sql}) d
+                ON DUPLICATE KEY UPDATE total_leaves = total_leaves
+            """, [DEFAULT_ALLOWANCE, DEFAULT_ALLOWANCE] + delta_params)
+
+            # A charged row changes unless its used and reserved days cancel
+            # out, so a short row count means the guard may have held some back
+            _fill_remaining(cursor, charged)
+            cursor.execute("SAVEPOINT settle_charged")
+            if _apply_deltas(cursor, charged, guarded=True) < len(charged):
+                cursor.execute("ROLLBACK TO SAVEPOINT settle_charged")
+                error = _insufficient(cursor, charged)
+                if error is not None:
+                    raise error
+                _apply_deltas(cursor, charged, guarded=False)
+
+        if credited:
+            _fill_remaining(cursor, credited)
+            _apply_deltas(cursor, credited, guarded=False)
+
+        if reservations:
+            reserved_sql, reserved_params = literal_rows(('leave_id', 'reserved_days'), reservations)
+            cursor.execute(f"""
+                UPDATE leave_application la
+                JOIN ({reserved_sql}) d ON la.leave_id = d.leave_id
+                SET la.reserved_days = d.reserved_days
+            """, reserved_params)
+        return leaves
+    finally:
+        cursor.close()
+
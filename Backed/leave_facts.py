@@ -0,0 +1,244 @@
+# leave_facts.py - Materialized leave fact table and monthly summary
+#
+# leave_fact holds one row per leave_application with the derived columns the
+# analytics queries group and filter on (department, applied day/month, start
+# month, duration), so those queries can use plain indexes instead of
+# recomputing DATEDIFF/DATE_FORMAT over every row.
+#
+# leave_summary_monthly rolls leave_fact up by applied month x department x
+# leave type x status for the dashboards.
+#
+# refresh_leave_facts is the write hook for leave rows: it also appends the
+# status transitions to leave_change_log (see change_feed.py).
+#
+# working_days is the leave's duration net of weekends and the holidays of
+# its department's region, counted in batches by business_days. NULL means
+# not counted yet (rows loaded by the SQL dump); init_app counts those at
+# startup.
+#
+# Run `python leave_facts.py` to rebuild both tables from scratch.
+from collections import defaultdict
+import mysql.connector
+from change_feed import record_leave_changes
+from business_days import business_days
+
+# Rows per working-day UPDATE batch
+WORKING_DAYS_BATCH = 10000
+
+FACT_COLUMNS = """
+    leave_id, user_id, department_id, leave_type, leave_status,
+    applied_on, applied_date, applied_month, start_date, end_date,
+    start_month, duration_days
+"""
+
+FACT_SELECT = """
+    SELECT
+        la.leave_id,
+        la.user_id,
+        u.department_id,
+        la.leave_type,
+        la.leave_status,
+        la.applied_on,
+        DATE(la.applied_on),
+        DATE_FORMAT(la.applied_on, '%Y-%m'),
+        la.start_date,
+        la.end_date,
+        DATE_FORMAT(la.start_date, '%Y-%m'),
+        DATEDIFF(la.end_date, la.start_date) + 1
+    FROM leave_application la
+    LEFT JOIN users_master u ON la.user_id = u.user_id
+"""
+
+SUMMARY_SELECT = """
+    SELECT
+        applied_month,
+        COALESCE(department_id, 0),
+        COALESCE(leave_type, ''),
+        leave_status,
+        COUNT(*),
+        SUM(duration_days)
+    FROM leave_fact
+    GROUP BY applied_month, COALESCE(department_id, 0), COALESCE(leave_type, ''), leave_status
+"""
+
+
+def _summary_cells(cursor, leave_ids, placeholders):
+    """Summary cell contributions of the current fact rows for leave_ids"""
+    cursor.execute(f"""
+        SELECT leave_id, user_id, applied_month, COALESCE(department_id, 0) as department_id,
+               COALESCE(leave_type, '') as leave_type, leave_status, duration_days
+        FROM leave_fact
+        WHERE leave_id IN ({placeholders})
+    """, leave_ids)
+    return cursor.fetchall()
+
+
+def _fill_working_days(conn, leave_ids=None, missing_only=False):
+    """
+    Set leave_fact.working_days for the given leaves (all when None), one
+    vectorized count per region. missing_only: just the rows not counted yet.
+    """
+    cursor = conn.cursor(dictionary=True)
+    try:
+        query = """
+            SELECT lf.leave_id, lf.start_date, lf.end_date, d.region
+            FROM leave_fact lf
+            LEFT JOIN department d ON lf.department_id = d.department_id
+        """
+        conditions = []
+        params = []
+        if leave_ids is not None:
+            conditions.append(f"lf.leave_id IN ({', '.join(['%s'] * len(leave_ids))})")
+            params = leave_ids
+        if missing_only:
+            # 0 too: older dumps defaulted the column to 0, and a leave
+            # without working days cannot be submitted
+            conditions.append("(lf.working_days IS NULL OR lf.working_days = 0)")
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        cursor.execute(query, params)
+
+        by_region = defaultdict(list)
+        for row in cursor.fetchall():
+            by_region[row['region']].append(row)
+
+        updates = []
+        for region, rows in by_region.items():
+            counts = business_days.working_days_many([row['start_date'] for row in rows],
+                                                     [row['end_date'] for row in rows], region)
+            updates.extend((int(count), row['leave_id']) for count, row in zip(counts, rows))
+
+        for offset in range(0, len(updates), WORKING_DAYS_BATCH):
+            cursor.executemany("UPDATE leave_fact SET working_days = %s WHERE leave_id = %s",
+                               updates[offset:offset + WORKING_DAYS_BATCH])
+        return len(updates)
+    finally:
+        cursor.close()
+
+
+def refresh_leave_facts(conn, leave_ids):
+    """
+    Re-derive the fact rows for the given leaves, apply the difference to the
+    monthly summary and log changed leaves to leave_change_log.
+    Runs on the caller's connection; the caller commits.
+    Returns: set of user_ids owning the refreshed leaves
+    """
+    leave_ids = list(dict.fromkeys(int(leave_id) for leave_id in leave_ids))
+    if not leave_ids:
+        return set()
+
+    placeholders = ', '.join(['%s'] * len(leave_ids))
+    cursor = conn.cursor(dictionary=True)
+    try:
+        old_rows = _summary_cells(cursor, leave_ids, placeholders)
+
+        cursor.execute(f"DELETE FROM leave_fact WHERE leave_id IN ({placeholders})", leave_ids)
+        cursor.execute(f"""
+            INSERT INTO leave_fact ({FACT_COLUMNS})
+            {FACT_SELECT}
+            WHERE la.leave_id IN ({placeholders})
+        """, leave_ids)
+        _fill_working_days(conn, leave_ids)
+
+        new_rows = _summary_cells(cursor, leave_ids, placeholders)
+
+        # Net change per summary cell: old contributions out, new ones in
+        deltas = defaultdict(lambda: [0, 0])
+        for rows, sign in ((old_rows, -1), (new_rows, 1)):
+            for row in rows:
+                key = (row['applied_month'], row['department_id'], row['leave_type'], row['leave_status'])
+                deltas[key][0] += sign
+                deltas[key][1] += sign * row['duration_days']
+
+        changes = [key + tuple(delta) for key, delta in deltas.items() if delta != [0, 0]]
+        if changes:
+            cursor.executemany("""
+                INSERT INTO leave_summary_monthly
+                    (applied_month, department_id, leave_type, leave_status, leave_count, total_days)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    leave_count = leave_count + VALUES(leave_count),
+                    total_days = total_days + VALUES(total_days)
+            """, changes)
+            cursor.execute("DELETE FROM leave_summary_monthly WHERE leave_count <= 0")
+
+        # Status changes (and department moves, which change listing rows) feed the change log
+        old_by_id = {row['leave_id']: row for row in old_rows}
+        new_by_id = {row['leave_id']: row for row in new_rows}
+        log_rows = []
+        for leave_id in leave_ids:
+            old, new = old_by_id.get(leave_id), new_by_id.get(leave_id)
+            if old is None and new is None:
+                continue
+            if (old is None or new is None
+                    or old['leave_status'] != new['leave_status']
+                    or old['department_id'] != new['department_id']):
+                log_rows.append((
+                    leave_id,
+                    (new or old)['user_id'],
+                    old['leave_status'] if old else None,
+                    new['leave_status'] if new else None
+                ))
+        record_leave_changes(cursor, log_rows)
+
+        return {row['user_id'] for row in new_rows}
+    finally:
+        cursor.close()
+
+
+def refresh_user_facts(conn, user_id):
+    """Refresh every fact row of a user, e.g. after a department change"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT leave_id FROM leave_application WHERE user_id = %s", (user_id,))
+        leave_ids = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    return refresh_leave_facts(conn, leave_ids)
+
+
+def rebuild_leave_facts(conn):
+    """Backfill: rebuild leave_fact and leave_summary_monthly from leave_application"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("DELETE FROM leave_summary_monthly")
+        cursor.execute("DELETE FROM leave_fact")
+        cursor.execute(f"INSERT INTO leave_fact ({FACT_COLUMNS}) {FACT_SELECT}")
+        fact_count = cursor.rowcount
+        _fill_working_days(conn)
+        cursor.execute(f"""
+            INSERT INTO leave_summary_monthly
+                (applied_month, department_id, leave_type, leave_status, leave_count, total_days)
+            {SUMMARY_SELECT}
+        """)
+        summary_count = cursor.rowcount
+        conn.commit()
+        return fact_count, summary_count
+    except mysql.connector.Error:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """Count the working days of fact rows that have none yet (e.g. after loading the SQL dump)"""
+    from database import connection
+
+    try:
+        with connection() as conn:
+            counted = _fill_working_days(conn, missing_only=True)
+            conn.commit()
+        if counted:
+            print(f"✓ Counted working days of {counted} leave facts")
+    except mysql.connector.Error as e:
+        print(f"⚠ Could not count missing working days: {e}")
+
+
+if __name__ == '__main__':
+    from database import connection
+
+    print("🔄 Rebuilding leave_fact and leave_summary_monthly...")
+    with connection() as conn:
+        facts, cells = rebuild_leave_facts(conn)
+    print(f"✓ Rebuilt {facts} fact rows and {cells} summary cells")
@@ -0,0 +1,360 @@
+# leave_index.py - In-memory interval index of approved leaves
+#
+# "Who is on leave on day D / between D1 and D2" is an interval stabbing
+# query that no B-tree on (start_date, end_date) answers well. Each worker
+# keeps the approved leave_fact rows in one interval tree per department: a
+# treap ordered by (start_date, leave_id) where every node also stores the
+# latest end_date in its subtree, so overlap queries prune whole subtrees and
+# run in O(log n + k); inserts and deletes are O(log n).
+#
+# The index is built from the database at startup and follows writes through
+# leave_change_log (see change_feed): before answering, it applies the changes
+# logged since its last read - immediately after a write notification on the
+# events channel, otherwise at most every SYNC_INTERVAL seconds. Only leaves
+# ending within HISTORY_DAYS of the build are kept; queries reaching further
+# back, or made while the index is unavailable, return None and callers fall
+# back to SQL.
+#
+# Analytics payloads and calendar tiles built from the index are cached under
+# the 'analytics' and 'calendar' versions. Once those have moved (a write in
+# any worker), the index syncs before it answers - waiting for a refresh in
+# progress if need be - so older data is never cached under the new version.
+import os
+import random
+import threading
+import time
+from datetime import date, timedelta
+from cache import cache
+from database import connection
+from change_feed import advance_position, current_position, fetch_log_rows, log_pruned_before
+
+SYNC_INTERVAL = 2           # seconds between change log reads without a notification
+REBUILD_INTERVAL = 3600     # full reload, also picks up date edits that are not logged
+RETRY_INTERVAL = 30         # after a failed build
+HISTORY_DAYS = int(os.environ.get('DAYOFFLY_LEAVE_INDEX_DAYS', 400))
+SYNC_BATCH = 1000           # change log rows per read; more pending than this -> rebuild
+
+# Cache namespaces whose entries are built from the index
+INDEX_NAMESPACES = ('analytics', 'calendar')
+
+
+class _Node:
+    __slots__ = ('key', 'end', 'max_end', 'priority', 'left', 'right', 'leave')
+
+    def __init__(self, leave):
+        self.key = (leave.start, leave.leave_id)
+        self.end = leave.end
+        self.max_end = leave.end
+        self.priority = random.random()
+        self.left = None
+        self.right = None
+        self.leave = leave
+
+
+class IndexedLeave:
+    """One approved leave as stored in the index"""
+    __slots__ = ('leave_id', 'user_id', 'department_id', 'start', 'end')
+
+    def __init__(self, leave_id, user_id, department_id, start, end):
+        self.leave_id = leave_id
+        self.user_id = user_id
+        self.department_id = department_id
+        self.start = start
+        self.end = end
+
+
+def _update(node):
+    node.max_end = node.end
+    if node.left is not None and node.left.max_end > node.max_end:
+        node.max_end = node.left.max_end
+    if node.right is not None and node.right.max_end > node.max_end:
+        node.max_end = node.right.max_end
+    return node
+
+
+def _split(node, key):
+    """(keys < key, keys >= key)"""
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _split(node.right, key)
+        return _update(node), right
+    left, node.left = _split(node.left, key)
+    return left, _update(node)
+
+
+def _merge(left, right):
+    if left is None:
+        return right
+    if right is None:
+        return left
+    if left.priority > right.priority:
+        left.right = _merge(left.right, right)
+        return _update(left)
+    right.left = _merge(left, right.left)
+    return _update(right)
+
+
+def _insert(root, node):
+    left, right = _split(root, node.key)
+    return _merge(_merge(left, node), right)
+
+
+def _delete(root, key):
+    if root is None:
+        return None
+    if key == root.key:
+        return _merge(root.left, root.right)
+    if key < root.key:
+        root.left = _delete(root.left, key)
+    else:
+        root.right = _delete(root.right, key)
+    return _update(root)
+
+
+def _build(leaves):
+    """Treap from leaves sorted by (start, leave_id) in O(n) (Cartesian tree on the priorities)"""
+    stack = []
+    for leave in leaves:
+        node = _Node(leave)
+        last = None
+        while stack and stack[-1].priority < node.priority:
+            last = stack.pop()
+        node.left = last
+        if stack:
+            stack[-1].right = node
+        stack.append(node)
+    if not stack:
+        return None
+
+    # max_end bottom-up: reversed pre-order visits children before parents
+    order = []
+    pending = [stack[0]]
+    while pending:
+        node = pending.pop()
+        order.append(node)
+        pending.extend(child for child in (node.left, node.right) if child is not None)
+    for node in reversed(order):
+        _update(node)
+    return stack[0]
+
+
+def _overlapping(node, start, end, found):
+    """Append every leave with leave.start <= end and leave.end >= start"""
+    while node is not None and node.max_end >= start:
+        _overlapping(node.left, start, end, found)
+        if node.key[0] > end:
+            # Everything to the right starts even later
+            return
+        if node.end >= start:
+            found.append(node.leave)
+        node = node.right
+
+
+class LeaveIndex:
+    """Per-department interval trees of approved leaves, synced from leave_change_log"""
+
+    def __init__(self):
+        self._trees = {}            # department_id -> treap root
+        self._leaves = {}           # leave_id -> IndexedLeave
+        self._position = None       # (high_water, gaps) in leave_change_log
+        self._version = None        # INDEX_NAMESPACES watermark read before the last rebuild/sync
+        self._window_start = None
+        self._built_at = 0
+        self._synced_at = 0
+        self._failed_at = 0
+        self._dirty = False
+        self._subscribed_pid = None
+        self._lock = threading.Lock()             # guards the trees
+        self._refresh_lock = threading.Lock()     # one rebuild/sync at a time
+
+    # -- maintenance ---------------------------------------------------------
+
+    def _ensure_subscribed(self):
+        # Write notifications (events.notify_leave_changes) trigger an early sync
+        pid = os.getpid()
+        if self._subscribed_pid != pid:
+            cache.backend.subscribe(f"{cache.prefix}:events", self._on_notify)
+            self._subscribed_pid = pid
+
+    def _on_notify(self, message):
+        self._dirty = True
+
+    def _add(self, leave):
+        self._leaves[leave.leave_id] = leave
+        self._trees[leave.department_id] = _insert(self._trees.get(leave.department_id), _Node(leave))
+
+    def _remove(self, leave_id):
+        leave = self._leaves.pop(leave_id, None)
+        if leave is not None:
+            root = _delete(self._trees.get(leave.department_id), (leave.start, leave.leave_id))
+            if root is None:
+                self._trees.pop(leave.department_id, None)
+            else:
+                self._trees[leave.department_id] = root
+
+    @staticmethod
+    def _read_leaves(cursor, window_start, leave_ids=None):
+        query = """
+            SELECT leave_id, user_id, department_id, start_date, end_date
+            FROM leave_fact
+            WHERE leave_status = 'approved' AND end_date >= %s
+        """
+        params = [window_start]
+        if leave_ids is not None:
+            query += f" AND leave_id IN ({', '.join(['%s'] * len(leave_ids))})"
+            params.extend(leave_ids)
+        cursor.execute(query, params)
+        return [IndexedLeave(row['leave_id'], row['user_id'], row['department_id'],
+                             row['start_date'], row['end_date'])
+                for row in cursor.fetchall()]
+
+    def rebuild(self):
+        """Load every approved leave in the window from the database"""
+        started = time.perf_counter()
+        window_start = date.today() - timedelta(days=HISTORY_DAYS)
+        version = cache.data_version(*INDEX_NAMESPACES)
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                # Position first: changes committed during the load are replayed by the next sync
+                position = current_position(cursor)
+                leaves = self._read_leaves(cursor, window_start)
+            finally:
+                cursor.close()
+
+        by_department = {}
+        for leave in leaves:
+            by_department.setdefault(leave.department_id, []).append(leave)
+        trees = {department_id: _build(sorted(department_leaves, key=lambda leave: (leave.start, leave.leave_id)))
+                 for department_id, department_leaves in by_department.items()}
+
+        with self._lock:
+            self._trees = trees
+            self._leaves = {leave.leave_id: leave for leave in leaves}
+            self._position = position
+            self._window_start = window_start
+            self._version = version
+            self._built_at = self._synced_at = time.monotonic()
+        print(f"✓ Leave index built: {len(leaves)} approved leaves in {len(self._trees)} departments "
+              f"({time.perf_counter() - started:.2f}s)")
+
+    def sync(self):
+        """Apply the leave_change_log rows written since the last read"""
+        # Read first: the versions move after the writes commit, so this read sees them
+        version = cache.data_version(*INDEX_NAMESPACES)
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                high_water, gaps = self._position
+                if log_pruned_before(cursor, high_water):
+                    return False
+                rows = fetch_log_rows(cursor, high_water, list(gaps), SYNC_BATCH + 1)
+                if len(rows) > SYNC_BATCH:
+                    return False
+                leave_ids = list(dict.fromkeys(row['leave_id'] for row in rows))
+                current = self._read_leaves(cursor, self._window_start, leave_ids) if leave_ids else []
+            finally:
+                cursor.close()
+
+        with self._lock:
+            for leave_id in leave_ids:
+                self._remove(leave_id)
+            for leave in current:
+                self._add(leave)
+            self._position = advance_position(high_water, gaps, [row['seq'] for row in rows], time.time())
+            self._version = version
+            self._synced_at = time.monotonic()
+        return True
+
+    def _refresh(self):
+        """Bring the index up to date; False if it cannot be used right now"""
+        self._ensure_subscribed()
+        if cache.data_version(*INDEX_NAMESPACES) != self._version:
+            # A write moved the cache versions: wait for the refresh in progress, if any,
+            # and sync, so nothing older gets cached under the new version
+            self._refresh_lock.acquire()
+        elif not self._refresh_lock.acquire(blocking=False):
+            # Another thread is already refreshing - answer from the current data meanwhile
+            return self._position is not None
+        try:
+            return self._refresh_locked()
+        finally:
+            self._refresh_lock.release()
+
+    def _refresh_locked(self):
+        now = time.monotonic()
+        stale = cache.data_version(*INDEX_NAMESPACES) != self._version
+        if self._position is None or now - self._built_at > REBUILD_INTERVAL:
+            if now - self._failed_at < RETRY_INTERVAL:
+                # Serve the last good data (if any) until the next attempt
+                return self._position is not None and not stale
+            try:
+                self.rebuild()
+            except Exception as e:
+                self._failed_at = now
+                print(f"⚠ Leave index unavailable: {e}")
+                return self._position is not None and not stale
+            return True
+
+        if self._dirty or stale or now - self._synced_at > SYNC_INTERVAL:
+            self._dirty = False
+            try:
+                if not self.sync():
+                    # Too far behind the change log - start over
+                    self.rebuild()
+            except Exception as e:
+                # Retry after the next interval rather than on every query
+                self._synced_at = now
+                print(f"⚠ Leave index sync failed: {e}")
+                # Behind a known write: let the caller read the database instead
+                return not stale
+        return True
+
+    # -- queries -------------------------------------------------------------
+
+    def overlapping(self, start, end, department_id=None):
+        """
+        Approved leaves overlapping [start, end] (in one department, or all),
+        or None if the index cannot answer (unavailable, or start before its window).
+        """
+        if not self._refresh():
+            return None
+        with self._lock:
+            if start < self._window_start:
+                return None
+            if department_id is not None:
+                roots = [self._trees.get(department_id)]
+            else:
+                roots = list(self._trees.values())
+            found = []
+            for root in roots:
+                _overlapping(root, start, end, found)
+            return found
+
+    def users_on_leave(self, start=None, end=None, department_id=None):
+        """user_ids with an approved leave overlapping [start, end] (default: today), or None"""
+        start = start or date.today()
+        leaves = self.overlapping(start, end or start, department_id)
+        return None if leaves is None else {leave.user_id for leave in leaves}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'leaves': len(self._leaves),
+                'departments': len(self._trees),
+                'window_start': self._window_start.isoformat() if self._window_start else None,
+                'position': self._position[0] if self._position else None
+            }
+
+
+index = LeaveIndex()
+
+
+def init_app(app):
+    """Build the index at startup (queries fall back to SQL until it is available)"""
+    try:
+        index.rebuild()
+    except Exception as e:
+        index._failed_at = time.monotonic()
+        print(f"⚠ Leave index not built: {e}")
@@ -0,0 +1,138 @@
+# leave_listing.py - Filtered keyset pagination over leave_application for the HR listings
+from datetime import datetime
+from pagination import encode_cursor, decode_cursor, parse_page_size, DEFAULT_PAGE_SIZE
+
+# Frontend status labels -> database values
+STATUS_FILTER_MAP = {
+    'pending': 'pending',
+    'approved': 'approved',
+    'rejected': 'declined',
+    'declined': 'declined'
+}
+
+LEAVE_LISTING_FROM = """
+    FROM leave_application la
+    JOIN users_master u ON la.user_id = u.user_id
+    LEFT JOIN department d ON u.department_id = d.department_id
+    LEFT JOIN users_master approver ON u.approver_id = approver.user_id
+"""
+
+
+def _parse_date(value, name):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f"Invalid {name} date. Use YYYY-MM-DD")
+
+
+def build_leave_filters(args):
+    """
+    Translate status/type/department/from/to query parameters into SQL conditions.
+    from/to select leaves overlapping the date range.
+    Raises ValueError on unknown status or malformed dates.
+    """
+    conditions = []
+    params = []
+
+    status = (args.get('status') or 'all').lower()
+    if status != 'all':
+        if status not in STATUS_FILTER_MAP:
+            raise ValueError(f"Invalid status filter: {args.get('status')}")
+        conditions.append("la.leave_status = %s")
+        params.append(STATUS_FILTER_MAP[status])
+
+    leave_type = args.get('type')
+    if leave_type and leave_type != 'all':
+        conditions.append("la.leave_type = %s")
+        params.append(leave_type)
+
+    department = args.get('department')
+    if department and department != 'all':
+        conditions.append("d.department_name = %s")
+        params.append(department)
+
+    if args.get('from'):
+        conditions.append("la.end_date >= %s")
+        params.append(_parse_date(args['from'], 'from'))
+
+    if args.get('to'):
+        conditions.append("la.start_date <= %s")
+        params.append(_parse_date(args['to'], 'to'))
+
+    return conditions, params
+
+
+def fetch_leave_page(cursor, columns, args, default_page_size=DEFAULT_PAGE_SIZE):
+    """
+    Fetch one page of leave requests, newest first, ordered by (applied_on, leave_id).
+    `columns` must select la.applied_on and la.leave_id under those names.
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    """
+    conditions, params = build_leave_filters(args)
+
+    token = args.get('cursor')
+    if token:
+        applied_on, leave_id = decode_cursor(token, (datetime, int))
+        conditions.append("(la.applied_on < %s OR (la.applied_on = %s AND la.leave_id < %s))")
+        params.extend([applied_on, applied_on, leave_id])
+
+    page_size = parse_page_size(args.get('limit'), default_page_size)
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    query = f"""
+        SELECT {columns}
+        {LEAVE_LISTING_FROM}
+        {where_clause}
+        ORDER BY la.applied_on DESC, la.leave_id DESC
+        LIMIT %s
+    """
+    # Fetch one extra row to learn whether another page exists
+    cursor.execute(query, params + [page_size + 1])
+    rows = cursor.fetchall()
+
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        last = rows[-1]
+        next_cursor = encode_cursor(last['applied_on'], last['leave_id'])
+
+    return rows, next_cursor
+
+
+def leave_export_query(columns, args):
+    """
+    (sql, params) selecting every leave request matching the filters, in
+    listing order - for streamed exports, which read it unbuffered
+    """
+    conditions, params = build_leave_filters(args)
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+    query = f"""
+        SELECT {columns}
+        {LEAVE_LISTING_FROM}
+        {where_clause}
+        ORDER BY la.applied_on DESC, la.leave_id DESC
+    """
+    return query, params
+
+
+def fetch_status_counts(cursor, args):
+    """Count leave requests per frontend status label under the same filters (ignoring status)"""
+    filter_args = {key: value for key, value in args.items() if key != 'status'}
+    conditions, params = build_leave_filters(filter_args)
+    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+
+    cursor.execute(f"""
+        SELECT la.leave_status, COUNT(*) as count
+        {LEAVE_LISTING_FROM}
+        {where_clause}
+        GROUP BY la.leave_status
+    """, params)
+
+    counts = {'total': 0, 'pending': 0, 'approved': 0, 'rejected': 0}
+    for row in cursor.fetchall():
+        status = row['leave_status'] or ''
+        label = 'rejected' if status.lower() in ('declined', 'rejected') else status.lower()
+        counts['total'] += row['count']
+        if label in counts:
+            counts[label] += row['count']
+    return counts
@@ -3,6 +3,15 @@ from flask import Blueprint, request, jsonify, session
 from flask_cors import CORS, cross_origin
 from functools import wraps
 import mysql.connector
+from database import get_db_connection
+from http_caching import conditional
+from leave_facts import refresh_leave_facts
+from leave_balance import InsufficientBalance, literal_rows, settle_decisions
+from cache import invalidate_user_data
+from events import notify_leave_changes
+from leave_listing import fetch_leave_page, fetch_status_counts, leave_export_query
+from change_feed import current_change_token, fetch_leave_changes, maybe_prune_change_log
+from streaming import ExportBusy, export_format, stream_export
 from datetime import datetime
 import os
 
@@ -12,103 +21,123 @@ leave_requests_bp = Blueprint('leave_requests', __name__)
 # Enable CORS for this blueprint
 CORS(leave_requests_bp, supports_credentials=True)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'dayoffly',
-    'port': 3306
+# Largest number of decisions one batch request may carry
+MAX_BATCH_DECISIONS = 500
+
+# Frontend status -> database status
+STATUS_MAP = {
+    'Approved': 'approved',
+    'Rejected': 'declined',
+    'Pending': 'pending'
 }
+DECISION_STATUSES = ('approved', 'declined', 'pending')
 
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"✗ Database connection failed: {e}")
-        return None
+# Listing columns shared by the page query and the change feed
+LEAVE_REQUEST_COLUMNS = """
+    la.leave_id,
+    u.user_name as employee,
+    la.leave_type as type,
+    la.start_date,
+    la.end_date,
+    DATEDIFF(la.end_date, la.start_date) + 1 as duration_days,
+    la.applied_on,
+    la.leave_status as status,
+    u.designation,
+    d.department_name,
+    approver.user_name as approver_name,
+    la.reason,
+    u.contact_number as contact_info
+"""
+
+def format_leave_request(req):
+    """Format one listing row for the frontend"""
+    # Format dates
+    start_date = req['start_date'].strftime('%b %d, %Y') if req['start_date'] else ''
+    end_date = req['end_date'].strftime('%b %d, %Y') if req['end_date'] else ''
+    dates = f"{start_date} – {end_date}" if start_date and end_date else ''
+    
+    # Format duration
+    duration = f"{req['duration_days']} day{'s' if req['duration_days'] != 1 else ''}"
+    
+    # Format status for frontend
+    status_map = {
+        'pending': 'Pending',
+        'approved': 'Approved',
+        'declined': 'Rejected'
+    }
+    status = status_map.get(req['status'].lower(), req['status'])
+    
+    return {
+        'employee': req['employee'],
+        'type': req['type'],
+        'dates': dates,
+        'duration': duration,
+        'status': status,
+        'leave_id': req['leave_id'],
+        'designation': req['designation'],
+        'department': req['department_name'],
+        'applied_on': req['applied_on'].strftime('%Y-%m-%d %H:%M') if req['applied_on'] else '',
+        'approver': req['approver_name'],
+        'reason': req['reason'],
+        'contact_info': req['contact_info'],
+        'start_date': start_date,
+        'end_date': end_date
+    }
 
-def get_leave_requests():
-    """Get all leave requests from database"""
+def get_leave_requests(args=None):
+    """
+    Get one page of leave requests, newest first.
+    args: status/type/department/from/to filters plus limit and cursor.
+    Returns: (formatted requests, next_cursor, status counts or None, change token or None)
+    """
     conn = get_db_connection()
     if not conn:
-        return []
+        return [], None, None, None
     
+    args = args or {}
     try:
         cursor = conn.cursor(dictionary=True)
         
-        # Query to get all leave requests with employee details
-        query = """
-        SELECT 
-            la.leave_id,
-            u.user_name as employee,
-            la.leave_type as type,
-            la.start_date,
-            la.end_date,
-            DATEDIFF(la.end_date, la.start_date) + 1 as duration_days,
-            la.applied_on,
-            la.leave_status as status,
-            u.designation,
-            d.department_name,
-            approver.user_name as approver_name,
-            la.reason,
-            u.contact_number as contact_info
-        FROM leave_application la
-        JOIN users_master u ON la.user_id = u.user_id
-        LEFT JOIN department d ON u.department_id = d.department_id
-        LEFT JOIN users_master approver ON u.approver_id = approver.user_id
-        ORDER BY la.applied_on DESC
-        """
+        # First pages come with a change-feed token, read before the listing so no change is missed
+        first_page = not args.get('cursor')
+        change_token = current_change_token(cursor) if first_page else None
         
-        cursor.execute(query)
-        requests = cursor.fetchall()
+        # Query one page of leave requests with employee details
+        requests, next_cursor = fetch_leave_page(cursor, LEAVE_REQUEST_COLUMNS, args)
         
-        # Format the data for frontend
-        formatted_requests = []
-        for req in requests:
-            # Format dates
-            start_date = req['start_date'].strftime('%b %d, %Y') if req['start_date'] else ''
-            end_date = req['end_date'].strftime('%b %d, %Y') if req['end_date'] else ''
-            dates = f"{start_date} – {end_date}" if start_date and end_date else ''
-            
-            # Format duration
-            duration = f"{req['duration_days']} day{'s' if req['duration_days'] != 1 else ''}"
-            
-            # Format status for frontend
-            status_map = {
-                'pending': 'Pending',
-                'approved': 'Approved',
-                'declined': 'Rejected'
-            }
-            status = status_map.get(req['status'].lower(), req['status'])
-            
-            formatted_requests.append({
-                'employee': req['employee'],
-                'type': req['type'],
-                'dates': dates,
-                'duration': duration,
-                'status': status,
-                'leave_id': req['leave_id'],
-                'designation': req['designation'],
-                'department': req['department_name'],
-                'applied_on': req['applied_on'].strftime('%Y-%m-%d %H:%M') if req['applied_on'] else '',
-                'approver': req['approver_name'],
-                'reason': req['reason'],
-                'contact_info': req['contact_info'],
-                'start_date': start_date,
-                'end_date': end_date
-            })
+        # Summary counts only change with the filters, so send them with the first page
+        status_counts = fetch_status_counts(cursor, args) if first_page else None
         
-        return formatted_requests
+        formatted_requests = [format_leave_request(req) for req in requests]
+        return formatted_requests, next_cursor, status_counts, change_token
         
+    except ValueError:
+        # Bad filter or cursor - let the route answer 400
+        raise
     except mysql.connector.Error as e:
         print(f"Database error: {e}")
-        return []
+        return [], None, None, None
     except Exception as e:
         print(f"Unexpected error: {e}")
-        return []
+        return [], None, None, None
+    finally:
+        if 'cursor' in locals():
+            cursor.close()
+        conn.close()
+
+def get_leave_changes(args):
+    """Leave requests changed since args['since'] (see change_feed.fetch_leave_changes); None on DB failure"""
+    conn = get_db_connection()
+    if not conn:
+        return None
+    
+    maybe_prune_change_log()
+    try:
+        cursor = conn.cursor(dictionary=True)
+        return fetch_leave_changes(cursor, LEAVE_REQUEST_COLUMNS, args, format_leave_request)
+    except mysql.connector.Error as e:
+        print(f"Database error: {e}")
+        return None
     finally:
         if 'cursor' in locals():
             cursor.close()
@@ -217,16 +246,38 @@ def hr_required(f):
 @leave_requests_bp.route('/hr/leave-requests', methods=['GET'])
 @hr_required
 @cross_origin(supports_credentials=True)
+@conditional
 def leave_requests():
-    """Get all leave requests for HR dashboard"""
+    """
+    Get a page of leave requests for HR dashboard (?limit=&cursor=&status=&type=&department=&from=&to=),
+    or with ?format=ndjson|csv stream every request matching the filters
+    """
     try:
-        leave_requests_data = get_leave_requests()
+        fmt = export_format(request.args)
+        if fmt:
+            query, params = leave_export_query(LEAVE_REQUEST_COLUMNS, request.args)
+            return stream_export(query, params, fmt, 'leave-requests')
+
+        leave_requests_data, next_cursor, status_counts, change_token = get_leave_requests(request.args)
         
         return jsonify({
             "success": True,
-            "leave_requests": leave_requests_data
+            "leave_requests": leave_requests_data,
+            "next_cursor": next_cursor,
+            "status_counts": status_counts,
+            "change_token": change_token
         })
         
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    except ExportBusy as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 429
     except Exception as e:
         print(f"Error fetching leave requests: {e}")
         return jsonify({
@@ -234,6 +285,33 @@ def leave_requests():
             "message": "Internal server error"
         }), 500
 
+@leave_requests_bp.route('/hr/leave-changes', methods=['GET'])
+@hr_required
+@cross_origin(supports_credentials=True)
+def leave_changes():
+    """Leave requests inserted or changed since ?since=<change_token> (same filters as /hr/leave-requests)"""
+    if not request.args.get('since'):
+        return jsonify({"success": False, "message": "Missing since token"}), 400
+    
+    try:
+        feed = get_leave_changes(request.args)
+        if feed is None:
+            return jsonify({"success": False, "message": "Database connection failed"}), 500
+        
+        return jsonify({"success": True, **feed})
+        
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "message": str(e)
+        }), 400
+    except Exception as e:
+        print(f"Error fetching leave changes: {e}")
+        return jsonify({
+            "success": False,
+            "message": "Internal server error"
+        }), 500
+
 @leave_requests_bp.route('/hr/leave-request/<int:leave_id>', methods=['GET'])
 @hr_required
 @cross_origin(supports_credentials=True)
@@ -267,82 +345,187 @@ def update_leave_status():
     """Update leave request status"""
     if request.method == 'OPTIONS':
         return jsonify({"success": True}), 200
-        
+    return decide_leave_request(request.get_json(silent=True))
+
+def apply_decisions(conn, decisions):
+    """
+    Apply {leave_id: db_status} in one transaction with a fixed number of
+    statements, whatever the batch size: the balances are settled per
+    (user, leave type) by settle_decisions, the statuses set by one
+    UPDATE ... JOIN over the changed leaves, then the facts refreshed.
+    Returns ({leave_id: previous status} of the leaves found, affected user_ids)
+    """
+    cursor = conn.cursor()
+    try:
+        # Locks every leave row first; the balance reads the statuses being replaced
+        leaves = settle_decisions(conn, decisions)
+        changed = [(leave_id, decisions[leave_id]) for leave_id, leave in leaves.items()
+                   if leave['leave_status'] != decisions[leave_id]]
+        affected_users = set()
+        if changed:
+            status_sql, status_params = literal_rows(('leave_id', 'leave_status'), changed)
+            cursor.execute(f"""
+                UPDATE leave_application la
+                JOIN ({status_sql}) d ON la.leave_id = d.leave_id
+                SET la.leave_status = d.leave_status
+            """, status_params)
+            affected_users = refresh_leave_facts(conn, [leave_id for leave_id, _ in changed])
+        conn.commit()
+        return {leave_id: leave['leave_status'] for leave_id, leave in leaves.items()}, affected_users
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def decision_status(status):
+    """Database status for a frontend status ('Approved') or database one; None if it is not a decision"""
+    db_status = STATUS_MAP.get(status, status.lower()) if isinstance(status, str) else None
+    return db_status if db_status in DECISION_STATUSES else None
+
+def decide_leave_request(data):
+    """
+    Body of the single-leave /hr/update-leave-status routes (this blueprint
+    and hr_backend's): validates like the batch endpoint, then applies the
+    decision through apply_decisions.
+    Body: {"leave_id": 1, "status": "Approved", "employee_name": "..."}
+    """
+    data = data if isinstance(data, dict) else {}
+    leave_id = data.get('leave_id')
+    status = data.get('status')
+    employee_name = data.get('employee_name')
+
+    if not leave_id or not status:
+        return jsonify({"success": False, "message": "Missing required fields"}), 400
+    try:
+        leave_id = int(leave_id)
+    except (TypeError, ValueError):
+        return jsonify({"success": False, "message": "leave_id must be an integer"}), 400
+    db_status = decision_status(status)
+    if db_status is None:
+        return jsonify({"success": False, "message": f"Unknown status: {status}"}), 400
+
     try:
-        data = request.get_json()
-        leave_id = data.get('leave_id')
-        status = data.get('status')
-        employee_name = data.get('employee_name')
-        
-        if not leave_id or not status:
-            return jsonify({"success": False, "message": "Missing required fields"}), 400
-        
-        # Map frontend status to database status
-        status_map = {
-            'Approved': 'approved',
-            'Rejected': 'declined',
-            'Pending': 'pending'
-        }
-        db_status = status_map.get(status, status.lower())
-        
         conn = get_db_connection()
         if not conn:
             return jsonify({"success": False, "message": "Database connection failed"}), 500
-        
-        cursor = conn.cursor()
-        
-        # Update leave status
-        update_query = "UPDATE leave_application SET leave_status = %s WHERE leave_id = %s"
-        cursor.execute(update_query, (db_status, leave_id))
-        conn.commit()
-        
-        # If approved, update leave balance
-        if db_status == 'approved':
-            # Get leave details to update balance
-            cursor.execute("""
-                SELECT user_id, leave_type, DATEDIFF(end_date, start_date) + 1 as days 
-                FROM leave_application 
-                WHERE leave_id = %s
-            """, (leave_id,))
-            leave_details = cursor.fetchone()
-            
-            if leave_details:
-                user_id, leave_type, days = leave_details
-                # Update leave balance - check if record exists first
-                cursor.execute("""
-                    SELECT * FROM leave_balance 
-                    WHERE user_id = %s AND leave_type = %s
-                """, (user_id, leave_type))
-                existing_balance = cursor.fetchone()
-                
-                if existing_balance:
-                    # Update existing balance
-                    cursor.execute("""
-                        UPDATE leave_balance 
-                        SET used_leaves = used_leaves + %s, 
-                            remaining_leaves = total_leaves - (used_leaves + %s)
-                        WHERE user_id = %s AND leave_type = %s
-                    """, (days, days, user_id, leave_type))
-                else:
-                    # Create new balance record (simplified - you might want to set proper initial values)
-                    cursor.execute("""
-                        INSERT INTO leave_balance (user_id, leave_type, total_leaves, used_leaves, remaining_leaves)
-                        VALUES (%s, %s, %s, %s, %s)
-                    """, (user_id, leave_type, 20, days, 20 - days))
-                
-                conn.commit()
-        
-        cursor.close()
-        conn.close()
-        
+
+        previous, affected_users = apply_decisions(conn, {leave_id: db_status})
+        if leave_id not in previous:
+            return jsonify({"success": False, "message": "Leave request not found"}), 404
+
+        if affected_users:
+            # Cached dashboards show the balance and the approved-leave chart;
+            # open /events/stream connections pick the change up from leave_change_log
+            invalidate_user_data(*affected_users)
+            notify_leave_changes()
+
         return jsonify({
             "success": True,
             "message": f"Leave {status.lower()} for {employee_name}"
         })
-        
+
+    except InsufficientBalance as e:
+        # apply_decisions rolled back
+        return jsonify({
+            "success": False,
+            "message": f"Insufficient {e.leave_type} balance: {e}",
+            "available": e.available,
+            "requested": e.requested
+        }), 409
     except Exception as e:
         print(f"Error updating leave status: {e}")
         return jsonify({
             "success": False,
             "message": "Internal server error"
-        }), 500
\ No newline at end of file
+        }), 500
+
+@leave_requests_bp.route('/hr/update-leave-status/batch', methods=['POST', 'OPTIONS'])
+@hr_required
+@cross_origin(supports_credentials=True)
+def update_leave_status_batch():
+    """
+    Decide many leave requests at once.
+    Body: {"decisions": [{"leave_id": 1, "status": "Approved"}, ...]}
+    Every item gets a result: updated, unchanged, not_found or invalid.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({"success": True}), 200
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('decisions')
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "message": "decisions must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_DECISIONS:
+        return jsonify({"success": False, "message": f"At most {MAX_BATCH_DECISIONS} decisions per request"}), 400
+
+    # Validate every item; only the valid ones go to the database
+    results = []
+    decisions = {}
+    for item in items:
+        item = item if isinstance(item, dict) else {}
+        leave_id = item.get('leave_id')
+        status = item.get('status')
+        result = {"leave_id": leave_id}
+        results.append(result)
+        try:
+            leave_id = int(leave_id)
+        except (TypeError, ValueError):
+            result.update(result="invalid", message="leave_id must be an integer")
+            continue
+        db_status = decision_status(status)
+        if db_status is None:
+            result.update(result="invalid", message=f"Unknown status: {status}")
+        elif leave_id in decisions:
+            result.update(result="invalid", message="Duplicate leave_id in this batch")
+        else:
+            result.update(leave_id=leave_id, status=db_status)
+            decisions[leave_id] = db_status
+
+    try:
+        previous = {}
+        affected_users = set()
+        if decisions:
+            conn = get_db_connection()
+            if not conn:
+                return jsonify({"success": False, "message": "Database connection failed"}), 500
+            previous, affected_users = apply_decisions(conn, decisions)
+
+        for result in results:
+            if 'result' in result:
+                continue
+            if result['leave_id'] not in previous:
+                result.update(result="not_found", message="Leave request not found")
+            elif previous[result['leave_id']] == result['status']:
+                result['result'] = "unchanged"
+            else:
+                result.update(result="updated", previous_status=previous[result['leave_id']])
+
+        if affected_users:
+            # Cached dashboards and open /events/stream connections, once for the whole batch
+            invalidate_user_data(*affected_users)
+            notify_leave_changes()
+
+        summary = {}
+        for result in results:
+            summary[result['result']] = summary.get(result['result'], 0) + 1
+        print(f"✓ Batch decision: {summary}")
+
+        return jsonify({"success": True, "summary": summary, "results": results})
+
+    except InsufficientBalance as e:
+        # apply_decisions rolled back: none of the batch was applied
+        return jsonify({
+            "success": False,
+            "message": f"Insufficient {e.leave_type} balance for user {e.user_id}: {e}; no decisions applied",
+            "user_id": e.user_id,
+            "leave_type": e.leave_type,
+            "available": e.available,
+            "requested": e.requested
+        }), 409
+    except Exception as e:
+        print(f"Error in batch leave status update: {e}")
+        return jsonify({
+            "success": False,
+            "message": "Internal server error"
+        }), 500
@@ -1,6 +1,7 @@
 # login_backend.py
 from flask import Blueprint, request, jsonify, session
 import mysql.connector
+from database import get_db_connection
 import hashlib
 import os
 import jwt
@@ -15,24 +16,6 @@ JWT_SECRET_KEY = 'your-jwt-secret-key-change-in-production'
 JWT_ALGORITHM = 'HS256'
 JWT_EXPIRY_HOURS = 24
 
-# Database configuration (same as app.py)
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'dayoffly',  # Using your database name
-    'port': 3306
-}
-
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        print("✓ Database connected successfully for login")
-        return conn
-    except mysql.connector.Error as e:
-        print(f"✗ Database connection failed: {e}")
-        return None
 
 def hash_password(password):
     """Simple password hashing function"""
@@ -0,0 +1,71 @@
+# pagination.py - Opaque cursor tokens and page-size parsing for list endpoints
+from datetime import datetime, date
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(*values):
+    """Pack the sort key of the last row on a page into an opaque token"""
+    packed = []
+    for value in values:
+        if isinstance(value, datetime):
+            packed.append({'dt': value.isoformat()})
+        elif isinstance(value, date):
+            packed.append({'d': value.isoformat()})
+        else:
+            packed.append(value)
+    raw = json.dumps(packed, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def _unpack(value):
+    """One packed value: a tagged date/datetime, a JSON scalar or a list of them"""
+    if isinstance(value, dict):
+        if len(value) != 1 or not isinstance(next(iter(value.values())), str):
+            raise ValueError("Invalid cursor")
+        if 'dt' in value:
+            return datetime.fromisoformat(value['dt'])
+        if 'd' in value:
+            return date.fromisoformat(value['d'])
+        raise ValueError("Invalid cursor")
+    if isinstance(value, list):
+        return [_unpack(item) for item in value]
+    if isinstance(value, bool) or not isinstance(value, (str, int, float, type(None))):
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def decode_cursor(token, types=None):
+    """
+    Unpack a token made by encode_cursor; raises ValueError if it is malformed.
+    types, if given, has one type (or tuple of types) per value the token must hold.
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        packed = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+    if not isinstance(packed, list):
+        raise ValueError("Invalid cursor")
+
+    values = [_unpack(value) for value in packed]
+    if types is not None:
+        if len(values) != len(types):
+            raise ValueError("Invalid cursor")
+        for value, expected in zip(values, types):
+            if not isinstance(value, expected):
+                raise ValueError("Invalid cursor")
+    return values
+
+
+def parse_page_size(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Clamp a page-size query parameter to 1..maximum"""
+    try:
+        size = int(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        size = default
+    return max(1, min(size, maximum))
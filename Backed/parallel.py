@@ -0,0 +1,157 @@
+# parallel.py - Concurrent independent reads on the sync stack
+#
+# run_parallel() runs the independent queries of one handler at the same time
+# on a bounded per-worker thread pool, each on its own pooled connection, so
+# the handler waits for roughly its slowest query instead of the sum.
+#
+# Every task gets its own timeout, counted from when it starts running. When a
+# task fails or times out, queued tasks are cancelled and running statements
+# are stopped with KILL QUERY; their connections are discarded, not pooled.
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_EXCEPTION
+from database import Query, POOL_CONFIG, connection, kill_query, run_queries
+
+FANOUT_CONFIG = {
+    # Keep part of the connection pool free for ordinary request connections
+    'workers': int(os.environ.get('DAYOFFLY_FANOUT_WORKERS', max(1, POOL_CONFIG['pool_size'] // 2))),
+    'timeout': float(os.environ.get('DAYOFFLY_QUERY_TIMEOUT', 10))     # seconds per query
+}
+
+# Wait slice while no task has started yet (all workers busy with other requests)
+IDLE_WAIT = 0.05
+
+
+class QueryTimeout(Exception):
+    """A fanned-out query ran longer than its timeout"""
+
+
+class QueryCancelled(Exception):
+    """A fanned-out query was stopped because a sibling failed"""
+
+
+class _Task:
+    """One unit of fan-out work and the connection it is running on"""
+
+    def __init__(self, name, work):
+        self.name = name
+        self.work = work
+        self.started_at = None
+        self.connection_id = None
+        self.cancelled = False
+        self.killed = False
+        self._lock = threading.Lock()
+
+    def run(self):
+        with self._lock:
+            if self.cancelled:
+                raise QueryCancelled(self.name)
+            self.started_at = time.monotonic()
+
+        with connection() as conn:
+            with self._lock:
+                self.connection_id = conn.connection_id
+            cursor = conn.cursor(dictionary=True)
+            try:
+                if isinstance(self.work, Query):
+                    cursor.execute(self.work.sql, self.work.params)
+                    return cursor.fetchone() if self.work.one else cursor.fetchall()
+                return self.work(cursor)
+            except Exception:
+                if self.killed:
+                    raise QueryCancelled(self.name)
+                raise
+            finally:
+                cursor.close()
+                with self._lock:
+                    self.connection_id = None
+                    # A KILL may already be on its way to this connection id
+                    if self.killed:
+                        conn.release(discard=True)
+
+    def cancel(self):
+        """Stop the task: skip it if not started, KILL QUERY if running"""
+        with self._lock:
+            self.cancelled = True
+            connection_id = self.connection_id
+            if connection_id is not None:
+                self.killed = True
+        if connection_id is not None:
+            try:
+                kill_query(connection_id)
+            except Exception as e:
+                print(f"⚠ Could not kill query {self.name} on connection {connection_id}: {e}")
+
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # One pool per process; forked workers must not share the parent's threads
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor_pid != pid:
+        with _executor_lock:
+            if _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=FANOUT_CONFIG['workers'],
+                                               thread_name_prefix='query-fanout')
+                _executor_pid = pid
+    return _executor
+
+
+def _run_sequential(tasks):
+    """Fan-out disabled: run everything on one connection"""
+    queries = {name: work for name, work in tasks.items() if isinstance(work, Query)}
+    with connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        try:
+            results = run_queries(cursor, queries)
+            for name, work in tasks.items():
+                if not isinstance(work, Query):
+                    results[name] = work(cursor)
+            return results
+        finally:
+            cursor.close()
+
+
+def run_parallel(tasks, timeout=None):
+    """
+    Run {name: Query or callable(cursor)} concurrently and return {name: result}.
+    A Query yields fetchone()/fetchall() rows, a callable whatever it returns.
+    Raises the first failure (QueryTimeout if a task overran) after stopping the rest.
+    """
+    timeout = FANOUT_CONFIG['timeout'] if timeout is None else timeout
+    if FANOUT_CONFIG['workers'] <= 1 or len(tasks) <= 1:
+        return _run_sequential(tasks)
+
+    executor = _get_executor()
+    running = {executor.submit(task.run): task for task in (_Task(name, work) for name, work in tasks.items())}
+    pending = set(running)
+
+    try:
+        while pending:
+            now = time.monotonic()
+            deadlines = [running[future].started_at + timeout for future in pending
+                         if running[future].started_at is not None]
+            wait_for = max(0, min(deadlines) - now) if deadlines else IDLE_WAIT
+            done, pending = wait(pending, timeout=wait_for, return_when=FIRST_EXCEPTION)
+
+            for future in done:
+                if future.exception() is not None:
+                    raise future.exception()
+
+            now = time.monotonic()
+            for future in pending:
+                task = running[future]
+                if task.started_at is not None and now - task.started_at >= timeout:
+                    raise QueryTimeout(f"Query {task.name} exceeded {timeout}s")
+    except BaseException:
+        for future in pending:
+            future.cancel()
+            running[future].cancel()
+        raise
+
+    return {task.name: future.result() for future, task in running.items()}
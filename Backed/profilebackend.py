@@ -1,30 +1,14 @@
 # profile_backend.py
 from flask import Blueprint, request, jsonify, session
 import mysql.connector
+from database import get_db_connection
+from cache import invalidate_directory, invalidate_user_data
 from datetime import datetime
 import re
 
 # Create Blueprint for profile routes
 profile_bp = Blueprint('profile', __name__)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'dayoffly',
-    'port': 3306
-}
-
-def get_db_connection():
-    """Create database connection with error handling"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"Database connection failed: {e}")
-        return None
-
 def validate_email(email):
     """Validate email format"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -254,6 +238,9 @@ def update_personal_info():
         
         cursor.execute(update_query, update_values)
         conn.commit()
+        invalidate_user_data(user_id)
+        # Name and email feed the employee pickers
+        invalidate_directory()
         
         # Check if update was successful
         if cursor.rowcount > 0:
@@ -514,6 +501,7 @@ def update_contact_details():
         
         cursor.execute(update_query, update_values)
         conn.commit()
+        invalidate_user_data(user_id)
         
         if cursor.rowcount > 0:
             return jsonify({
@@ -0,0 +1,124 @@
+# reference_data.py - In-memory registry of departments, roles and leave types
+#
+# The three tables are tiny and almost never change, so every worker keeps a
+# snapshot with id <-> name maps and resolves names without SQL. The snapshot
+# is reloaded when the cache 'reference' namespace version moves (see
+# cache.invalidate_reference_data, broadcast to all workers) or after
+# REFERENCE_REFRESH seconds to pick up edits made outside the application.
+import threading
+import time
+import mysql.connector
+from cache import cache
+from database import connection
+
+REFERENCE_REFRESH = 300     # seconds
+
+
+class ReferenceSnapshot:
+    """Immutable id <-> name maps as loaded at one point in time"""
+
+    def __init__(self, departments=(), roles=(), leave_types=(), version=0):
+        self.department_names = {row['id']: row['name'] for row in departments}
+        self.department_ids = {row['name']: row['id'] for row in departments}
+        self.department_regions = {row['id']: row['region'] for row in departments}
+        self.role_names = {row['id']: row['name'] for row in roles}
+        self.role_ids = {row['name']: row['id'] for row in roles}
+        self.leave_types = frozenset(leave_types)
+        self.version = version
+        self.loaded_at = time.monotonic()
+
+
+class ReferenceData:
+    """Versioned registry of reference tables; lookups never hit the database"""
+
+    def __init__(self):
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read all reference tables and swap in a new snapshot"""
+        version = cache.version('reference')
+        with connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute("SELECT department_id as id, department_name as name, region FROM department")
+                departments = cursor.fetchall()
+                cursor.execute("SELECT role_id as id, role_name as name FROM role")
+                roles = cursor.fetchall()
+                cursor.execute("SELECT leave_type FROM leave_types")
+                leave_types = [row['leave_type'] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+
+        self._snapshot = ReferenceSnapshot(departments, roles, leave_types, version)
+        print(f"✓ Reference data loaded: {len(departments)} departments, "
+              f"{len(roles)} roles, {len(leave_types)} leave types")
+        return self._snapshot
+
+    def _is_stale(self, snapshot):
+        return (snapshot is None
+                or snapshot.version != cache.version('reference')
+                or time.monotonic() - snapshot.loaded_at > REFERENCE_REFRESH)
+
+    def snapshot(self):
+        """Current snapshot, reloading it first if it is out of date"""
+        snapshot = self._snapshot
+        if not self._is_stale(snapshot):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if not self._is_stale(snapshot):
+                return snapshot
+            try:
+                return self.load()
+            except mysql.connector.Error as e:
+                print(f"⚠ Could not reload reference data: {e}")
+                if snapshot is None:
+                    return ReferenceSnapshot()
+                # Keep serving the last good snapshot, retry after the next refresh interval
+                snapshot.loaded_at = time.monotonic()
+                return snapshot
+
+    def department_id(self, name):
+        return self.snapshot().department_ids.get(name)
+
+    def department_name(self, department_id):
+        return self.snapshot().department_names.get(department_id)
+
+    def department_region(self, department_id):
+        """Holiday region of a department (None if unknown)"""
+        return self.snapshot().department_regions.get(department_id)
+
+    def departments(self):
+        """[{'id', 'name'}] ordered by name"""
+        names = self.snapshot().department_names
+        return [{'id': dept_id, 'name': name} for dept_id, name in sorted(names.items(), key=lambda item: item[1])]
+
+    def role_id(self, name):
+        return self.snapshot().role_ids.get(name)
+
+    def role_name(self, role_id):
+        return self.snapshot().role_names.get(role_id)
+
+    def roles(self):
+        """[{'id', 'name'}] ordered by name"""
+        names = self.snapshot().role_names
+        return [{'id': role_id, 'name': name} for role_id, name in sorted(names.items(), key=lambda item: item[1])]
+
+    def leave_types(self):
+        return self.snapshot().leave_types
+
+    def is_leave_type(self, leave_type):
+        return leave_type in self.snapshot().leave_types
+
+
+registry = ReferenceData()
+
+
+def init_app(app):
+    """Preload the registry at startup (lookups retry lazily if the database is down)"""
+    try:
+        registry.load()
+    except mysql.connector.Error as e:
+        print(f"⚠ Reference data not preloaded: {e}")
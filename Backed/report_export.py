@@ -0,0 +1,385 @@
+# report_export.py - Personal analytics report exports (PDF / XLSX) as jobs
+#
+# /api/export-analytics/<user_id> starts a job and answers at once; the
+# client polls the job and downloads the file when it is ready:
+#
+#   1. the report data is read in the request with run_parallel - a handful
+#      of aggregates and the leaves overlapping the period
+#   2. rendering (report_render) runs in child processes, at most
+#      REPORT_WORKERS at a time, so CPU-heavy layout neither blocks request
+#      threads nor holds the GIL; at most MAX_PENDING_REPORTS jobs wait per
+#      worker
+#   3. the file lands in REPORT_DIR under a name derived from (user, period,
+#      format, data version) - the job id - and is downloaded with send_file,
+#      which answers Range and If-Range requests
+#
+# The data version is the cache watermark of 'analytics' and 'reference',
+# which leave, balance and user writes bump. Exporting the same period again
+# before anything changed finds the file and is ready immediately - in any
+# worker, since the job id can be recomputed and the file is on disk. Files
+# are removed REPORT_TTL after they were written.
+#
+# Job state is on disk too, so a poll answered by another worker sees it:
+# the worker rendering a report holds a `<file>.pending` marker (created
+# exclusively, so two workers never render the same job) until the file is
+# in place, and leaves a `<file>.failed` marker if rendering fails. A pending
+# marker older than RENDER_TIMEOUT belongs to a worker that died.
+#
+# Each render is a fresh interpreter running report_render.py as a script,
+# with the report as JSON on stdin. Not a fork, which would inherit the
+# connection pool's sockets and any lock another thread held at the time, and
+# not a multiprocessing spawn, which re-imports the main module - app.py, with
+# every init_app - in each child.
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from cache import cache
+from database import Query
+from parallel import run_parallel
+import report_render
+
+REPORT_DIR = os.environ.get('DAYOFFLY_REPORT_DIR', os.path.join(tempfile.gettempdir(), 'dayoffly-reports'))
+REPORT_WORKERS = int(os.environ.get('DAYOFFLY_REPORT_WORKERS', 2))
+MAX_PENDING_REPORTS = 16
+REPORT_TTL = 24 * 3600          # seconds a rendered report is kept
+PRUNE_INTERVAL = 600            # seconds between sweeps of REPORT_DIR
+RENDER_TIMEOUT = 300            # seconds after which a pending marker is abandoned
+MAX_REPORT_LEAVES = 5000        # leave rows listed in one report
+
+# Cache namespaces the report content depends on
+REPORT_NAMESPACES = ('analytics', 'reference')
+
+RENDER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'report_render.py')
+
+JOB_ID = re.compile(r"^[0-9a-f]{40}$")
+
+STATUS_LABELS = {'approved': 'Approved', 'pending': 'Pending', 'declined': 'Rejected', 'rejected': 'Rejected'}
+
+
+class ReportQueueFull(Exception):
+    """Too many reports are waiting to be rendered"""
+
+
+def report_queries(user_id, start, end):
+    """The reads behind one report: leaves overlapping [start, end] and the current balance"""
+    overlap = "lf.user_id = %s AND lf.start_date <= %s AND lf.end_date >= %s"
+    params = (user_id, end, start)
+    return {
+        'user_info': Query("""
+            SELECT u.user_id, u.user_name, u.email, u.designation,
+                   d.department_name, r.role_name
+            FROM users_master u
+            LEFT JOIN department d ON u.department_id = d.department_id
+            LEFT JOIN role r ON u.role_id = r.role_id
+            WHERE u.user_id = %s
+        """, (user_id,), one=True),
+        'balance': Query("""
+            SELECT SUM(total_leaves) as total_allowed,
+                   SUM(remaining_leaves) as total_remaining,
+                   SUM(pending_leaves) as total_pending
+            FROM leave_balance
+            WHERE user_id = %s
+        """, (user_id,), one=True),
+        'by_type': Query(f"""
+            SELECT lf.leave_type, COUNT(*) as requests, SUM(lf.working_days) as days
+            FROM leave_fact lf
+            WHERE {overlap}
+            GROUP BY lf.leave_type
+            ORDER BY requests DESC, lf.leave_type
+        """, params),
+        'by_month': Query(f"""
+            SELECT lf.start_month, COUNT(*) as requests, SUM(lf.working_days) as days
+            FROM leave_fact lf
+            WHERE {overlap}
+            GROUP BY lf.start_month
+            ORDER BY lf.start_month
+        """, params),
+        'by_status': Query(f"""
+            SELECT lf.leave_status, COUNT(*) as requests, SUM(lf.working_days) as days
+            FROM leave_fact lf
+            WHERE {overlap}
+            GROUP BY lf.leave_status
+        """, params),
+        'leaves': Query(f"""
+            SELECT lf.start_date, lf.end_date, lf.leave_type, lf.working_days, lf.leave_status, la.reason
+            FROM leave_fact lf
+            JOIN leave_application la ON lf.leave_id = la.leave_id
+            WHERE {overlap}
+            ORDER BY lf.start_date DESC, lf.leave_id DESC
+            LIMIT %s
+        """, params + (MAX_REPORT_LEAVES,))
+    }
+
+
+def build_report(user_id, start, end, results):
+    """
+    The report as plain, picklable data for report_render; None if the user
+    does not exist
+    """
+    user = results['user_info']
+    if not user:
+        return None
+    balance = results['balance'] or {}
+
+    status_counts = {'Approved': [0, 0], 'Pending': [0, 0], 'Rejected': [0, 0]}
+    for row in results['by_status']:
+        counts = status_counts.setdefault(STATUS_LABELS.get(row['leave_status'], row['leave_status']), [0, 0])
+        counts[0] += row['requests']
+        counts[1] += int(row['days'] or 0)
+    total_requests = sum(counts[0] for counts in status_counts.values())
+    approved = status_counts['Approved'][0]
+
+    summary = [
+        ('Requests', total_requests),
+        ('Approved', approved),
+        ('Pending', status_counts['Pending'][0]),
+        ('Rejected', status_counts['Rejected'][0]),
+        ('Approval rate', f"{round(approved / total_requests * 100, 1) if total_requests else 0}%"),
+        ('Working days taken', status_counts['Approved'][1]),
+        ('Days remaining (today)', int(balance.get('total_remaining') or 0)),
+        ('Days reserved by pending requests', int(balance.get('total_pending') or 0)),
+        ('Yearly allowance', int(balance.get('total_allowed') or 0))
+    ]
+    if len(results['leaves']) == MAX_REPORT_LEAVES:
+        summary.append(('Leaves listed', f"latest {MAX_REPORT_LEAVES}"))
+
+    return {
+        'user': {key: user[key] for key in ('user_id', 'user_name', 'email', 'designation',
+                                            'department_name', 'role_name')},
+        'period': {'from': start.isoformat(), 'to': end.isoformat()},
+        'summary': summary,
+        'by_type': [(row['leave_type'], row['requests'], int(row['days'] or 0)) for row in results['by_type']],
+        'by_month': [(row['start_month'], row['requests'], int(row['days'] or 0)) for row in results['by_month']],
+        'by_status': [(label, counts[0]) for label, counts in status_counts.items()],
+        'leaves': [(row['start_date'].isoformat(), row['end_date'].isoformat(), row['leave_type'],
+                    row['working_days'], STATUS_LABELS.get(row['leave_status'], row['leave_status']),
+                    row['reason'] or '')
+                   for row in results['leaves']]
+    }
+
+
+def _claim(marker):
+    """Create the pending marker; False if a live one exists (another worker is rendering)"""
+    for _ in range(2):
+        try:
+            os.close(os.open(marker, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(marker) < RENDER_TIMEOUT:
+                    return False
+                os.remove(marker)
+            except FileNotFoundError:
+                pass
+    return False
+
+
+def _render_in_child(report, fmt, path):
+    """Run report_render.py on the report in a child interpreter; returns the file size"""
+    result = subprocess.run([sys.executable, RENDER_SCRIPT, fmt, path],
+                            input=json.dumps(report).encode('utf-8'),
+                            capture_output=True, timeout=RENDER_TIMEOUT)
+    if result.returncode != 0:
+        lines = result.stderr.decode('utf-8', 'replace').strip().splitlines()
+        raise RuntimeError(lines[-1] if lines else f"renderer exited with {result.returncode}")
+    return int(result.stdout)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ReportJob:
+    """One export: pending while it is read and rendered, then ready or failed"""
+
+    def __init__(self, job_id, user_id, fmt, path, download_name, status='pending'):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.fmt = fmt
+        self.path = path
+        self.download_name = download_name
+        self.status = status
+        self.error = None
+        self.finished_at = time.time() if status == 'ready' else None
+
+    @property
+    def mimetype(self):
+        return report_render.MIMETYPES[self.fmt]
+
+    def to_dict(self):
+        job = {'job_id': self.job_id, 'status': self.status, 'format': self.fmt}
+        if self.status == 'ready':
+            job['size'] = os.path.getsize(self.path)
+        if self.error:
+            job['error'] = self.error
+        return job
+
+
+class ReportExporter:
+    """Report jobs of this worker and the threads that wait on their render processes"""
+
+    def __init__(self):
+        self._jobs = {}             # job_id -> ReportJob
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pruned_at = 0
+
+    def _submit(self, report, fmt, path):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report-render')
+            executor = self._executor
+        return executor.submit(_render_in_child, report, fmt, path)
+
+    @staticmethod
+    def _usable(job):
+        """Not failed, and if ready its file is still there (another worker may have pruned it)"""
+        return job.status == 'pending' or (job.status == 'ready' and os.path.exists(job.path))
+
+    def start(self, user_id, start, end, fmt):
+        """
+        The job exporting user_id's report for [start, end] as fmt - the
+        existing one if that report is already rendered or rendering.
+        Raises ReportQueueFull, or LookupError if the user does not exist.
+        """
+        self._prune()
+        version = cache.data_version(*REPORT_NAMESPACES)
+        job_id = hashlib.sha1(f"{user_id}|{start}|{end}|{fmt}|{version}".encode()).hexdigest()
+        download_name = f"leave-report-{user_id}-{start.isoformat()}-{end.isoformat()}.{fmt}"
+        path = os.path.join(REPORT_DIR, f"leave-report-{user_id}-{start.isoformat()}-{end.isoformat()}-{job_id}.{fmt}")
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and self._usable(job):
+                return job
+            if os.path.exists(path):
+                job = self._jobs[job_id] = ReportJob(job_id, user_id, fmt, path, download_name, 'ready')
+                return job
+            if sum(other.status == 'pending' for other in self._jobs.values()) >= MAX_PENDING_REPORTS:
+                raise ReportQueueFull(f"{MAX_PENDING_REPORTS} reports are already being rendered")
+            if not _claim(f"{path}.pending"):
+                # Another worker is rendering it; polls find its marker, then the file
+                return ReportJob(job_id, user_id, fmt, path, download_name)
+            _remove(f"{path}.failed")
+            job = self._jobs[job_id] = ReportJob(job_id, user_id, fmt, path, download_name)
+
+        try:
+            report = build_report(user_id, start, end, run_parallel(report_queries(user_id, start, end)))
+            if report is None:
+                raise LookupError(f"User {user_id} not found")
+            future = self._submit(report, fmt, path)
+        except Exception:
+            with self._lock:
+                self._jobs.pop(job_id, None)
+            _remove(f"{path}.pending")
+            raise
+
+        started = time.perf_counter()
+
+        def finished(future):
+            try:
+                size = future.result()
+                job.status = 'ready'
+                print(f"✓ Report {download_name} rendered: {size} bytes "
+                      f"({time.perf_counter() - started:.2f}s)")
+            except Exception as e:
+                job.status = 'failed'
+                job.error = 'Rendering failed'
+                print(f"✗ Report {download_name} failed: {e}")
+                try:
+                    open(f"{path}.failed", 'w').close()
+                except OSError as marker_error:
+                    print(f"⚠ Could not mark report {download_name} failed: {marker_error}")
+            job.finished_at = time.time()
+            _remove(f"{path}.pending")
+
+        future.add_done_callback(finished)
+        return job
+
+    def get(self, user_id, job_id):
+        """user_id's job, from this worker or - started by another - from disk; None if unknown"""
+        if not JOB_ID.match(job_id or ''):
+            return None
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return job if job.user_id == user_id and (job.status == 'failed' or self._usable(job)) else None
+
+        # The report file, or its .pending / .failed marker: {suffix after the job id: path}
+        found = {}
+        name = None
+        for path in glob.glob(os.path.join(REPORT_DIR, f"leave-report-{user_id}-*-{job_id}.*")):
+            name, _, suffix = os.path.basename(path).partition(f"-{job_id}.")
+            found[suffix] = path
+        if not found:
+            return None
+        for fmt in report_render.MIMETYPES:
+            path = os.path.join(REPORT_DIR, f"{name}-{job_id}.{fmt}")
+            download_name = f"{name}.{fmt}"
+            if fmt in found:
+                return ReportJob(job_id, user_id, fmt, path, download_name, 'ready')
+            if f"{fmt}.failed" in found:
+                job = ReportJob(job_id, user_id, fmt, path, download_name, 'failed')
+                job.error = 'Rendering failed'
+                return job
+            pending = found.get(f"{fmt}.pending")
+            try:
+                if pending and time.time() - os.path.getmtime(pending) < RENDER_TIMEOUT:
+                    return ReportJob(job_id, user_id, fmt, path, download_name)
+            except FileNotFoundError:
+                # Finished meanwhile
+                if os.path.exists(path):
+                    return ReportJob(job_id, user_id, fmt, path, download_name, 'ready')
+        return None
+
+    def _prune(self):
+        """Forget finished jobs and delete report files older than REPORT_TTL"""
+        now = time.time()
+        if now - self._pruned_at < PRUNE_INTERVAL:
+            return
+        self._pruned_at = now
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished_at is not None and now - job.finished_at > REPORT_TTL:
+                    del self._jobs[job_id]
+        try:
+            with os.scandir(REPORT_DIR) as entries:
+                for entry in entries:
+                    if entry.name.startswith('leave-report-') and now - entry.stat().st_mtime > REPORT_TTL:
+                        os.remove(entry.path)
+        except OSError as e:
+            print(f"⚠ Could not prune {REPORT_DIR}: {e}")
+
+    def stats(self):
+        with self._lock:
+            statuses = [job.status for job in self._jobs.values()]
+        return {
+            'formats': report_render.available_formats(),
+            'workers': REPORT_WORKERS,
+            'pending': statuses.count('pending'),
+            'ready': statuses.count('ready'),
+            'failed': statuses.count('failed')
+        }
+
+
+reports = ReportExporter()
+
+
+def init_app(app):
+    """Create the report directory and say which formats can be exported"""
+    os.makedirs(REPORT_DIR, exist_ok=True)
+    formats = report_render.available_formats()
+    if formats:
+        print(f"✓ Report export: {', '.join(formats)} ({REPORT_WORKERS} workers, {REPORT_DIR})")
+    else:
+        print("⚠ Report export unavailable: install reportlab (PDF) and/or openpyxl (XLSX)")
@@ -0,0 +1,159 @@
+# report_render.py - PDF / XLSX rendering of the personal analytics report
+#
+# Runs as a script in a child process of report_export, so it imports nothing
+# from the app:
+#
+#   python report_render.py <pdf|xlsx> <path>  < report.json
+#
+# It gets a report as plain data (see report_export.build_report) and a path,
+# writes the file there atomically - rendered next to it and renamed into
+# place - so a reader never sees a half-written report, and prints its size.
+#
+# reportlab (PDF) and openpyxl (XLSX) are optional; a format whose library
+# is missing is simply not offered (available_formats).
+import json
+import os
+import sys
+from xml.sax.saxutils import escape
+
+try:
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+except ImportError:
+    A4 = None
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+except ImportError:
+    Workbook = None
+
+MIMETYPES = {
+    'pdf': 'application/pdf',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+# Section tables: (title, report key, column headers)
+SECTIONS = (
+    ('By leave type', 'by_type', ('Leave type', 'Requests', 'Working days')),
+    ('By month', 'by_month', ('Month', 'Requests', 'Working days')),
+    ('By status', 'by_status', ('Status', 'Requests')),
+    ('Leaves', 'leaves', ('Start', 'End', 'Type', 'Working days', 'Status', 'Reason'))
+)
+
+
+def available_formats():
+    """Formats whose rendering library is installed"""
+    formats = []
+    if A4 is not None:
+        formats.append('pdf')
+    if Workbook is not None:
+        formats.append('xlsx')
+    return formats
+
+
+def _title(report):
+    user = report['user']
+    return f"Leave report - {user['user_name']}"
+
+
+def _subtitle(report):
+    user = report['user']
+    parts = [user.get('designation'), user.get('department_name'), user.get('email')]
+    period = f"{report['period']['from']} to {report['period']['to']}"
+    return ' | '.join([part for part in parts if part] + [period])
+
+
+def _render_pdf(report, path):
+    styles = getSampleStyleSheet()
+    table_style = TableStyle([
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e5e7eb')),
+        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#9ca3af')),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP')
+    ])
+
+    def table(header, rows):
+        # Paragraphs (markup, hence escaped) wrap long reasons inside their cell
+        cells = [[Paragraph(escape(str(value if value is not None else '')), styles['BodyText']) for value in row]
+                 for row in rows]
+        flowable = Table([list(header)] + cells, repeatRows=1, hAlign='LEFT')
+        flowable.setStyle(table_style)
+        return flowable
+
+    story = [
+        Paragraph(escape(_title(report)), styles['Title']),
+        Paragraph(escape(_subtitle(report)), styles['Normal']),
+        Spacer(1, 6 * mm),
+        table(('Summary', ''), report['summary'])
+    ]
+    for title, key, header in SECTIONS:
+        story.append(Spacer(1, 6 * mm))
+        story.append(Paragraph(title, styles['Heading2']))
+        if report[key]:
+            story.append(table(header, report[key]))
+        else:
+            story.append(Paragraph('No leaves in this period', styles['Normal']))
+
+    doc = SimpleDocTemplate(path, pagesize=A4, title=_title(report),
+                            leftMargin=15 * mm, rightMargin=15 * mm, topMargin=15 * mm, bottomMargin=15 * mm)
+    doc.build(story)
+
+
+def _render_xlsx(report, path):
+    # Write-only: rows go straight to the file instead of a cell tree in memory
+    workbook = Workbook(write_only=True)
+    bold = Font(bold=True)
+
+    def header_row(sheet, values):
+        cells = []
+        for value in values:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.font = bold
+            cells.append(cell)
+        sheet.append(cells)
+
+    summary = workbook.create_sheet('Summary')
+    summary.append([_title(report)])
+    summary.append([_subtitle(report)])
+    summary.append([])
+    for label, value in report['summary']:
+        summary.append([label, value])
+
+    for title, key, header in SECTIONS:
+        sheet = workbook.create_sheet(title)
+        header_row(sheet, header)
+        for row in report[key]:
+            sheet.append(list(row))
+
+    workbook.save(path)
+
+
+def render(report, fmt, path):
+    """Render report as fmt into path; returns the file size"""
+    renderer = {'pdf': _render_pdf, 'xlsx': _render_xlsx}[fmt]
+    partial = f"{path}.{os.getpid()}.part"
+    try:
+        renderer(report, partial)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return os.path.getsize(path)
+
+
+def main(argv):
+    fmt, path = argv[1], argv[2]
+    if fmt not in available_formats():
+        sys.exit(f"{fmt} rendering is not available")
+    report = json.load(sys.stdin)
+    print(render(report, fmt, path))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
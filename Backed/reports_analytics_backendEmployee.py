@@ -1,29 +1,17 @@
-from flask import Blueprint, jsonify, session
+from flask import Blueprint, jsonify, request, send_file, session
 import mysql.connector
-from datetime import datetime
+from database import Query
+from parallel import run_parallel
+from http_caching import conditional
+from cache import cache
+from report_export import REPORT_TTL, ReportQueueFull, reports
+from report_render import MIMETYPES, available_formats
+from datetime import date, datetime
 from functools import wraps
 
 # Create Blueprint
 reports_analytics_bp = Blueprint('reports_analytics', __name__)
 
-# Database configuration (same as app.py)
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',      
-    'database': 'dayoffly',
-    'port': 3306
-}
-
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"✗ Database connection failed: {e}")
-        return None
-
 def login_required(f):
     """Decorator to check if user is logged in"""
     @wraps(f)
@@ -51,101 +39,73 @@ def get_current_user():
         print(f"Error in get_current_user: {e}")
         return jsonify({'error': 'Failed to get user data'}), 500
 
-@reports_analytics_bp.route('/api/user-analytics/<int:user_id>')
-@login_required
-def get_user_analytics(user_id):
-    """Get personalized analytics data for a specific user"""
-    try:
-        # Verify the requested user matches logged-in user (security check)
-        current_user_id = session.get('user', {}).get('user_id')
-        if current_user_id != user_id:
-            return jsonify({'error': 'Access denied'}), 403
-        
-        conn = get_db_connection()
-        if not conn:
-            return jsonify({'error': 'Database connection failed'}), 500
-        
-        cursor = conn.cursor(dictionary=True)
-        
-        # Get user basic info
-        cursor.execute("""
+def user_analytics_queries(user_id):
+    """The independent reads behind the personal analytics page"""
+    current_year = datetime.now().year
+    return {
+        # User basic info
+        'user_info': Query("""
             SELECT u.user_id, u.user_name, u.email, u.designation, 
                    d.department_name, r.role_name
             FROM users_master u
             LEFT JOIN department d ON u.department_id = d.department_id
             LEFT JOIN role r ON u.role_id = r.role_id
             WHERE u.user_id = %s
-        """, (user_id,))
-        user_info = cursor.fetchone()
-        
-        if not user_info:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Get leave statistics
-        cursor.execute("""
+        """, (user_id,), one=True),
+        # Leave statistics
+        'stats': Query("""
             SELECT 
                 COUNT(*) as total_requests,
                 SUM(CASE WHEN leave_status = 'approved' THEN 1 ELSE 0 END) as approved_requests,
                 SUM(CASE WHEN leave_status = 'pending' THEN 1 ELSE 0 END) as pending_requests,
                 SUM(CASE WHEN leave_status IN ('rejected', 'declined') THEN 1 ELSE 0 END) as rejected_requests,
-                SUM(DATEDIFF(end_date, start_date) + 1) as total_days_used
-            FROM leave_application 
+                SUM(working_days) as total_days_used
+            FROM leave_fact 
             WHERE user_id = %s
-        """, (user_id,))
-        stats = cursor.fetchone()
-        
-        # Get leave balance
-        cursor.execute("""
+        """, (user_id,), one=True),
+        # Leave balance
+        'balance': Query("""
             SELECT SUM(remaining_leaves) as total_remaining,
                    SUM(total_leaves) as total_allowed,
                    SUM(used_leaves) as total_used
             FROM leave_balance 
             WHERE user_id = %s
-        """, (user_id,))
-        balance = cursor.fetchone()
-        
-        # Get leave type distribution
-        cursor.execute("""
+        """, (user_id,), one=True),
+        # Leave type distribution
+        'leave_types': Query("""
             SELECT leave_type, COUNT(*) as count
-            FROM leave_application 
+            FROM leave_fact 
             WHERE user_id = %s
             GROUP BY leave_type
             ORDER BY count DESC
-        """, (user_id,))
-        leave_types = cursor.fetchall()
-        
-        # Get monthly trends for current year
-        current_year = datetime.now().year
-        cursor.execute("""
-            SELECT MONTH(start_date) as month, COUNT(*) as count
-            FROM leave_application 
-            WHERE user_id = %s AND YEAR(start_date) = %s
-            GROUP BY MONTH(start_date)
-            ORDER BY month
-        """, (user_id, current_year))
-        monthly_data = cursor.fetchall()
-        
-        # Get leave status distribution
-        cursor.execute("""
+        """, (user_id,)),
+        # Monthly trends for current year
+        'monthly_data': Query("""
+            SELECT CAST(SUBSTRING(start_month, 6, 2) AS UNSIGNED) as month, COUNT(*) as count
+            FROM leave_fact 
+            WHERE user_id = %s AND start_month BETWEEN %s AND %s
+            GROUP BY start_month
+            ORDER BY start_month
+        """, (user_id, f"{current_year}-01", f"{current_year}-12")),
+        # Leave status distribution
+        'status_data': Query("""
             SELECT leave_status, COUNT(*) as count
-            FROM leave_application 
+            FROM leave_fact 
             WHERE user_id = %s
             GROUP BY leave_status
-        """, (user_id,))
-        status_data = cursor.fetchall()
-        
-        # Get leave duration patterns
-        cursor.execute("""
+        """, (user_id,)),
+        # Leave duration patterns
+        'duration_data': Query("""
             SELECT 
                 CASE 
-                    WHEN DATEDIFF(end_date, start_date) = 0 THEN '1 day'
-                    WHEN DATEDIFF(end_date, start_date) = 1 THEN '2 days'
-                    WHEN DATEDIff(end_date, start_date) = 2 THEN '3 days'
-                    WHEN DATEDIFF(end_date, start_date) BETWEEN 3 AND 4 THEN '4-5 days'
+                    WHEN duration_days = 1 THEN '1 day'
+                    WHEN duration_days = 2 THEN '2 days'
+                    WHEN duration_days = 3 THEN '3 days'
+                    WHEN duration_days BETWEEN 4 AND 5 THEN '4-5 days'
                     ELSE '5+ days'
                 END as duration_category,
                 COUNT(*) as count
-            FROM leave_application 
+            FROM leave_fact 
             WHERE user_id = %s AND leave_status = 'approved'
             GROUP BY duration_category
             ORDER BY 
@@ -156,11 +116,9 @@ def get_user_analytics(user_id):
                     WHEN '4-5 days' THEN 4
                     ELSE 5
                 END
-        """, (user_id,))
-        duration_data = cursor.fetchall()
-        
-        # Get recent leave history
-        cursor.execute("""
+        """, (user_id,)),
+        # Recent leave history
+        'leave_history': Query("""
             SELECT 
                 la.start_date, 
                 la.end_date, 
@@ -175,114 +133,151 @@ def get_user_analytics(user_id):
             ORDER BY la.start_date DESC
             LIMIT 10
         """, (user_id,))
-        leave_history = cursor.fetchall()
-        
-        # Calculate approval rate
-        total_requests = stats['total_requests'] if stats and stats['total_requests'] else 0
-        approved_requests = stats['approved_requests'] if stats else 0
-        approval_rate = round((approved_requests / total_requests * 100), 1) if total_requests > 0 else 0
-        
-        # Get most used leave type
-        most_used_type = leave_types[0]['leave_type'] if leave_types else 'N/A'
-        most_used_percentage = round((leave_types[0]['count'] / total_requests * 100), 1) if leave_types and total_requests > 0 else 0
-        
-        # Format monthly data for chart
-        monthly_counts = [0] * 12
-        for month_data in monthly_data:
-            month_index = month_data['month'] - 1
-            if 0 <= month_index < 12:
-                monthly_counts[month_index] = month_data['count']
-        
-        # Format status data for chart
-        status_counts = {'approved': 0, 'pending': 0, 'rejected': 0, 'declined': 0}
-        for status_item in status_data:
-            status_counts[status_item['leave_status']] = status_item['count']
-        
-        # Format duration data for chart
-        duration_categories = ['1 day', '2 days', '3 days', '4-5 days', '5+ days']
-        duration_counts = [0] * 5
-        for duration_item in duration_data:
-            category = duration_item['duration_category']
-            if category in duration_categories:
-                index = duration_categories.index(category)
-                duration_counts[index] = duration_item['count']
+    }
+
+
+def build_user_analytics(user_id, results):
+    """Shape the query results into the analytics payload; None if the user does not exist"""
+    user_info = results['user_info']
+    if not user_info:
+        return None
+
+    stats = results['stats']
+    balance = results['balance']
+    leave_types = results['leave_types']
+    monthly_data = results['monthly_data']
+    status_data = results['status_data']
+    duration_data = results['duration_data']
+    leave_history = results['leave_history']
+
+    # Calculate approval rate
+    total_requests = stats['total_requests'] if stats and stats['total_requests'] else 0
+    approved_requests = stats['approved_requests'] if stats else 0
+    approval_rate = round((approved_requests / total_requests * 100), 1) if total_requests > 0 else 0
+    
+    # Get most used leave type
+    most_used_type = leave_types[0]['leave_type'] if leave_types else 'N/A'
+    most_used_percentage = round((leave_types[0]['count'] / total_requests * 100), 1) if leave_types and total_requests > 0 else 0
+    
+    # Format monthly data for chart
+    monthly_counts = [0] * 12
+    for month_data in monthly_data:
+        month_index = month_data['month'] - 1
+        if 0 <= month_index < 12:
+            monthly_counts[month_index] = month_data['count']
+    
+    # Format status data for chart
+    status_counts = {'approved': 0, 'pending': 0, 'rejected': 0, 'declined': 0}
+    for status_item in status_data:
+        status_counts[status_item['leave_status']] = status_item['count']
+    
+    # Format duration data for chart
+    duration_categories = ['1 day', '2 days', '3 days', '4-5 days', '5+ days']
+    duration_counts = [0] * 5
+    for duration_item in duration_data:
+        category = duration_item['duration_category']
+        if category in duration_categories:
+            index = duration_categories.index(category)
+            duration_counts[index] = duration_item['count']
+    
+    # Format leave history for frontend
+    formatted_history = []
+    for history_item in leave_history:
+        formatted_history.append({
+            'start_date': history_item['start_date'].strftime('%Y-%m-%d') if history_item['start_date'] else '',
+            'end_date': history_item['end_date'].strftime('%Y-%m-%d') if history_item['end_date'] else '',
+            'leave_type': history_item['leave_type'],
+            'duration': f"{history_item['duration']} days",
+            'leave_status': history_item['leave_status'],
+            'reason': history_item['reason'] or 'Not specified',
+            'approved_by': history_item['approved_by'] or 'Pending'
+        })
+    
+    # Generate patterns based on data
+    patterns = generate_leave_patterns(leave_types, monthly_data, duration_data, user_id)
+    
+    # Format the response data
+    return {
+        'userInfo': user_info,
+        'stats': {
+            'totalRequests': total_requests,
+            'approvedRequests': approved_requests,
+            'pendingRequests': stats['pending_requests'] if stats else 0,
+            'rejectedRequests': stats['rejected_requests'] if stats else 0,
+            'approvalRate': approval_rate,
+            'daysUsed': stats['total_days_used'] if stats else 0,
+            'daysRemaining': balance['total_remaining'] if balance else 0,
+            'totalAllowed': balance['total_allowed'] if balance else 0,
+            'mostUsedType': most_used_type,
+            'mostUsedPercentage': f"{most_used_percentage}% of my requests"
+        },
+        'charts': {
+            'leaveType': {
+                'labels': [lt['leave_type'] for lt in leave_types],
+                'datasets': [{
+                    'data': [lt['count'] for lt in leave_types],
+                    'backgroundColor': ['#3b82f6', '#10b981', '#f59e0b', '#8b5cf6', '#ef4444', '#6b7280'][:len(leave_types)]
+                }]
+            },
+            'monthlyTrend': {
+                'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
+                'datasets': [{
+                    'label': 'My Leave Requests',
+                    'data': monthly_counts,
+                    'borderColor': '#3b82f6',
+                    'backgroundColor': 'rgba(59, 130, 246, 0.1)',
+                    'fill': True,
+                    'tension': 0.3
+                }]
+            },
+            'status': {
+                'labels': ['Approved', 'Pending', 'Rejected'],
+                'datasets': [{
+                    'data': [
+                        status_counts['approved'],
+                        status_counts['pending'],
+                        status_counts['rejected'] + status_counts['declined']
+                    ],
+                    'backgroundColor': ['#10b981', '#f59e0b', '#ef4444']
+                }]
+            },
+            'duration': {
+                'labels': duration_categories,
+                'datasets': [{
+                    'label': 'My Leave Durations',
+                    'data': duration_counts,
+                    'backgroundColor': '#8b5cf6'
+                }]
+            }
+        },
+        'leaveHistory': formatted_history,
+        'patterns': patterns
+    }
+
+
+@reports_analytics_bp.route('/api/user-analytics/<int:user_id>')
+@login_required
+@conditional
+def get_user_analytics(user_id):
+    """Get personalized analytics data for a specific user"""
+    try:
+        # Verify the requested user matches logged-in user (security check)
+        current_user_id = session.get('user', {}).get('user_id')
+        if current_user_id != user_id:
+            return jsonify({'error': 'Access denied'}), 403
         
-        # Format leave history for frontend
-        formatted_history = []
-        for history_item in leave_history:
-            formatted_history.append({
-                'start_date': history_item['start_date'].strftime('%Y-%m-%d') if history_item['start_date'] else '',
-                'end_date': history_item['end_date'].strftime('%Y-%m-%d') if history_item['end_date'] else '',
-                'leave_type': history_item['leave_type'],
-                'duration': f"{history_item['duration']} days",
-                'leave_status': history_item['leave_status'],
-                'reason': history_item['reason'] or 'Not specified',
-                'approved_by': history_item['approved_by'] or 'Pending'
-            })
+        analytics_data = cache.get('analytics', f"user:{user_id}")
+        if analytics_data is not None:
+            return jsonify(analytics_data)
         
-        # Generate patterns based on data
-        patterns = generate_leave_patterns(leave_types, monthly_data, duration_data, user_id)
+        # The eight reads are independent - run them side by side
+        results = run_parallel(user_analytics_queries(user_id))
         
-        # Format the response data
-        analytics_data = {
-            'userInfo': user_info,
-            'stats': {
-                'totalRequests': total_requests,
-                'approvedRequests': approved_requests,
-                'pendingRequests': stats['pending_requests'] if stats else 0,
-                'rejectedRequests': stats['rejected_requests'] if stats else 0,
-                'approvalRate': approval_rate,
-                'daysUsed': stats['total_days_used'] if stats else 0,
-                'daysRemaining': balance['total_remaining'] if balance else 0,
-                'totalAllowed': balance['total_allowed'] if balance else 0,
-                'mostUsedType': most_used_type,
-                'mostUsedPercentage': f"{most_used_percentage}% of my requests"
-            },
-            'charts': {
-                'leaveType': {
-                    'labels': [lt['leave_type'] for lt in leave_types],
-                    'datasets': [{
-                        'data': [lt['count'] for lt in leave_types],
-                        'backgroundColor': ['#3b82f6', '#10b981', '#f59e0b', '#8b5cf6', '#ef4444', '#6b7280'][:len(leave_types)]
-                    }]
-                },
-                'monthlyTrend': {
-                    'labels': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'],
-                    'datasets': [{
-                        'label': 'My Leave Requests',
-                        'data': monthly_counts,
-                        'borderColor': '#3b82f6',
-                        'backgroundColor': 'rgba(59, 130, 246, 0.1)',
-                        'fill': True,
-                        'tension': 0.3
-                    }]
-                },
-                'status': {
-                    'labels': ['Approved', 'Pending', 'Rejected'],
-                    'datasets': [{
-                        'data': [
-                            status_counts['approved'],
-                            status_counts['pending'],
-                            status_counts['rejected'] + status_counts['declined']
-                        ],
-                        'backgroundColor': ['#10b981', '#f59e0b', '#ef4444']
-                    }]
-                },
-                'duration': {
-                    'labels': duration_categories,
-                    'datasets': [{
-                        'label': 'My Leave Durations',
-                        'data': duration_counts,
-                        'backgroundColor': '#8b5cf6'
-                    }]
-                }
-            },
-            'leaveHistory': formatted_history,
-            'patterns': patterns
-        }
+        analytics_data = build_user_analytics(user_id, results)
+        if analytics_data is None:
+            return jsonify({'error': 'User not found'}), 404
         
-        cursor.close()
-        conn.close()
+        cache.set('analytics', f"user:{user_id}", analytics_data)
         
         print(f"✓ Analytics data loaded for user {user_id}")
         return jsonify(analytics_data)
@@ -343,27 +338,96 @@ def generate_leave_patterns(leave_types, monthly_data, duration_data, user_id):
     
     return patterns
 
-@reports_analytics_bp.route('/api/export-analytics/<int:user_id>')
+def _parse_report_date(value, default):
+    if not value:
+        return default
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def _report_job_response(user_id, job):
+    """Job status with the URLs to poll and, once ready, to download"""
+    base = f"/api/export-analytics/{user_id}/jobs/{job.job_id}"
+    body = job.to_dict()
+    body['status_url'] = base
+    if job.status == 'ready':
+        body['download_url'] = f"{base}/download"
+    return jsonify(body), 200 if job.status != 'pending' else 202
+
+
+@reports_analytics_bp.route('/api/export-analytics/<int:user_id>', methods=['GET', 'POST'])
 @login_required
 def export_analytics_report(user_id):
-    """Export analytics data as PDF/Excel (placeholder)"""
+    """
+    Start exporting the user's leave report.
+    Query: from, to (YYYY-MM-DD, default this year to today), format (pdf | xlsx).
+    202 with the job to poll while it renders, 200 when the same report is already rendered.
+    """
     try:
         # Verify the requested user matches logged-in user
         current_user_id = session.get('user', {}).get('user_id')
         if current_user_id != user_id:
             return jsonify({'error': 'Access denied'}), 403
-        
-        # In a real implementation, this would generate and return a file
-        # For now, return success message
-        return jsonify({
-            'message': 'Report exported successfully',
-            'download_url': f'/api/downloads/analytics-report-{user_id}.pdf'
-        })
-        
+
+        today = date.today()
+        try:
+            start = _parse_report_date(request.args.get('from'), date(today.year, 1, 1))
+            end = _parse_report_date(request.args.get('to'), today)
+        except ValueError:
+            return jsonify({'error': 'Invalid date. Use YYYY-MM-DD'}), 400
+        if end < start:
+            return jsonify({'error': 'to must not be before from'}), 400
+
+        fmt = (request.args.get('format') or 'pdf').lower()
+        if fmt not in MIMETYPES:
+            return jsonify({'error': f"Invalid format: {fmt}. Allowed: {', '.join(MIMETYPES)}"}), 400
+        if fmt not in available_formats():
+            return jsonify({'error': f"{fmt.upper()} export is not available on this server"}), 501
+
+        job = reports.start(user_id, start, end, fmt)
+        return _report_job_response(user_id, job)
+
+    except ReportQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except LookupError:
+        return jsonify({'error': 'User not found'}), 404
     except Exception as e:
-        print(f"Error in export_analytics_report: {e}")
+        print(f"✗ Error in export_analytics_report: {e}")
         return jsonify({'error': 'Failed to export report'}), 500
 
+
+@reports_analytics_bp.route('/api/export-analytics/<int:user_id>/jobs/<job_id>')
+@login_required
+def export_analytics_status(user_id, job_id):
+    """Status of an export job"""
+    if session.get('user', {}).get('user_id') != user_id:
+        return jsonify({'error': 'Access denied'}), 403
+    job = reports.get(user_id, job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found or expired'}), 404
+    return _report_job_response(user_id, job)
+
+
+@reports_analytics_bp.route('/api/export-analytics/<int:user_id>/jobs/<job_id>/download')
+@login_required
+def download_analytics_report(user_id, job_id):
+    """The rendered report; Range and If-Range requests resume interrupted downloads"""
+    if session.get('user', {}).get('user_id') != user_id:
+        return jsonify({'error': 'Access denied'}), 403
+    job = reports.get(user_id, job_id)
+    if job is None:
+        return jsonify({'error': 'Export not found or expired'}), 404
+    if job.status != 'ready':
+        return _report_job_response(user_id, job)
+    try:
+        response = send_file(job.path, mimetype=job.mimetype, as_attachment=True,
+                             download_name=job.download_name, conditional=True)
+        # The job id carries the data version, so the file behind this URL never changes
+        response.cache_control.private = True
+        response.cache_control.max_age = REPORT_TTL
+        return response
+    except FileNotFoundError:
+        return jsonify({'error': 'Export not found or expired'}), 404
+
 # Health check endpoint
 @reports_analytics_bp.route('/api/analytics/health')
 def health_check():
@@ -0,0 +1,25 @@
+# serve.py - Production entry point on gevent
+#
+# Every open /events/stream holds its request for as long as the page is open.
+# Under gevent those requests are greenlets instead of OS threads, so one
+# worker can keep thousands of idle streams. The pure-Python MySQL connector,
+# the connection pool locks and the event hub queues all cooperate once the
+# standard library is patched.
+#
+#   python serve.py                         # single process
+#   gunicorn -k gevent -w 4 app:app         # several workers (set DAYOFFLY_CACHE_URL
+#                                           # so events reach streams on every worker)
+from gevent import monkey
+monkey.patch_all()
+
+import os  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+from app import app  # noqa: E402
+
+HOST = os.environ.get('DAYOFFLY_HOST', '0.0.0.0')
+PORT = int(os.environ.get('DAYOFFLY_PORT', 5000))
+
+
+if __name__ == '__main__':
+    print(f"🚀 Starting DayOffly on gevent at http://{HOST}:{PORT}")
+    WSGIServer((HOST, PORT), app).serve_forever()
@@ -1,102 +1,216 @@
 from flask import Blueprint, jsonify, request
 import mysql.connector
-from datetime import datetime
+from database import get_db_connection
+from http_caching import conditional
+from leave_facts import refresh_user_facts
+from cache import invalidate_directory, invalidate_user_data
+from reference_data import registry
+from employeeHR import employee_search
+from pagination import encode_cursor, decode_cursor, parse_page_size
+from streaming import ExportBusy, export_format, stream_export
 
 settingsHR_bp = Blueprint('settingsHR', __name__)
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': '',
-    'database': 'dayoffly',
-    'port': 3306
+# Frontend role labels -> role names in the role table
+ROLE_MAPPING = {
+    'employee': 'Junior',
+    'manager': 'Manager',
+    'hr': 'HR',
+    'admin': 'Senior'
 }
 
-def get_db_connection():
-    """Create database connection"""
-    try:
-        conn = mysql.connector.connect(**DB_CONFIG)
-        return conn
-    except mysql.connector.Error as e:
-        print(f"Database connection failed: {e}")
-        return None
-    
+# fields= names -> columns; password is deliberately not selectable
+USER_FIELDS = {
+    'user_id': 'u.user_id',
+    'username': 'u.user_name',
+    'email': 'u.email',
+    'role': 'u.role_id',
+    'department': 'u.department_id',
+    'status': 'u.is_active',
+    'designation': 'u.designation',
+    'contact_number': 'u.contact_number',
+    'personal_email': 'u.personal_email',
+    'mobile_phone': 'u.mobile_phone',
+    'work_phone': 'u.work_phone',
+    'home_address': 'u.home_address',
+    'preferred_name': 'u.preferred_name',
+    'date_of_birth': 'u.date_of_birth',
+    'gender': 'u.gender',
+    'nationality': 'u.nationality',
+    'pronouns': 'u.pronouns',
+    'approver_name': 'ua.user_name'
+}
+
+# sort= keys, each backed by an index (users_master PRIMARY, idx_user_name, email)
+USER_SORT_KEYS = {
+    'user_id': 'u.user_id',
+    'username': 'u.user_name',
+    'email': 'u.email'
+}
+
+USERS_PAGE_SIZE = 50
+
+
+def _parse_fields(value):
+    """Requested fields (always including user_id); all of them by default"""
+    if not value:
+        return list(USER_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in USER_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(USER_FIELDS)}")
+    return ['user_id'] + [field for field in dict.fromkeys(fields) if field != 'user_id']
+
+
+def _user_filters(args):
+    """WHERE conditions and params from department, role, status and search"""
+    conditions = []
+    params = []
+
+    department = args.get('department')
+    if department and department != 'all':
+        department_id = int(department) if department.isdigit() else registry.department_id(department)
+        if department_id is None:
+            raise ValueError(f"Unknown department: {department}")
+        conditions.append("u.department_id = %s")
+        params.append(department_id)
+
+    role = args.get('role')
+    if role and role != 'all':
+        role_id = int(role) if role.isdigit() else registry.role_id(ROLE_MAPPING.get(role, role))
+        if role_id is None:
+            raise ValueError(f"Unknown role: {role}")
+        conditions.append("u.role_id = %s")
+        params.append(role_id)
+
+    status = (args.get('status') or 'all').lower()
+    if status == 'active':
+        conditions.append("u.is_active = 1")
+    elif status == 'inactive':
+        conditions.append("(u.is_active = 0 OR u.is_active IS NULL)")
+    elif status != 'all':
+        raise ValueError(f"Invalid status filter: {args.get('status')}")
+
+    search = args.get('search', '')
+    if search.strip():
+        search_condition, search_params, _, _ = employee_search(search)
+        conditions.append(search_condition)
+        params.extend(search_params)
+
+    return conditions, params
+
+
+def _format_user(row, fields):
+    user = {}
+    for field in fields:
+        value = row[field]
+        if field == 'role':
+            value = registry.role_name(value) or 'Employee'
+        elif field == 'department':
+            value = registry.department_name(value) or 'Not Assigned'
+        elif field == 'status':
+            value = "Active" if value else "Inactive"
+        user[field] = value
+    return user
+
+
 @settingsHR_bp.route('/api/users')
+@conditional
 def get_all_users():
-    """Get all users with their details"""
+    """
+    One page of users for the HR settings grid.
+    Query: limit (max 200), cursor, sort (user_id | username | email, '-' for descending),
+    search, department, role, status, fields (comma-separated; default all),
+    format (ndjson | csv: stream every matching user instead of a page)
+    """
+    try:
+        fmt = export_format(request.args)
+        fields = _parse_fields(request.args.get('fields'))
+        conditions, params = _user_filters(request.args)
+
+        sort = request.args.get('sort', 'user_id')
+        descending = sort.startswith('-')
+        sort_key = sort.lstrip('-')
+        if sort_key not in USER_SORT_KEYS:
+            raise ValueError(f"Invalid sort: {sort}. Allowed: {', '.join(USER_SORT_KEYS)}")
+        sort_column = USER_SORT_KEYS[sort_key]
+        direction = "DESC" if descending else "ASC"
+        # Department and role names come from the registry; only the approver needs a join
+        columns = [f"{USER_FIELDS[field]} as {field}" for field in fields]
+        join = "LEFT JOIN users_master ua ON u.approver_id = ua.user_id" if 'approver_name' in fields else ""
+
+        if fmt:
+            where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+            return stream_export(f"""
+                SELECT {', '.join(columns)}
+                FROM users_master u
+                {join}
+                {where_clause}
+                ORDER BY {sort_column} {direction}, u.user_id {direction}
+            """, params, fmt, 'users', lambda row: _format_user(row, fields))
+
+        # Keyset pagination on (sort column, user_id)
+        page_conditions = list(conditions)
+        page_params = list(params)
+        token = request.args.get('cursor')
+        if token:
+            after_value, after_id = decode_cursor(token, ((str, int, type(None)), int))
+            op = '<' if descending else '>'
+            if sort_key == 'user_id':
+                page_conditions.append(f"u.user_id {op} %s")
+                page_params.append(after_id)
+            else:
+                page_conditions.append(f"({sort_column} {op} %s OR ({sort_column} = %s AND u.user_id {op} %s))")
+                page_params.extend([after_value, after_value, after_id])
+        page_size = parse_page_size(request.args.get('limit'), USERS_PAGE_SIZE)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except ExportBusy as e:
+        return jsonify({'error': str(e)}), 429
+    except mysql.connector.Error as e:
+        print(f"✗ Error exporting users: {e}")
+        return jsonify({'error': 'Failed to export users'}), 500
+
     conn = get_db_connection()
     if not conn:
         return jsonify({'error': 'Database connection failed'}), 500
     
     try:
         cursor = conn.cursor(dictionary=True)
-        
-        # Query to get all users with department and role information
-        cursor.execute("""
-            SELECT 
-                u.user_id,
-                u.user_name,
-                u.email,
-                u.password,
-                u.designation,
-                u.contact_number,
-                u.is_active,
-                u.personal_email,
-                u.mobile_phone,
-                u.work_phone,
-                u.home_address,
-                u.preferred_name,
-                u.date_of_birth,
-                u.gender,
-                u.nationality,
-                u.pronouns,
-                d.department_name,
-                r.role_name,
-                ua.user_name as approver_name
+
+        if sort_key not in fields:
+            columns.append(f"{sort_column} as sort_value")
+        where_clause = "WHERE " + " AND ".join(page_conditions) if page_conditions else ""
+
+        # One extra row tells whether another page exists
+        cursor.execute(f"""
+            SELECT {', '.join(columns)}
             FROM users_master u
-            LEFT JOIN department d ON u.department_id = d.department_id
-            LEFT JOIN role r ON u.role_id = r.role_id
-            LEFT JOIN users_master ua ON u.approver_id = ua.user_id
-            ORDER BY u.user_id
-        """)
-        
-        users = cursor.fetchall()
-        
-        # Format the response to match the frontend table structure
-        formatted_users = []
-        for user in users:
-            # Determine status based on is_active
-            status = "Active" if user['is_active'] else "Inactive"
-            
-            # Format created date (using current date as placeholder since it's not in DB)
-            created_date = datetime.now().strftime('%Y-%m-%d')
-            
-            formatted_user = {
-                'user_id': user['user_id'],
-                'username': user['user_name'],
-                'email': user['email'],
-                'password': user['password'],  # This will be shown to HR
-                'role': user['role_name'] or 'Employee',
-                'department': user['department_name'] or 'Not Assigned',
-                'created_date': created_date,
-                'status': status,
-                'designation': user['designation'],
-                'contact_number': user['contact_number'],
-                'personal_email': user['personal_email'],
-                'mobile_phone': user['mobile_phone'],
-                'work_phone': user['work_phone'],
-                'home_address': user['home_address'],
-                'preferred_name': user['preferred_name'],
-                'date_of_birth': user['date_of_birth'],
-                'gender': user['gender'],
-                'nationality': user['nationality'],
-                'pronouns': user['pronouns'],
-                'approver_name': user['approver_name']
-            }
-            formatted_users.append(formatted_user)
-        
-        return jsonify(formatted_users)
+            {join}
+            {where_clause}
+            ORDER BY {sort_column} {direction}, u.user_id {direction}
+            LIMIT %s
+        """, page_params + [page_size + 1])
+        rows = cursor.fetchall()
+
+        next_cursor = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            last = rows[-1]
+            next_cursor = encode_cursor(last.get(sort_key, last.get('sort_value')), last['user_id'])
+
+        # The total only on the first page; later pages keep the client's count
+        total = None
+        if not token:
+            count_where = "WHERE " + " AND ".join(conditions) if conditions else ""
+            cursor.execute(f"SELECT COUNT(*) as total FROM users_master u {count_where}", params)
+            total = cursor.fetchone()['total']
+
+        return jsonify({
+            'users': [_format_user(row, fields) for row in rows],
+            'next_cursor': next_cursor,
+            'total': total
+        })
         
     except Exception as e:
         print(f"Error fetching users: {e}")
@@ -130,26 +244,16 @@ def add_user():
         cursor = conn.cursor(dictionary=True)
         
         # Get department_id
-        cursor.execute("SELECT department_id FROM department WHERE department_name = %s", (department,))
-        department_result = cursor.fetchone()
-        if not department_result:
+        department_id = registry.department_id(department)
+        if department_id is None:
             return jsonify({'error': 'Invalid department'}), 400
-        department_id = department_result['department_id']
         
         # Get role_id (mapping frontend roles to database roles)
-        role_mapping = {
-            'employee': 'Junior',
-            'manager': 'Manager',
-            'hr': 'HR',
-            'admin': 'Senior'
-        }
-        db_role = role_mapping.get(role, 'Junior')
-        
-        cursor.execute("SELECT role_id FROM role WHERE role_name = %s", (db_role,))
-        role_result = cursor.fetchone()
-        if not role_result:
+        db_role = ROLE_MAPPING.get(role, 'Junior')
+        
+        role_id = registry.role_id(db_role)
+        if role_id is None:
             return jsonify({'error': 'Invalid role'}), 400
-        role_id = role_result['role_id']
         
         # Generate new user_id (max + 1)
         cursor.execute("SELECT MAX(user_id) as max_id FROM users_master")
@@ -178,6 +282,8 @@ def add_user():
             """, (new_user_id, leave_type, total_leaves, 0, total_leaves))
         
         conn.commit()
+        invalidate_user_data(new_user_id)
+        invalidate_directory()
         
         return jsonify({
             'message': 'User added successfully',
@@ -217,6 +323,7 @@ def update_user(user_id):
         # Update user fields
         update_fields = []
         update_values = []
+        user_department_id = user['department_id']
         
         if 'username' in data:
             update_fields.append("user_name = %s")
@@ -231,25 +338,18 @@ def update_user(user_id):
             update_values.append(data['password'])
         
         if 'department' in data:
-            cursor.execute("SELECT department_id FROM department WHERE department_name = %s", (data['department'],))
-            dept_result = cursor.fetchone()
-            if dept_result:
+            department_id = registry.department_id(data['department'])
+            if department_id is not None:
                 update_fields.append("department_id = %s")
-                update_values.append(dept_result['department_id'])
+                update_values.append(department_id)
+                user_department_id = department_id
         
         if 'role' in data:
-            role_mapping = {
-                'employee': 'Junior',
-                'manager': 'Manager',
-                'hr': 'HR',
-                'admin': 'Senior'
-            }
-            db_role = role_mapping.get(data['role'], 'Junior')
-            cursor.execute("SELECT role_id FROM role WHERE role_name = %s", (db_role,))
-            role_result = cursor.fetchone()
-            if role_result:
+            db_role = ROLE_MAPPING.get(data['role'], 'Junior')
+            role_id = registry.role_id(db_role)
+            if role_id is not None:
                 update_fields.append("role_id = %s")
-                update_values.append(role_result['role_id'])
+                update_values.append(role_id)
         
         if 'designation' in data:
             update_fields.append("designation = %s")
@@ -263,7 +363,14 @@ def update_user(user_id):
             update_values.append(user_id)
             update_query = f"UPDATE users_master SET {', '.join(update_fields)} WHERE user_id = %s"
             cursor.execute(update_query, update_values)
+            
+            # Leave facts carry the user's department - move them along
+            if user['department_id'] != user_department_id:
+                refresh_user_facts(conn, user_id)
+            
             conn.commit()
+            invalidate_user_data(user_id)
+            invalidate_directory()
         
         return jsonify({'message': 'User updated successfully'})
         
@@ -294,6 +401,8 @@ def delete_user(user_id):
         # Soft delete by setting is_active to 0
         cursor.execute("UPDATE users_master SET is_active = 0 WHERE user_id = %s", (user_id,))
         conn.commit()
+        invalidate_user_data(user_id)
+        invalidate_directory()
         
         return jsonify({'message': 'User deactivated successfully'})
         
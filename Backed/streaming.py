@@ -0,0 +1,190 @@
+# streaming.py - Streamed NDJSON / CSV exports of the HR listings
+#
+# ?format=ndjson or ?format=csv on a listing returns every matching row
+# instead of one page. The rows come from an unbuffered cursor - the server
+# sends the result set as the client reads it and mysql.connector only holds
+# what fetchmany asked for - and a generator writes them out in chunks of
+# about CHUNK_SIZE bytes, so a worker holds one batch however many rows match.
+#
+# Backpressure: the WSGI server asks for the next chunk only once it has
+# written the previous one, so a slow client slows the reads down; the
+# export session raises net_write_timeout so MySQL waits for it meanwhile.
+#
+# CSV cells that a spreadsheet would read as a formula (=, +, -, @, tab, CR
+# first - leave reasons and names are user input) are prefixed with a quote.
+#
+# Cancellation: when the client disconnects the server closes the response;
+# a statement still streaming is aborted with KILL QUERY and its connection,
+# with a half-read result, is discarded rather than returned to the pool.
+#
+# The generator runs after the view has returned and the request connection
+# has been released, so every export checks out a dedicated connection, and
+# at most MAX_CONCURRENT_EXPORTS run at once to leave the pool to the pages.
+import csv
+import io
+import json
+import os
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from flask import Response
+from database import PooledConnection, kill_query, pool
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8'
+}
+
+FETCH_BATCH = 500               # rows per fetchmany
+CHUNK_SIZE = 64 * 1024          # bytes per chunk handed to the server
+EXPORT_WRITE_TIMEOUT = 600      # seconds MySQL waits on a stalled client
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+MAX_CONCURRENT_EXPORTS = int(os.environ.get('DAYOFFLY_MAX_EXPORTS', 2))
+
+_export_slots = threading.BoundedSemaphore(MAX_CONCURRENT_EXPORTS)
+
+
+class ExportBusy(Exception):
+    """Every export slot is taken"""
+
+
+def export_format(args):
+    """The requested export format, None for a normal page; ValueError if unknown"""
+    fmt = (args.get('format') or '').lower()
+    if not fmt or fmt == 'json':
+        return None
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Invalid format: {args.get('format')}. Allowed: json, {', '.join(EXPORT_FORMATS)}")
+    return fmt
+
+
+def _json_value(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, timedelta):
+        return str(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8', 'replace')
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _csv_value(value):
+    """A cell that Excel and friends show as text, never evaluate"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class RowExport:
+    """
+    One streamed export: an unbuffered query on a dedicated connection,
+    iterated as encoded chunks. close() is safe to call more than once.
+    """
+
+    def __init__(self, sql, params, fmt, transform=None):
+        self.fmt = fmt
+        self.transform = transform
+        self.rows = 0
+        self._finished = False
+        self._conn = None
+        self._cursor = None
+        self._connection_id = None
+        self._holds_slot = False
+        self._streaming = False
+
+        if not _export_slots.acquire(blocking=False):
+            raise ExportBusy(f"{MAX_CONCURRENT_EXPORTS} exports are already running")
+        self._holds_slot = True
+        try:
+            self._conn = PooledConnection(pool, pool.acquire())
+            self._connection_id = self._conn.connection_id
+            cursor = self._conn.cursor()
+            cursor.execute("SET SESSION net_write_timeout = %s", (EXPORT_WRITE_TIMEOUT,))
+            cursor.close()
+            # Executed here so a bad query fails the request before any header is sent
+            self._cursor = self._conn.cursor(buffered=False)
+            self._cursor.execute(sql, params)
+            self._streaming = True
+            self.columns = list(self._cursor.column_names)
+        except Exception:
+            self.close()
+            raise
+
+    def _records(self):
+        """Rows as {column: value}, transformed, one batch at a time"""
+        while True:
+            batch = self._cursor.fetchmany(FETCH_BATCH)
+            if not batch:
+                return
+            for row in batch:
+                record = dict(zip(self.columns, row))
+                yield self.transform(record) if self.transform else record
+
+    def chunks(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer) if self.fmt == 'csv' else None
+        try:
+            if writer:
+                writer.writerow(self.columns)
+            for record in self._records():
+                if writer:
+                    writer.writerow([_csv_value(record[column]) for column in self.columns])
+                else:
+                    buffer.write(json.dumps(record, default=_json_value, ensure_ascii=False))
+                    buffer.write('\n')
+                self.rows += 1
+                if buffer.tell() >= CHUNK_SIZE:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+            self._finished = True
+            if buffer.tell():
+                yield buffer.getvalue().encode('utf-8')
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the connection; abort the statement if the client left mid-stream"""
+        if self._holds_slot:
+            self._holds_slot = False
+            _export_slots.release()
+        conn, self._conn = self._conn, None
+        if conn is None:
+            return
+        try:
+            if self._finished:
+                self._cursor.close()
+                cursor = conn.cursor()
+                cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+                cursor.close()
+                conn.release()
+                print(f"✓ Export finished: {self.rows} rows")
+            else:
+                if self._streaming:
+                    try:
+                        kill_query(self._connection_id)
+                    except Exception as e:
+                        print(f"⚠ Could not kill export query on connection {self._connection_id}: {e}")
+                    print(f"⚠ Export cancelled after {self.rows} rows")
+                conn.release(discard=True)
+        except Exception as e:
+            print(f"⚠ Export connection discarded: {e}")
+            conn.release(discard=True)
+
+
+def stream_export(sql, params, fmt, filename, transform=None):
+    """
+    Response streaming every row of sql as NDJSON or CSV.
+    transform maps each {column: value} row to one with the same keys.
+    Raises ExportBusy when too many exports are running.
+    """
+    export = RowExport(sql, params, fmt, transform)
+    response = Response(export.chunks(), content_type=EXPORT_FORMATS[fmt])
+    # Closed by the server even if the body is never iterated
+    response.call_on_close(export.close)
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    # No proxy buffering: chunks go out as they are produced
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -19,27 +19,69 @@ document.addEventListener('DOMContentLoaded', function() {
     let currentYear = currentDate.getFullYear();
     let selectedDate = new Date();
     
-    // Sample leave data - approved and pending leaves
-    const leaveData = {
-        // Current month - Approved leaves
-        '2025-6-10': { type: 'vacation', title: 'Vacation', status: 'approved' },
-        '2025-6-11': { type: 'vacation', title: 'Vacation', status: 'approved' },
-        '2025-6-12': { type: 'vacation', title: 'Vacation', status: 'approved' },
-        '2025-6-20': { type: 'sick', title: 'Sick Leave', status: 'approved' },
-        
-        // Current month - Pending leaves
-        '2025-6-25': { type: 'personal', title: 'Personal Day', status: 'pending' },
-        '2025-6-26': { type: 'personal', title: 'Personal Day', status: 'pending' },
-        
-        // Next month leaves
-        '2025-7-5': { type: 'vacation', title: 'Summer Break', status: 'approved' },
-        '2025-7-6': { type: 'vacation', title: 'Summer Break', status: 'approved' },
-        '2025-7-7': { type: 'vacation', title: 'Summer Break', status: 'approved' },
-        '2025-7-15': { type: 'sick', title: 'Medical', status: 'pending' },
-        
-        // Previous month leaves
-        '2025-5-12': { type: 'personal', title: 'Family Event', status: 'approved' },
-    };
+    // Team availability from /api/calendar, keyed by 'YYYY-M-D'
+    let calendarDays = {};
+    let calendarEmployees = {};
+    let upcomingDays = [];
+    
+    function toDateKey(isoDate) {
+        const [year, month, day] = isoDate.split('-').map(Number);
+        return `${year}-${month}-${day}`;
+    }
+    
+    function toIsoDate(date) {
+        const month = String(date.getMonth() + 1).padStart(2, '0');
+        const day = String(date.getDate()).padStart(2, '0');
+        return `${date.getFullYear()}-${month}-${day}`;
+    }
+    
+    async function fetchCalendar(start, end) {
+        const params = new URLSearchParams({ start: toIsoDate(start), end: toIsoDate(end) });
+        const response = await fetch(`/api/calendar?${params}`, { credentials: 'include' });
+        if (!response.ok) {
+            throw new Error(`HTTP ${response.status}`);
+        }
+        const data = await response.json();
+        Object.assign(calendarEmployees, data.employees);
+        return data.days;
+    }
+    
+    // Load the displayed month, then draw it
+    async function loadMonth(month, year) {
+        try {
+            const days = await fetchCalendar(new Date(year, month, 1), new Date(year, month + 1, 0));
+            // The user may have moved on to another month meanwhile
+            if (month !== currentMonth || year !== currentYear) {
+                return;
+            }
+            calendarDays = {};
+            days.forEach(day => {
+                calendarDays[toDateKey(day.date)] = day;
+            });
+        } catch (error) {
+            console.error('Error loading team calendar:', error);
+            calendarDays = {};
+        }
+        generateMonthCalendar(month, year);
+    }
+    
+    // Next 30 days for the sidebar
+    async function loadUpcoming() {
+        const today = new Date();
+        const until = new Date(today);
+        until.setDate(today.getDate() + 30);
+        try {
+            upcomingDays = await fetchCalendar(today, until);
+        } catch (error) {
+            console.error('Error loading upcoming leaves:', error);
+            upcomingDays = [];
+        }
+        updateUpcomingLeaves();
+    }
+    
+    function absentNames(day) {
+        return day.absent.map(userId => calendarEmployees[userId] || `#${userId}`);
+    }
     
     // Function to generate calendar days for month view
     function generateMonthCalendar(month, year) {
@@ -92,18 +134,27 @@ document.addEventListener('DOMContentLoaded', function() {
             dayNumber.textContent = i;
             dayElement.appendChild(dayNumber);
             
-            // Add leave markers if applicable
-            if (leaveData[dateKey]) {
+            // Public holiday of the team's region
+            const dayData = calendarDays[dateKey];
+            if (dayData && dayData.holiday) {
+                const holidayMarker = document.createElement('div');
+                holidayMarker.className = 'leave-marker public-holiday';
+                holidayMarker.textContent = dayData.holiday;
+                dayElement.appendChild(holidayMarker);
+            }
+            
+            // Add absence marker if anyone in the team is away
+            if (dayData && dayData.absentCount > 0) {
                 const leaveMarker = document.createElement('div');
-                const leave = leaveData[dateKey];
-                leaveMarker.className = `leave-marker ${leave.type}-leave ${leave.status}-status`;
-                leaveMarker.textContent = leave.title;
+                leaveMarker.className = 'leave-marker vacation-leave approved-status';
+                leaveMarker.textContent = `${dayData.absentCount} away`;
+                leaveMarker.title = absentNames(dayData).join(', ');
                 dayElement.appendChild(leaveMarker);
                 
                 // Add status indicator
                 const statusIndicator = document.createElement('div');
-                statusIndicator.className = `status-indicator ${leave.status}`;
-                statusIndicator.title = leave.status === 'approved' ? 'Approved' : 'Pending';
+                statusIndicator.className = 'status-indicator approved';
+                statusIndicator.title = `${dayData.available} of ${dayData.headcount} available`;
                 dayElement.appendChild(statusIndicator);
             }
             
@@ -126,9 +177,6 @@ document.addEventListener('DOMContentLoaded', function() {
             
             monthCalendar.appendChild(dayElement);
         }
-        
-        // Update upcoming leaves sidebar
-        updateUpcomingLeaves();
     }
     
     // Function to update upcoming leaves in sidebar
@@ -138,27 +186,13 @@ document.addEventListener('DOMContentLoaded', function() {
         const existingItems = upcomingLeavesContainer.querySelectorAll('.upcoming-item');
         existingItems.forEach(item => item.remove());
         
-        // Get upcoming leaves (next 30 days)
-        const today = new Date();
-        const nextMonth = new Date(today);
-        nextMonth.setDate(today.getDate() + 30);
-        
-        const upcomingLeaves = [];
-        
-        for (const dateKey in leaveData) {
-            const [year, month, day] = dateKey.split('-').map(Number);
-            const leaveDate = new Date(year, month - 1, day);
-            
-            if (leaveDate >= today && leaveDate <= nextMonth) {
-                upcomingLeaves.push({
-                    date: leaveDate,
-                    data: leaveData[dateKey]
-                });
-            }
-        }
-        
-        // Sort by date
-        upcomingLeaves.sort((a, b) => a.date - b.date);
+        // Days in the next 30 with someone away
+        const upcomingLeaves = upcomingDays
+            .filter(day => day.absentCount > 0)
+            .map(day => {
+                const [year, month, date] = day.date.split('-').map(Number);
+                return { date: new Date(year, month - 1, date), data: day };
+            });
         
         // Display upcoming leaves (max 5)
         if (upcomingLeaves.length === 0) {
@@ -181,10 +215,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 const formattedDate = leave.date.toLocaleDateString('en-US', options);
                 
                 leaveItem.innerHTML = `
-                    <div class="color-indicator ${leave.data.type}"></div>
+                    <div class="color-indicator vacation"></div>
                     <div>
                         <div class="upcoming-date">${formattedDate}</div>
-                        <div>${leave.data.title} (${leave.data.status})</div>
+                        <div>${absentNames(leave.data).join(', ')} (${leave.data.available} of ${leave.data.headcount} available)</div>
                     </div>
                 `;
                 upcomingLeavesContainer.appendChild(leaveItem);
@@ -200,34 +234,33 @@ document.addEventListener('DOMContentLoaded', function() {
         const formattedDate = date.toLocaleDateString('en-US', options);
         
         modalDateTitle.textContent = formattedDate;
+        if (calendarDays[dateKey] && calendarDays[dateKey].holiday) {
+            modalDateTitle.textContent += ` - ${calendarDays[dateKey].holiday}`;
+        }
         
         let modalContent = '';
         
-        if (leaveData[dateKey]) {
-            const leave = leaveData[dateKey];
-            const statusClass = leave.status === 'approved' ? 'status-approved' : 'status-pending';
+        const dayData = calendarDays[dateKey];
+        if (dayData && dayData.absentCount > 0) {
+            const names = absentNames(dayData).map(name => `<li>${name}</li>`).join('');
             
             modalContent = `
                 <div class="leave-details">
-                    <p><strong>Leave Type:</strong> <span class="leave-type ${leave.type}">${leave.title}</span></p>
-                    <p><strong>Status:</strong> <span class="status-badge ${statusClass}">${leave.status}</span></p>
                     <p><strong>Date:</strong> ${formattedDate}</p>
+                    <p><strong>Available:</strong> ${dayData.available} of ${dayData.headcount}</p>
+                    <p><strong>On approved leave:</strong></p>
+                    <ul>${names}</ul>
                 </div>
             `;
-            
-            // Hide request leave button for dates with existing leaves
-            requestLeaveBtn.style.display = 'none';
         } else {
             modalContent = `
                 <div class="no-leave-details">
-                    <p>No scheduled leaves for this date.</p>
+                    <p>Everyone in your team is available on this date.</p>
                     <p>You can request leave for this date.</p>
                 </div>
             `;
-            
-            // Show request leave button for empty dates
-            requestLeaveBtn.style.display = 'block';
         }
+        requestLeaveBtn.style.display = 'block';
         
         modalBody.innerHTML = modalContent;
         dateModal.style.display = 'flex';
@@ -235,6 +268,8 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Initialize calendar
     generateMonthCalendar(currentMonth, currentYear);
+    loadMonth(currentMonth, currentYear);
+    loadUpcoming();
     
     // Navigation buttons
     prevMonthBtn.addEventListener('click', function() {
@@ -243,7 +278,7 @@ document.addEventListener('DOMContentLoaded', function() {
             currentMonth = 11;
             currentYear--;
         }
-        generateMonthCalendar(currentMonth, currentYear);
+        loadMonth(currentMonth, currentYear);
     });
     
     nextMonthBtn.addEventListener('click', function() {
@@ -252,7 +287,7 @@ document.addEventListener('DOMContentLoaded', function() {
             currentMonth = 0;
             currentYear++;
         }
-        generateMonthCalendar(currentMonth, currentYear);
+        loadMonth(currentMonth, currentYear);
     });
     
     // Sync Calendar button
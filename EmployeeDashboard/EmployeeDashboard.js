@@ -133,20 +133,8 @@
         const availableLeaves = totalAllowed - totalLeaves;
         createPieChart($("#attendancePieChart"), ["Available Leaves", "Leaves Taken"], [availableLeaves, totalLeaves], ["#10b981", "#ef4444"]);
 
-        // ---- Holidays Data ----
-        const holidays = [
-          { name: "Makar Sankranti", date: "2025-01-14" },
-          { name: "Republic Day", date: "2025-01-26" },
-          { name: "Holi", date: "2025-03-14" },
-          { name: "Good Friday", date: "2025-04-18" },
-          { name: "Eid al-Fitr", date: "2025-03-31" },
-          { name: "Independence Day", date: "2025-08-15" },
-          { name: "Ganesh Chaturthi", date: "2025-09-01" },
-          { name: "Dussehra", date: "2025-10-02" },
-          { name: "Diwali", date: "2025-10-20" },
-          { name: "Christmas", date: "2025-12-25" },
-          { name: "New Year's Day", date: "2026-01-01" }
-        ];
+        // ---- Holidays Data (holidays table of the employee's region) ----
+        let holidays = [];
 
         const holidayList = $("#holidayList");
         const filterSelect = $("#holidayFilter");
@@ -211,6 +199,13 @@
 
         // Initial holidays render
         renderHolidays("upcoming");
+        fetch("/api/holidays", { credentials: "include" })
+          .then(response => response.ok ? response.json() : Promise.reject(new Error(`HTTP ${response.status}`)))
+          .then(data => {
+            holidays = data.holidays || [];
+            renderHolidays(filterSelect.value || "upcoming");
+          })
+          .catch(error => console.error("Error loading holidays:", error));
 
         // Filter change
         filterSelect.addEventListener("change", (e) => {
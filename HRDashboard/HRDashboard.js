@@ -1,6 +1,7 @@
 // HRDashboard.js - Professional Overview Dashboard (Read-Only)
 let requests = [];
 let dashboardStats = {};
+let changeToken = null;
 
 // Initialize the dashboard
 document.addEventListener('DOMContentLoaded', () => {
@@ -11,8 +12,30 @@ document.addEventListener('DOMContentLoaded', () => {
 async function initializeDashboard() {
     await fetchHRData();
     
-    // Refresh data every 30 seconds for live updates
-    setInterval(fetchHRData, 30000);
+    // Changes are pushed over /events/stream; the 30 second check is the fallback
+    subscribeToLeaveEvents();
+    setInterval(pollForChanges, 30000);
+}
+
+// Server-sent leave changes: reload the dashboard shortly after a decision
+function subscribeToLeaveEvents() {
+    if (!window.EventSource) {
+        return;
+    }
+    
+    let reloadTimer = null;
+    const scheduleReload = () => {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(fetchHRData, 1000);
+    };
+    
+    const source = new EventSource('http://localhost:5000/events/stream', { withCredentials: true });
+    source.addEventListener('leave-change', scheduleReload);
+    source.addEventListener('reset', scheduleReload);
+    source.onerror = () => {
+        // EventSource reconnects by itself (sending Last-Event-ID)
+        console.warn('⚠️ Leave event stream interrupted, reconnecting...');
+    };
 }
 
 // Data fetching functions
@@ -20,7 +43,7 @@ async function fetchHRData() {
     try {
         showLoadingState();
         
-        const response = await fetch('http://localhost:5000/hr/dashboard-data', {
+        const response = await fetch('http://localhost:5000/hr/dashboard-data?limit=5', {
             method: 'GET',
             credentials: 'include',
             headers: {
@@ -38,6 +61,7 @@ async function fetchHRData() {
             console.log('✅ HR data fetched successfully');
             requests = data.leave_requests || [];
             dashboardStats = data.dashboard_stats || {};
+            changeToken = data.change_token || null;
             updateDashboard(data);
         } else {
             throw new Error(data.message || 'Failed to load data');
@@ -49,6 +73,42 @@ async function fetchHRData() {
     }
 }
 
+// The charts need the full stats, so any change reloads the dashboard
+async function pollForChanges() {
+    if (!changeToken) {
+        return fetchHRData();
+    }
+    
+    try {
+        const params = new URLSearchParams({ since: changeToken });
+        const response = await fetch(`http://localhost:5000/hr/leave-changes?${params}`, {
+            method: 'GET',
+            credentials: 'include',
+            headers: {
+                'Content-Type': 'application/json',
+            }
+        });
+        
+        if (!response.ok) {
+            throw new Error(`HTTP error! status: ${response.status}`);
+        }
+        
+        const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.message || 'Failed to check for changes');
+        }
+        
+        if (data.reset || data.changes.length || data.removed.length) {
+            await fetchHRData();
+        } else {
+            changeToken = data.next_token;
+        }
+        
+    } catch (error) {
+        console.error('❌ Error checking for changes:', error);
+    }
+}
+
 function updateDashboard(data) {
     populateRecentRequests();
     updateSummary(data.dashboard_stats?.leave_requests || {});
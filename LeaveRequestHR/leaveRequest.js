@@ -2,6 +2,10 @@
 
 let requests = [];
 let filteredRequests = [];
+let nextCursor = null;
+let statusCounts = null;
+let changeToken = null;
+const fetchPageSize = 100;
 let currentFilter = 'all';
 let currentPage = 1;
 const itemsPerPage = 10;
@@ -21,8 +25,32 @@ async function initializePage() {
   await fetchLeaveRequests();
   setupEventListeners();
 
-  // Refresh data every 30 seconds for live updates
-  setInterval(fetchLeaveRequests, 30000);
+  // Changes are pushed over /events/stream; the 30 second poll is the fallback
+  subscribeToLeaveEvents();
+  setInterval(pollLeaveChanges, 30000);
+}
+
+// Server-sent leave changes: fetch the delta right away instead of at the next poll
+function subscribeToLeaveEvents() {
+  if (!window.EventSource) {
+    return;
+  }
+
+  let pollTimer = null;
+  const source = new EventSource(`${API_BASE_URL}/events/stream`, { withCredentials: true });
+
+  // A batch of decisions arrives as several events - fetch once for all of them
+  source.addEventListener('leave-change', () => {
+    clearTimeout(pollTimer);
+    pollTimer = setTimeout(pollLeaveChanges, 300);
+  });
+  source.addEventListener('reset', () => {
+    fetchLeaveRequests();
+  });
+  source.onerror = () => {
+    // EventSource reconnects by itself (sending Last-Event-ID)
+    console.warn('⚠️ Leave event stream interrupted, reconnecting...');
+  };
 }
 
 function setupEventListeners() {
@@ -74,11 +102,19 @@ function setupEventListeners() {
 }
 
 // Data fetching functions
-async function fetchLeaveRequests() {
+// The server pages by cursor; `append` loads the page after the rows already held
+async function fetchLeaveRequests(append = false) {
   try {
-    showLoadingState();
+    if (!append) {
+      showLoadingState();
+    }
 
-    const response = await fetch(`${API_BASE_URL}/hr/leave-requests`, {
+    const params = new URLSearchParams({ limit: fetchPageSize });
+    if (append && nextCursor) {
+      params.set('cursor', nextCursor);
+    }
+
+    const response = await fetch(`${API_BASE_URL}/hr/leave-requests?${params}`, {
       method: 'GET',
       credentials: 'include',
       headers: {
@@ -94,8 +130,20 @@ async function fetchLeaveRequests() {
 
     if (data.success) {
       console.log('✅ Leave requests fetched successfully');
-      requests = data.leave_requests || [];
-      applyFilter(currentFilter);
+      const page = data.leave_requests || [];
+      requests = append ? requests.concat(page) : page;
+      nextCursor = data.next_cursor || null;
+      if (!append) {
+        changeToken = data.change_token || null;
+      }
+      if (data.status_counts) {
+        statusCounts = data.status_counts;
+      }
+      if (append) {
+        filterRequests();
+      } else {
+        applyFilter(currentFilter);
+      }
     } else {
       throw new Error(data.message || 'Failed to load leave requests');
     }
@@ -106,6 +154,74 @@ async function fetchLeaveRequests() {
   }
 }
 
+// Apply only the leave requests changed since the last listing/poll
+async function pollLeaveChanges() {
+  if (!changeToken) {
+    return fetchLeaveRequests();
+  }
+
+  try {
+    const params = new URLSearchParams({ since: changeToken });
+    const response = await fetch(`${API_BASE_URL}/hr/leave-changes?${params}`, {
+      method: 'GET',
+      credentials: 'include',
+      headers: {
+        'Content-Type': 'application/json',
+      }
+    });
+
+    if (!response.ok) {
+      throw new Error(`HTTP error! status: ${response.status}`);
+    }
+
+    const data = await response.json();
+    if (!data.success) {
+      throw new Error(data.message || 'Failed to load leave changes');
+    }
+
+    // Too far behind (or the change log was pruned) - start over
+    if (data.reset) {
+      return fetchLeaveRequests();
+    }
+
+    changeToken = data.next_token;
+    if (data.changes.length || data.removed.length) {
+      mergeLeaveChanges(data);
+      filterRequests();
+    }
+
+  } catch (error) {
+    console.error('❌ Error polling leave changes:', error);
+  }
+}
+
+function mergeLeaveChanges(data) {
+  const removed = new Set(data.removed);
+  const changed = new Map(data.changes.map(req => [req.leave_id, req]));
+
+  requests = requests
+    .filter(req => !removed.has(req.leave_id))
+    .map(req => changed.get(req.leave_id) || req);
+
+  // Rows not loaded yet belong in the list if they sort within the loaded pages (newest first)
+  const known = new Set(requests.map(req => req.leave_id));
+  const oldestLoaded = requests.length ? requests[requests.length - 1].applied_on : '';
+  const added = data.changes.filter(req =>
+    !known.has(req.leave_id) && (!nextCursor || req.applied_on >= oldestLoaded)
+  );
+  if (added.length) {
+    requests = requests.concat(added).sort((a, b) =>
+      b.applied_on.localeCompare(a.applied_on) || b.leave_id - a.leave_id
+    );
+  }
+
+  if (statusCounts) {
+    Object.entries(data.count_deltas || {}).forEach(([key, delta]) => {
+      statusCounts[key] = (statusCounts[key] || 0) + delta;
+    });
+  }
+}
+
 function showLoadingState() {
   const tbody = document.getElementById('request-table');
   tbody.innerHTML = `
@@ -121,6 +237,9 @@ function showLoadingState() {
 function handleDataError(error) {
   requests = [];
   filteredRequests = [];
+  nextCursor = null;
+  statusCounts = null;
+  changeToken = null;
   populateTable();
   updateSummary();
   updatePaginationInfo();
@@ -293,7 +412,7 @@ function updatePaginationInfo() {
 
   // Update pagination buttons
   document.getElementById('prev-page').disabled = currentPage === 1;
-  document.getElementById('next-page').disabled = currentPage === totalPages || totalPages === 0;
+  document.getElementById('next-page').disabled = (currentPage === totalPages || totalPages === 0) && !nextCursor;
 
   // Generate page numbers
   generatePageNumbers(totalPages);
@@ -367,8 +486,17 @@ function goToPreviousPage() {
   }
 }
 
-function goToNextPage() {
-  const totalPages = Math.ceil(filteredRequests.length / itemsPerPage);
+async function goToNextPage() {
+  let totalPages = Math.ceil(filteredRequests.length / itemsPerPage);
+
+  // Pull the next server page once the loaded rows run out
+  if (currentPage >= totalPages && nextCursor) {
+    const page = currentPage;
+    await fetchLeaveRequests(true);
+    currentPage = page;
+    totalPages = Math.ceil(filteredRequests.length / itemsPerPage);
+  }
+
   if (currentPage < totalPages) {
     currentPage++;
     populateTable();
@@ -378,7 +506,8 @@ function goToNextPage() {
 
 // Summary update function
 function updateSummary() {
-  const stats = {
+  // Prefer the server-side counts; loaded rows are only the pages fetched so far
+  const stats = statusCounts || {
     total: requests.length,
     pending: requests.filter(req => req.status === 'Pending').length,
     approved: requests.filter(req => req.status === 'Approved').length,
@@ -577,8 +706,8 @@ async function executePendingAction() {
         'success'
       );
 
-      // Refresh data
-      await fetchLeaveRequests();
+      // Refresh the changed row and counts
+      await pollLeaveChanges();
 
       // Close modals
       closeModal();
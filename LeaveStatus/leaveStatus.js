@@ -500,5 +500,26 @@
       });
     }
 
+    // The page is rendered with the employee's leaves, so a pushed
+    // status change reloads it (the server drops the cached dashboard first)
+    function subscribeToLeaveEvents() {
+      if (!window.EventSource) {
+        return;
+      }
+
+      let reloadTimer = null;
+      const source = new EventSource('/events/stream');
+      const scheduleReload = () => {
+        clearTimeout(reloadTimer);
+        reloadTimer = setTimeout(() => window.location.reload(), 1000);
+      };
+      source.addEventListener('leave-change', scheduleReload);
+      source.addEventListener('reset', scheduleReload);
+      window.addEventListener('beforeunload', () => source.close());
+    }
+
     // Initialize when DOM is loaded
-    document.addEventListener('DOMContentLoaded', init);
\ No newline at end of file
+    document.addEventListener('DOMContentLoaded', () => {
+      init();
+      subscribeToLeaveEvents();
+    });
\ No newline at end of file
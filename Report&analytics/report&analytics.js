@@ -458,8 +458,13 @@ async function applyDateFilter() {
     }
 }
 
-// Export report
+// Export report: start a render job on the server, poll it, then download the file
+const EXPORT_POLL_MS = 1000;
+const EXPORT_TIMEOUT_MS = 120000;
+
 async function exportReport() {
+    const button = document.getElementById('export-report');
+    const buttonLabel = button.innerHTML;
     try {
         if (!currentUserId) {
             alert('Please wait while we load your data');
@@ -468,25 +473,49 @@ async function exportReport() {
         
         const fromDate = document.getElementById('date-from').value;
         const toDate = document.getElementById('date-to').value;
+        const format = document.getElementById('export-format').value;
+        const params = new URLSearchParams({ format });
+        if (fromDate) params.set('from', fromDate);
+        if (toDate) params.set('to', toDate);
         
-        showLoading();
+        button.disabled = true;
+        button.innerHTML = '<i class="fas fa-spinner fa-spin mr-2"></i>Preparing report...';
         
-        const response = await fetch(`/api/export-analytics/${currentUserId}?from=${fromDate}&to=${toDate}`, {
+        let response = await fetch(`/api/export-analytics/${currentUserId}?${params}`, {
+            method: 'POST',
             credentials: 'include'
         });
+        let job = await response.json();
+        if (!response.ok) {
+            throw new Error(job.error || 'Export failed');
+        }
         
-        if (response.ok) {
-            const result = await response.json();
-            alert(`Your personal leave report for ${fromDate} to ${toDate} exported successfully!\n\nDownload URL: ${result.download_url}`);
-        } else {
-            throw new Error('Export failed');
+        // 202 while rendering; the same report exported before is ready at once
+        const started = Date.now();
+        while (job.status === 'pending') {
+            if (Date.now() - started > EXPORT_TIMEOUT_MS) {
+                throw new Error('The report is taking too long. Please try again later.');
+            }
+            await new Promise(resolve => setTimeout(resolve, EXPORT_POLL_MS));
+            response = await fetch(job.status_url, { credentials: 'include' });
+            job = await response.json();
+            if (!response.ok) {
+                throw new Error(job.error || 'Export failed');
+            }
+        }
+        if (job.status !== 'ready') {
+            throw new Error(job.error || 'Export failed');
         }
         
+        // A plain navigation lets the browser download (and resume) the file
+        window.location.href = job.download_url;
+        
     } catch (error) {
         console.error('Error exporting report:', error);
-        alert('Export feature is currently unavailable. Please try again later.');
+        alert(`Export failed: ${error.message}`);
     } finally {
-        hideLoading();
+        button.disabled = false;
+        button.innerHTML = buttonLabel;
     }
 }
 
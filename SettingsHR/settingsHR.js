@@ -31,19 +31,66 @@ confirmModal.innerHTML = `
 `;
 document.body.appendChild(confirmModal);
 
+// Columns the grid renders - the only fields requested from /api/users
+const USER_GRID_FIELDS = 'user_id,username,email,role,department,status';
+const USERS_PAGE_SIZE = 50;
+
+// Cursor of the next page and the total from the first page
+let usersNextCursor = null;
+let usersTotal = 0;
+let usersLoaded = 0;
+let usersRequestSeq = 0;
+
 // Load users when page loads
 document.addEventListener('DOMContentLoaded', () => {
+    loadDepartmentFilter();
     loadUsers();
     document.getElementById('createdDate').value = new Date().toISOString().split('T')[0];
     setupModalCloseListeners();
 });
 
-// Load all users from backend
-async function loadUsers() {
+// Department filter options from the backend
+async function loadDepartmentFilter() {
     try {
-        showLoading();
-        
-        const response = await fetch(`${API_BASE_URL}/api/users`, {
+        const response = await fetch(`${API_BASE_URL}/api/departments`, {
+            credentials: 'include'
+        });
+        if (!response.ok) return;
+        const data = await response.json();
+        const select = document.getElementById('departmentFilter');
+        data.departments.forEach(name => {
+            const option = document.createElement('option');
+            option.value = name;
+            option.textContent = name;
+            select.appendChild(option);
+        });
+    } catch (error) {
+        console.error('Error loading departments:', error);
+    }
+}
+
+// Load one page of users from the backend; append=false starts over with the current filters
+async function loadUsers(append = false) {
+    const seq = ++usersRequestSeq;
+    try {
+        if (!append) {
+            showLoading();
+        }
+
+        const params = new URLSearchParams({
+            fields: USER_GRID_FIELDS,
+            limit: USERS_PAGE_SIZE,
+            sort: 'user_id',
+            search: searchInput.value.trim(),
+            department: departmentFilter.value,
+            role: roleFilter.value,
+            status: statusFilter.value
+        });
+        if (append && usersNextCursor) {
+            params.set('cursor', usersNextCursor);
+        }
+
+        const response = await fetch(`${API_BASE_URL}/api/users?${params}`, {
             credentials: 'include'
         });
         
@@ -51,8 +98,17 @@ async function loadUsers() {
             throw new Error(`HTTP error! status: ${response.status}`);
         }
         
-        const users = await response.json();
-        renderUsers(users);
+        const data = await response.json();
+        // A newer filter change superseded this request
+        if (seq !== usersRequestSeq) return;
+
+        usersNextCursor = data.next_cursor;
+        if (data.total !== null) {
+            usersTotal = data.total;
+        }
+        usersLoaded = append ? usersLoaded + data.users.length : data.users.length;
+        renderUsers(data.users, append);
+        updateUsersFooter();
         hideLoading();
     } catch (error) {
         console.error('Error loading users:', error);
@@ -61,11 +117,16 @@ async function loadUsers() {
     }
 }
 
+function updateUsersFooter() {
+    document.getElementById('userCount').textContent = `Showing ${usersLoaded} of ${usersTotal} users`;
+    document.getElementById('loadMoreUsers').style.display = usersNextCursor ? '' : 'none';
+}
+
 // Show loading state
 function showLoading() {
     userTableBody.innerHTML = `
         <tr>
-            <td colspan="9" style="text-align: center; padding: 40px;">
+            <td colspan="7" style="text-align: center; padding: 40px;">
                 <div style="display: inline-block; padding: 20px; background: #f8f9fa; border-radius: 8px;">
                     <i class="fas fa-spinner fa-spin" style="font-size: 24px; color: var(--primary); margin-right: 10px;"></i>
                     <span>Loading users...</span>
@@ -149,12 +210,12 @@ function showNotification(message, type = 'info') {
     }, 5000);
 }
 
-// Render users in table
-function renderUsers(users) {
-    if (!users || users.length === 0) {
+// Render users in table (append adds a page below the rows already shown)
+function renderUsers(users, append = false) {
+    if (!append && (!users || users.length === 0)) {
         userTableBody.innerHTML = `
             <tr>
-                <td colspan="9" style="text-align: center; padding: 40px; color: var(--gray);">
+                <td colspan="7" style="text-align: center; padding: 40px; color: var(--gray);">
                     <i class="fas fa-users" style="font-size: 48px; margin-bottom: 15px; display: block; opacity: 0.5;"></i>
                     No users found
                 </td>
@@ -163,7 +224,9 @@ function renderUsers(users) {
         return;
     }
 
-    userTableBody.innerHTML = '';
+    if (!append) {
+        userTableBody.innerHTML = '';
+    }
     
     users.forEach(user => {
         const row = document.createElement('tr');
@@ -171,12 +234,8 @@ function renderUsers(users) {
             <td>${user.user_id}</td>
             <td>${user.username}</td>
             <td>${user.email}</td>
-            <td style="font-family: monospace; background: #f8f9fa; padding: 8px; border-radius: 4px; border: 1px solid #dee2e6;">
-                ${user.password || 'Not set'}
-            </td>
             <td><span class="role-badge role-${user.role ? user.role.toLowerCase() : 'employee'}">${user.role || 'Employee'}</span></td>
             <td>${user.department}</td>
-            <td>${user.created_date}</td>
             <td><span class="status status-${user.status ? user.status.toLowerCase() : 'active'}">${user.status || 'Active'}</span></td>
             <td class="action-buttons">
                 <button class="action-btn btn-delete" data-userid="${user.user_id}" data-username="${user.username}" title="Delete User">
@@ -233,9 +292,10 @@ function renderUsers(users) {
     attachEventListeners();
 }
 
-// Attach event listeners to action buttons
+// Attach event listeners to action buttons (rows from earlier pages already have theirs)
 function attachEventListeners() {
-    document.querySelectorAll('.btn-delete').forEach(button => {
+    document.querySelectorAll('.btn-delete:not([data-bound])').forEach(button => {
+        button.setAttribute('data-bound', 'true');
         button.addEventListener('click', () => {
             const userId = button.getAttribute('data-userid');
             const username = button.getAttribute('data-username');
@@ -403,34 +463,19 @@ const departmentFilter = document.getElementById('departmentFilter');
 const roleFilter = document.getElementById('roleFilter');
 const statusFilter = document.getElementById('statusFilter');
 
+// Filters run on the server; typing is debounced
+let searchTimer = null;
+
 function applyFilters() {
-    const searchTerm = searchInput.value.toLowerCase();
-    const department = departmentFilter.value;
-    const role = roleFilter.value;
-    const status = statusFilter.value;
-    
-    const rows = userTableBody.querySelectorAll('tr');
-    
-    rows.forEach(row => {
-        const username = row.querySelector('td:nth-child(2)').textContent.toLowerCase();
-        const email = row.querySelector('td:nth-child(3)').textContent.toLowerCase();
-        const userRole = row.querySelector('td:nth-child(5)').textContent.toLowerCase();
-        const userDepartment = row.querySelector('td:nth-child(6)').textContent.toLowerCase().replace(' ', '-');
-        const userStatus = row.querySelector('td:nth-child(8)').textContent.toLowerCase();
-        
-        const matchesSearch = searchTerm === '' || 
-                             username.includes(searchTerm) || 
-                             email.includes(searchTerm);
-        
-        const matchesDepartment = department === 'all' || userDepartment === department;
-        const matchesRole = role === 'all' || userRole === role;
-        const matchesStatus = status === 'all' || userStatus === status;
-        
-        row.style.display = (matchesSearch && matchesDepartment && matchesRole && matchesStatus) ? '' : 'none';
-    });
+    usersNextCursor = null;
+    loadUsers();
 }
 
-searchInput.addEventListener('input', applyFilters);
+searchInput.addEventListener('input', () => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(applyFilters, 250);
+});
 departmentFilter.addEventListener('change', applyFilters);
 roleFilter.addEventListener('change', applyFilters);
-statusFilter.addEventListener('change', applyFilters);
\ No newline at end of file
+statusFilter.addEventListener('change', applyFilters);
+document.getElementById('loadMoreUsers').addEventListener('click', () => loadUsers(true));
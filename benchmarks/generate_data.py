@@ -0,0 +1,225 @@
+# generate_data.py - Seeded synthetic data for load testing
+#
+# Creates N employees spread over the existing department/role tables with
+# leave_application and leave_balance histories, loads them into the database
+# configured by the DAYOFFLY_DB_* variables (as the app reads them, see
+# Backed/database.py), rebuilds the leave fact tables and writes a manifest
+# the load driver reads (ids, logins). It reuses the app's modules, so it
+# needs the app's dependencies (Flask, mysql-connector-python).
+#
+#   python benchmarks/generate_data.py --employees 2000 --leaves 100000 --seed 7
+#
+# Generated users get ids from BASE_USER_ID upwards and are replaced on every
+# run; rows from dayoffly_db.sql are left alone.
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, date, timedelta
+import mysql.connector
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Backed'))
+# The app's own settings, so the data lands where the app - and the holiday
+# calendar rebuild_leave_facts counts working days with - reads
+from database import DB_CONFIG  # noqa: E402
+from leave_facts import rebuild_leave_facts  # noqa: E402
+
+BASE_USER_ID = 100000
+BASE_LEAVE_ID = 1000000
+BENCH_PASSWORD = 'bench-pass'
+BATCH_SIZE = 5000
+DEFAULT_MANIFEST = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'manifest.json')
+
+FIRST_NAMES = ['Aarav', 'Priya', 'Rahul', 'Ananya', 'Vikram', 'Neha', 'Arjun', 'Kavya', 'Rohan', 'Isha',
+               'Liam', 'Emma', 'Noah', 'Olivia', 'Mason', 'Sophia', 'Lucas', 'Mia', 'Ethan', 'Amelia']
+LAST_NAMES = ['Patel', 'Shah', 'Mehta', 'Desai', 'Iyer', 'Reddy', 'Kapoor', 'Singh', 'Gupta', 'Joshi',
+              'Smith', 'Brown', 'Wilson', 'Taylor', 'Clark', 'Walker', 'Young', 'King', 'Wright', 'Hill']
+DESIGNATIONS = ['Web Developer', 'Analyst', 'Accountant', 'Sales Executive', 'Designer',
+                'QA Engineer', 'Recruiter', 'Researcher', 'Team Lead', 'Consultant']
+REASONS = ['Family function', 'Medical appointment', 'Personal work', 'Travel', 'Fever',
+           'Wedding', 'Moving house', 'Child care', 'Festival', 'Rest']
+
+# Annual allowance per leave type (matches add_user/add_employee)
+ALLOWANCES = {'Sick Leave': 10, 'Vacation': 15, 'Casual Leave': 12}
+LEAVE_TYPE_WEIGHTS = {'Casual Leave': 40, 'Sick Leave': 30, 'Vacation': 25,
+                      'Maternity Leave': 2, 'Paternity Leave': 3}
+# Short leaves dominate
+DURATION_WEIGHTS = [(1, 35), (2, 22), (3, 14), (4, 8), (5, 8), (7, 5), (10, 5), (14, 3)]
+
+
+def batched(rows, size=BATCH_SIZE):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def load_reference(cursor):
+    cursor.execute("SELECT department_id FROM department ORDER BY department_id")
+    departments = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT role_id, role_name FROM role")
+    roles = {name: role_id for role_id, name in cursor.fetchall()}
+    cursor.execute("SELECT leave_type FROM leave_types")
+    leave_types = [row[0] for row in cursor.fetchall()]
+    return departments, roles, leave_types
+
+
+def generate_users(rng, employees, departments, roles):
+    """users_master rows; the first user is HR, each department gets a manager who approves its staff"""
+    users = []
+    managers = {}
+    user_id = BASE_USER_ID
+
+    def add(name, department_id, role_id, designation, approver_id):
+        nonlocal user_id
+        user_id += 1
+        email = f"{name.lower().replace(' ', '.')}.{user_id}@bench.dayoffly"
+        users.append((user_id, name, email, BENCH_PASSWORD, department_id, role_id, designation,
+                      f"9{rng.randrange(10 ** 9):09d}", 1, approver_id or user_id))
+        return user_id
+
+    hr_user = add('Bench HR', departments[0], roles['HR'], 'HR Manager', None)
+    for department_id in departments:
+        managers[department_id] = add(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+                                      department_id, roles['Manager'], 'Team Lead', hr_user)
+
+    staff_roles = [roles[name] for name in ('Senior', 'Junior', 'Intern') if name in roles]
+    while len(users) < employees:
+        department_id = rng.choice(departments)
+        add(f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", department_id,
+            rng.choice(staff_roles), rng.choice(DESIGNATIONS), managers[department_id])
+
+    # Roughly 3% of staff have left
+    inactive = [index for index in range(len(users)) if index > len(departments) and rng.random() < 0.03]
+    for index in inactive:
+        users[index] = users[index][:8] + (0,) + users[index][9:]
+    return users, hr_user
+
+
+def generate_leaves(rng, leaves, user_ids, leave_types, years):
+    """leave_application rows with a skewed per-user distribution"""
+    types = [t for t in LEAVE_TYPE_WEIGHTS if t in leave_types] or leave_types
+    type_weights = [LEAVE_TYPE_WEIGHTS.get(t, 1) for t in types]
+    durations = [d for d, _ in DURATION_WEIGHTS]
+    duration_weights = [w for _, w in DURATION_WEIGHTS]
+    # Some people take far more leave than others
+    user_weights = [rng.paretovariate(2.5) for _ in user_ids]
+
+    now = datetime.now().replace(microsecond=0)
+    span_seconds = int(years * 365 * 86400)
+    rows = []
+    chosen_users = rng.choices(user_ids, weights=user_weights, k=leaves)
+    for offset, user_id in enumerate(chosen_users):
+        applied_on = now - timedelta(seconds=rng.randrange(span_seconds))
+        start = applied_on.date() + timedelta(days=rng.randrange(0, 30))
+        end = start + timedelta(days=rng.choices(durations, weights=duration_weights)[0] - 1)
+        if start > date.today():
+            status = 'pending' if rng.random() < 0.7 else 'approved'
+        else:
+            status = rng.choices(['approved', 'declined', 'pending'], weights=[75, 15, 10])[0]
+        rows.append((BASE_LEAVE_ID + offset + 1, user_id, rng.choices(types, weights=type_weights)[0],
+                     applied_on, start, end, rng.choice(REASONS), None, status))
+    return rows
+
+
+def generate_balances(users, leave_rows):
+    """leave_balance rows consistent with this year's approved leaves"""
+    this_year = date.today().year
+    used = {}
+    for _, user_id, leave_type, _, start, end, _, _, status in leave_rows:
+        if status == 'approved' and start.year == this_year and leave_type in ALLOWANCES:
+            key = (user_id, leave_type)
+            used[key] = used.get(key, 0) + (end - start).days + 1
+
+    rows = []
+    for user in users:
+        for leave_type, total in ALLOWANCES.items():
+            taken = min(used.get((user[0], leave_type), 0), total)
+            rows.append((user[0], leave_type, total, taken, total - taken))
+    return rows
+
+
+def clear_generated(cursor):
+    cursor.execute("DELETE FROM leave_application WHERE user_id > %s", (BASE_USER_ID,))
+    cursor.execute("DELETE FROM leave_balance WHERE user_id > %s", (BASE_USER_ID,))
+    cursor.execute("DELETE FROM emergency_contacts WHERE user_id > %s", (BASE_USER_ID,))
+    cursor.execute("DELETE FROM users_master WHERE user_id > %s", (BASE_USER_ID,))
+
+
+def insert_rows(cursor, conn, table, columns, rows):
+    placeholders = ', '.join(['%s'] * len(columns))
+    query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    for batch in batched(rows):
+        cursor.executemany(query, batch)
+        conn.commit()
+    print(f"  {table}: {len(rows)} rows")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load seeded synthetic Dayoffly data')
+    parser.add_argument('--employees', type=int, default=1000)
+    parser.add_argument('--leaves', type=int, default=20000, help='leave_application rows (1k - 1M)')
+    parser.add_argument('--years', type=float, default=3, help='history span')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    started = time.perf_counter()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    cursor = conn.cursor()
+    try:
+        departments, roles, leave_types = load_reference(cursor)
+        if not departments or 'HR' not in roles or 'Manager' not in roles:
+            sys.exit("Reference tables are empty - import dayoffly_db.sql first")
+        if args.employees < len(departments) + 2:
+            sys.exit(f"--employees must be at least {len(departments) + 2}")
+
+        print(f"🔄 Generating {args.employees} employees / {args.leaves} leaves (seed {args.seed})")
+        users, hr_user = generate_users(rng, args.employees, departments, roles)
+        user_ids = [user[0] for user in users]
+        leave_rows = generate_leaves(rng, args.leaves, user_ids, leave_types, args.years)
+        balance_rows = generate_balances(users, leave_rows)
+
+        # Bulk load: the generator keeps the references consistent itself
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+        clear_generated(cursor)
+        conn.commit()
+        insert_rows(cursor, conn, 'users_master',
+                    ['user_id', 'user_name', 'email', 'password', 'department_id', 'role_id',
+                     'designation', 'contact_number', 'is_active', 'approver_id'], users)
+        insert_rows(cursor, conn, 'leave_balance',
+                    ['user_id', 'leave_type', 'total_leaves', 'used_leaves', 'remaining_leaves'], balance_rows)
+        insert_rows(cursor, conn, 'leave_application',
+                    ['leave_id', 'user_id', 'leave_type', 'applied_on', 'start_date', 'end_date',
+                     'reason', 'attachment', 'leave_status'], leave_rows)
+        cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        facts, cells = rebuild_leave_facts(conn)
+        print(f"  leave_fact: {facts} rows, leave_summary_monthly: {cells} cells")
+    finally:
+        cursor.close()
+        conn.close()
+
+    staff = [user for user in users if user[5] not in (roles['HR'], roles['Manager']) and user[8]]
+    manifest = {
+        'seed': args.seed,
+        'employees': len(users),
+        'leaves': len(leave_rows),
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'password': BENCH_PASSWORD,
+        'hr_user': hr_user,
+        'employee_users': [user[0] for user in staff[:200]],
+        'user_ids': [user_ids[0], user_ids[-1]],
+        'leave_ids': [leave_rows[0][0], leave_rows[-1][0]] if leave_rows else [],
+        'departments': departments
+    }
+    with open(args.manifest, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    print(f"✓ Done in {time.perf_counter() - started:.1f}s, manifest written to {args.manifest}")
+
+
+if __name__ == '__main__':
+    main()
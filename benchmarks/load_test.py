@@ -0,0 +1,400 @@
+# load_test.py - Weighted-traffic load driver and result comparison
+#
+#   python benchmarks/load_test.py run --mix mixed --concurrency 32 --duration 60
+#   python benchmarks/load_test.py compare results/base.json results/new.json
+#
+# Each worker thread keeps one keep-alive connection per logged-in role (HR and
+# an employee from manifest.json) and replays requests drawn from the chosen
+# mix. Latency is measured per endpoint; results are written as JSON together
+# with the git commit so runs can be compared across commits.
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlsplit
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_MANIFEST = os.path.join(BENCH_DIR, 'manifest.json')
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# name -> (session role, method, path template, JSON body template)
+ENDPOINTS = {
+    'employees_page':       ('hr', 'GET', '/api/employees?page={page}&per_page=10', None),
+    'employee_stats':       ('hr', 'GET', '/api/employees/stats', None),
+    'employee_details':     ('hr', 'GET', '/api/employees/{any_user}', None),
+    'departments':          ('hr', 'GET', '/api/departments', None),
+    'roles':                ('hr', 'GET', '/api/roles', None),
+    'hr_dashboard':         ('hr', 'GET', '/hr/dashboard-data?limit=5', None),
+    'hr_leave_requests':    ('hr', 'GET', '/hr/leave-requests?limit=100', None),
+    'hr_leave_pending':     ('hr', 'GET', '/hr/leave-requests?status=pending&limit=100', None),
+    'hr_leave_detail':      ('hr', 'GET', '/hr/leave-request/{leave_id}', None),
+    'hr_analytics':         ('hr', 'GET', '/hr/analytics-data?period={period}', None),
+    'users':                ('hr', 'GET', '/api/users', None),
+    'update_leave_status':  ('hr', 'POST', '/hr/update-leave-status',
+                             {'leave_id': '{leave_id}', 'status': '{decision}', 'employee_name': 'bench'}),
+    'employee_page':        ('employee', 'GET', '/employee-dashboard', None),
+    'leave_status_page':    ('employee', 'GET', '/leave-status', None),
+    'profile':              ('employee', 'GET', '/api/profile', None),
+    'emergency_contacts':   ('employee', 'GET', '/api/profile/emergency-contacts', None),
+    'current_user':         ('employee', 'GET', '/api/current-user', None),
+    'user_analytics':       ('employee', 'GET', '/api/user-analytics/{self_user}', None),
+    'export_analytics':     ('employee', 'GET', '/api/export-analytics/{self_user}', None),
+    'check_auth':           ('employee', 'GET', '/check-auth', None),
+}
+
+# Traffic mixes: endpoint name -> relative weight
+MIXES = {
+    'hr': {
+        'hr_dashboard': 25, 'hr_leave_requests': 20, 'hr_leave_pending': 10, 'hr_analytics': 15,
+        'employees_page': 10, 'employee_stats': 5, 'users': 5, 'hr_leave_detail': 4,
+        'employee_details': 2, 'departments': 2, 'roles': 1, 'update_leave_status': 1
+    },
+    'employee': {
+        'employee_page': 30, 'leave_status_page': 15, 'user_analytics': 20, 'profile': 10,
+        'current_user': 10, 'check_auth': 8, 'emergency_contacts': 5, 'export_analytics': 2
+    },
+    # The two handlers with an async implementation (Backed/asgi.py)
+    'analytics': {'hr_analytics': 1, 'user_analytics': 1},
+    'mixed': {
+        'hr_dashboard': 10, 'hr_leave_requests': 8, 'hr_leave_pending': 4, 'hr_analytics': 6,
+        'employees_page': 4, 'employee_stats': 2, 'users': 2, 'hr_leave_detail': 2,
+        'employee_details': 1, 'departments': 1, 'roles': 1, 'update_leave_status': 1,
+        'employee_page': 20, 'leave_status_page': 8, 'user_analytics': 12, 'profile': 6,
+        'current_user': 5, 'check_auth': 4, 'emergency_contacts': 2, 'export_analytics': 1
+    }
+}
+
+PERIODS = ['6months', '4quarters', '3years', 'all']
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[rank]
+
+
+def git_commit():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'],
+                                             cwd=BENCH_DIR, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+class Client:
+    """One keep-alive HTTP connection with a cookie jar (enough for Flask sessions)"""
+
+    def __init__(self, base_url, timeout, compressed, conditional):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.timeout = timeout
+        self.compressed = compressed
+        self.conditional = conditional
+        self.cookies = {}
+        self.etags = {}
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None):
+        """Returns (status, bytes received)"""
+        headers = {'Accept': 'application/json, text/html'}
+        if self.compressed:
+            headers['Accept-Encoding'] = 'gzip, br'
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f"{k}={v}" for k, v in self.cookies.items())
+        if self.conditional and method == 'GET' and path in self.etags:
+            headers['If-None-Match'] = self.etags[path]
+        payload = None
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+
+        for attempt in (1, 2):
+            if self.conn is None:
+                self._connect()
+            try:
+                self.conn.request(method, path, body=payload, headers=headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Server closed the keep-alive connection - reconnect once
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    raise
+
+        for header, value in response.getheaders():
+            if header.lower() == 'set-cookie':
+                name, _, rest = value.partition('=')
+                self.cookies[name.strip()] = rest.split(';', 1)[0]
+        etag = response.getheader('ETag')
+        if etag and method == 'GET':
+            self.etags[path] = etag
+        return response.status, len(data)
+
+    def login(self, user_id, password):
+        status, _ = self.request('POST', '/login', {'userId': str(user_id), 'password': password})
+        if status != 200:
+            raise RuntimeError(f"Login as {user_id} failed with HTTP {status}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+
+
+class Recorder:
+    """Thread-safe per-endpoint latency / status / byte counters"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {}
+        self.errors = {}
+        self.not_modified = {}
+        self.bytes = {}
+
+    def record(self, name, seconds, status, size):
+        with self.lock:
+            self.latencies.setdefault(name, []).append(seconds * 1000)
+            self.bytes[name] = self.bytes.get(name, 0) + size
+            if status is None or status >= 400:
+                self.errors[name] = self.errors.get(name, 0) + 1
+            elif status == 304:
+                self.not_modified[name] = self.not_modified.get(name, 0) + 1
+
+    def summary(self, elapsed):
+        endpoints = {}
+        for name, values in sorted(self.latencies.items()):
+            ordered = sorted(values)
+            endpoints[name] = {
+                'requests': len(ordered),
+                'errors': self.errors.get(name, 0),
+                'not_modified': self.not_modified.get(name, 0),
+                'throughput_rps': round(len(ordered) / elapsed, 2),
+                'bytes_per_request': round(self.bytes.get(name, 0) / len(ordered)),
+                'mean_ms': round(sum(ordered) / len(ordered), 2),
+                'p50_ms': round(percentile(ordered, 50), 2),
+                'p95_ms': round(percentile(ordered, 95), 2),
+                'p99_ms': round(percentile(ordered, 99), 2),
+                'max_ms': round(ordered[-1], 2)
+            }
+        everything = sorted(v for values in self.latencies.values() for v in values)
+        total = {
+            'requests': len(everything),
+            'errors': sum(self.errors.values()),
+            'throughput_rps': round(len(everything) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(everything, 50), 2),
+            'p95_ms': round(percentile(everything, 95), 2),
+            'p99_ms': round(percentile(everything, 99), 2)
+        }
+        return total, endpoints
+
+
+def make_params(rng, manifest, self_user):
+    leave_low, leave_high = manifest['leave_ids']
+    user_low, user_high = manifest['user_ids']
+    return {
+        'page': rng.randint(1, 20),
+        'any_user': rng.randint(user_low, user_high),
+        'leave_id': rng.randint(leave_low, leave_high),
+        'period': rng.choice(PERIODS),
+        'decision': rng.choice(['Approved', 'Rejected']),
+        'self_user': self_user
+    }
+
+
+def fill(template, params):
+    if isinstance(template, dict):
+        return {key: fill(value, params) for key, value in template.items()}
+    if isinstance(template, str):
+        value = template.format(**params)
+        # Keep whole-placeholder fields numeric (e.g. leave_id)
+        return int(value) if template.startswith('{') and value.isdigit() else value
+    return template
+
+
+def worker(index, args, manifest, mix, deadline, warmup_until, recorder, failures):
+    rng = random.Random(args.seed + index)
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    employee_id = manifest['employee_users'][index % len(manifest['employee_users'])]
+    roles_needed = {ENDPOINTS[name][0] for name in names}
+
+    clients = {}
+    try:
+        if 'hr' in roles_needed:
+            clients['hr'] = Client(args.base_url, args.timeout, args.compressed, args.conditional)
+            clients['hr'].login(manifest['hr_user'], manifest['password'])
+        if 'employee' in roles_needed:
+            clients['employee'] = Client(args.base_url, args.timeout, args.compressed, args.conditional)
+            clients['employee'].login(employee_id, manifest['password'])
+
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights=weights)[0]
+            role, method, path, body = ENDPOINTS[name]
+            params = make_params(rng, manifest, employee_id)
+            started = time.perf_counter()
+            try:
+                status, size = clients[role].request(method, fill(path, params), fill(body, params))
+            except (http.client.HTTPException, OSError):
+                status, size = None, 0
+            if time.monotonic() >= warmup_until:
+                recorder.record(name, time.perf_counter() - started, status, size)
+    except Exception as e:
+        failures.append(f"worker {index}: {e}")
+    finally:
+        for client in clients.values():
+            client.close()
+
+
+def run(args):
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+    mix = MIXES[args.mix]
+
+    recorder = Recorder()
+    failures = []
+    warmup_until = time.monotonic() + args.warmup
+    deadline = warmup_until + args.duration
+
+    print(f"🚀 {args.mix} mix, {args.concurrency} workers, {args.duration}s (+{args.warmup}s warm-up) "
+          f"against {args.base_url}")
+    threads = [
+        threading.Thread(target=worker, args=(i, args, manifest, mix, deadline, warmup_until, recorder, failures),
+                         daemon=True)
+        for i in range(args.concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    total, endpoints = recorder.summary(args.duration)
+    commit, dirty = git_commit()
+    result = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'git_commit': commit,
+        'git_dirty': dirty,
+        'config': {
+            'base_url': args.base_url, 'mix': args.mix, 'concurrency': args.concurrency,
+            'duration': args.duration, 'warmup': args.warmup, 'seed': args.seed,
+            'compressed': args.compressed, 'conditional': args.conditional
+        },
+        'dataset': {key: manifest.get(key) for key in ('seed', 'employees', 'leaves')},
+        'total': total,
+        'endpoints': endpoints,
+        'worker_failures': failures
+    }
+
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{(commit or 'nocommit')[:8]}-{args.mix}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print_table(endpoints, total)
+    for failure in failures:
+        print(f"⚠ {failure}")
+    print(f"✓ Results saved to {output}")
+
+
+def print_table(endpoints, total):
+    header = f"{'endpoint':<22}{'reqs':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'bytes':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, stats in endpoints.items():
+        print(f"{name:<22}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>9.1f}"
+              f"{stats['p50_ms']:>9.1f}{stats['p95_ms']:>9.1f}{stats['p99_ms']:>9.1f}{stats['bytes_per_request']:>9}")
+    print('-' * len(header))
+    print(f"{'TOTAL':<22}{total['requests']:>8}{total['errors']:>6}{total['throughput_rps']:>9.1f}"
+          f"{total['p50_ms']:>9.1f}{total['p95_ms']:>9.1f}{total['p99_ms']:>9.1f}")
+
+
+def change(old, new):
+    return (new - old) / old * 100 if old else 0.0
+
+
+def compare(args):
+    """Print per-endpoint deltas; exit 1 if any latency percentile regressed beyond the threshold"""
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    print(f"base: {base.get('git_commit')} ({base['timestamp']})")
+    print(f"new:  {new.get('git_commit')} ({new['timestamp']})")
+    if base['config'] != new['config'] or base.get('dataset') != new.get('dataset'):
+        print("⚠ Runs used different configurations or datasets")
+
+    regressions = []
+    header = f"{'endpoint':<22}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+    print(header)
+    print('-' * len(header))
+    rows = list(base['endpoints'].items()) + [('TOTAL', base['total'])]
+    for name, old in rows:
+        current = new['total'] if name == 'TOTAL' else new['endpoints'].get(name)
+        if current is None:
+            print(f"{name:<22}{'(missing)':>10}")
+            continue
+        deltas = {key: change(old[key], current[key])
+                  for key in ('throughput_rps', 'p50_ms', 'p95_ms', 'p99_ms')}
+        print(f"{name:<22}{deltas['throughput_rps']:>+9.1f}%{deltas['p50_ms']:>+9.1f}%"
+              f"{deltas['p95_ms']:>+9.1f}%{deltas['p99_ms']:>+9.1f}%")
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            if deltas[key] > args.threshold:
+                regressions.append(f"{name} {key} +{deltas[key]:.1f}%")
+
+    if regressions:
+        print(f"✗ Regressions over {args.threshold}%: " + ', '.join(regressions))
+        sys.exit(1)
+    print("✓ No latency regressions")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Dayoffly load driver')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='replay a traffic mix and record latencies')
+    run_parser.add_argument('--base-url', default='http://127.0.0.1:5000')
+    run_parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    run_parser.add_argument('--concurrency', type=int, default=16)
+    run_parser.add_argument('--duration', type=float, default=30, help='measured seconds')
+    run_parser.add_argument('--warmup', type=float, default=5, help='unrecorded seconds before measuring')
+    run_parser.add_argument('--timeout', type=float, default=30)
+    run_parser.add_argument('--seed', type=int, default=1)
+    run_parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    run_parser.add_argument('--output', help='result file (default: benchmarks/results/<time>-<commit>-<mix>.json)')
+    run_parser.add_argument('--compressed', action='store_true', help='send Accept-Encoding: gzip, br')
+    run_parser.add_argument('--conditional', action='store_true', help='replay ETags with If-None-Match')
+
+    compare_parser = commands.add_parser('compare', help='compare two result files')
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--threshold', type=float, default=10, help='allowed latency increase in %%')
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        compare(args)
+
+
+if __name__ == '__main__':
+    main()
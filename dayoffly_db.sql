@@ -23,13 +23,26 @@ SET time_zone = "+00:00";
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `cache_counters`
+-- (cache namespace versions shared by all workers; see Backed/cache.py)
+--
+
+CREATE TABLE `cache_counters` (
+  `name` varchar(64) NOT NULL,
+  `value` bigint(20) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `department`
 --
 
 CREATE TABLE `department` (
   `department_id` int(5) NOT NULL,
-  `department_name` enum('Human Resources','Finance','IT','Sales','Marketing','Research & Development') NOT NULL
+  `department_name` enum('Human Resources','Finance','IT','Sales','Marketing','Research & Development') NOT NULL,
+  `region` varchar(8) NOT NULL DEFAULT 'IN'
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -68,6 +81,51 @@ INSERT INTO `emergency_contacts` (`contact_id`, `user_id`, `contact_name`, `rela
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `holidays`
+-- (public holidays per region; read by Backed/business_days.py)
+--
+
+CREATE TABLE `holidays` (
+  `region` varchar(8) NOT NULL,
+  `holiday_date` date NOT NULL,
+  `holiday_name` varchar(100) NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+--
+-- Dumping data for table `holidays`
+--
+
+INSERT INTO `holidays` (`region`, `holiday_date`, `holiday_name`) VALUES
+('IN', '2024-01-26', 'Republic Day'),
+('IN', '2024-03-25', 'Holi'),
+('IN', '2024-08-15', 'Independence Day'),
+('IN', '2024-11-12', 'Diwali'),
+('IN', '2025-01-14', 'Makar Sankranti'),
+('IN', '2025-01-26', 'Republic Day'),
+('IN', '2025-03-14', 'Holi'),
+('IN', '2025-03-31', 'Eid al-Fitr'),
+('IN', '2025-04-18', 'Good Friday'),
+('IN', '2025-08-15', 'Independence Day'),
+('IN', '2025-09-01', 'Ganesh Chaturthi'),
+('IN', '2025-10-02', 'Dussehra'),
+('IN', '2025-10-20', 'Diwali'),
+('IN', '2025-12-25', 'Christmas'),
+('IN', '2026-01-01', 'New Year''s Day'),
+('IN', '2026-01-14', 'Makar Sankranti'),
+('IN', '2026-01-26', 'Republic Day'),
+('IN', '2026-03-04', 'Holi'),
+('IN', '2026-03-20', 'Eid al-Fitr'),
+('IN', '2026-04-03', 'Good Friday'),
+('IN', '2026-08-15', 'Independence Day'),
+('IN', '2026-09-14', 'Ganesh Chaturthi'),
+('IN', '2026-10-02', 'Gandhi Jayanti'),
+('IN', '2026-10-20', 'Dussehra'),
+('IN', '2026-11-08', 'Diwali'),
+('IN', '2026-12-25', 'Christmas');
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `leave_application`
 --
@@ -76,12 +134,13 @@ CREATE TABLE `leave_application` (
   `leave_id` int(5) NOT NULL,
   `user_id` int(5) DEFAULT NULL,
   `leave_type` varchar(30) DEFAULT NULL,
-  `applied_on` datetime DEFAULT current_timestamp(),
+  `applied_on` datetime NOT NULL DEFAULT current_timestamp(),
   `start_date` date NOT NULL,
   `end_date` date NOT NULL,
   `reason` text NOT NULL,
   `attachment` varchar(255) DEFAULT NULL,
-  `leave_status` varchar(10) DEFAULT 'pending'
+  `leave_status` varchar(10) DEFAULT 'pending',
+  `reserved_days` int(3) NOT NULL DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -113,11 +172,12 @@ INSERT INTO `leave_application` (`leave_id`, `user_id`, `leave_type`, `applied_o
 --
 
 CREATE TABLE `leave_balance` (
-  `user_id` int(5) DEFAULT NULL,
-  `leave_type` varchar(30) DEFAULT NULL,
+  `user_id` int(5) NOT NULL,
+  `leave_type` varchar(30) NOT NULL,
   `total_leaves` int(3) NOT NULL,
   `used_leaves` int(3) DEFAULT 0,
-  `remaining_leaves` int(3) DEFAULT NULL
+  `remaining_leaves` int(3) DEFAULT NULL,
+  `pending_leaves` int(3) NOT NULL DEFAULT 0
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
 
 --
@@ -126,7 +186,6 @@ CREATE TABLE `leave_balance` (
 
 INSERT INTO `leave_balance` (`user_id`, `leave_type`, `total_leaves`, `used_leaves`, `remaining_leaves`) VALUES
 (30002, 'Sick Leave', 10, 8, 1),
-(30004, NULL, 20, 0, 20),
 (30004, 'Sick Leave', 10, 2, 8),
 (30004, 'Vacation', 15, 6, 9),
 (30005, 'Casual Leave', 12, 1, 11),
@@ -141,6 +200,79 @@ INSERT INTO `leave_balance` (`user_id`, `leave_type`, `total_leaves`, `used_leav
 
 -- --------------------------------------------------------
 
+--
+-- Table structure for table `leave_change_log`
+-- (one row per leave_application status change; read by Backed/change_feed.py)
+--
+
+CREATE TABLE `leave_change_log` (
+  `seq` bigint(20) NOT NULL,
+  `leave_id` int(5) NOT NULL,
+  `user_id` int(5) NOT NULL,
+  `old_status` varchar(10) DEFAULT NULL,
+  `new_status` varchar(10) DEFAULT NULL,
+  `changed_at` datetime NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `leave_fact`
+-- (derived from leave_application; maintained by Backed/leave_facts.py)
+--
+
+CREATE TABLE `leave_fact` (
+  `leave_id` int(5) NOT NULL,
+  `user_id` int(5) NOT NULL,
+  `department_id` int(5) DEFAULT NULL,
+  `leave_type` varchar(30) DEFAULT NULL,
+  `leave_status` varchar(10) NOT NULL,
+  `applied_on` datetime NOT NULL,
+  `applied_date` date NOT NULL,
+  `applied_month` char(7) NOT NULL,
+  `start_date` date NOT NULL,
+  `end_date` date NOT NULL,
+  `start_month` char(7) NOT NULL,
+  `duration_days` int(5) NOT NULL,
+  `working_days` int(5) DEFAULT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `leave_idempotency_keys`
+-- (client retry keys of leave submissions; see Backed/leave_application_backend.py)
+-- request_hash is the SHA-1 of the submitted fields, so a key reused with a
+-- different body is rejected. Existing databases: ALTER TABLE
+-- `leave_idempotency_keys` ADD `request_hash` char(40) DEFAULT NULL AFTER `idempotency_key`;
+--
+
+CREATE TABLE `leave_idempotency_keys` (
+  `user_id` int(5) NOT NULL,
+  `idempotency_key` varchar(64) NOT NULL,
+  `request_hash` char(40) DEFAULT NULL,
+  `leave_id` int(5) DEFAULT NULL,
+  `created_at` datetime NOT NULL DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
+--
+-- Table structure for table `leave_summary_monthly`
+-- (leave_fact rolled up by applied month, department, leave type and status)
+--
+
+CREATE TABLE `leave_summary_monthly` (
+  `applied_month` char(7) NOT NULL,
+  `department_id` int(5) NOT NULL DEFAULT 0,
+  `leave_type` varchar(30) NOT NULL DEFAULT '',
+  `leave_status` varchar(10) NOT NULL,
+  `leave_count` int(11) NOT NULL DEFAULT 0,
+  `total_days` int(11) NOT NULL DEFAULT 0
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Table structure for table `leave_types`
 --
@@ -234,6 +366,12 @@ INSERT INTO `users_master` (`user_id`, `user_name`, `email`, `password`, `depart
 -- Indexes for dumped tables
 --
 
+--
+-- Indexes for table `cache_counters`
+--
+ALTER TABLE `cache_counters`
+  ADD PRIMARY KEY (`name`);
+
 --
 -- Indexes for table `department`
 --
@@ -247,21 +385,65 @@ ALTER TABLE `emergency_contacts`
   ADD PRIMARY KEY (`contact_id`),
   ADD KEY `user_id` (`user_id`);
 
+--
+-- Indexes for table `holidays`
+--
+ALTER TABLE `holidays`
+  ADD PRIMARY KEY (`region`,`holiday_date`);
+
 --
 -- Indexes for table `leave_application`
 --
 ALTER TABLE `leave_application`
   ADD PRIMARY KEY (`leave_id`),
   ADD KEY `user_id` (`user_id`),
-  ADD KEY `leave_type` (`leave_type`);
+  ADD KEY `leave_type` (`leave_type`),
+  ADD KEY `idx_user_status_dates` (`user_id`,`leave_status`,`start_date`,`end_date`),
+  ADD KEY `idx_applied` (`applied_on`,`leave_id`),
+  ADD KEY `idx_status_applied` (`leave_status`,`applied_on`,`leave_id`),
+  ADD KEY `idx_type_applied` (`leave_type`,`applied_on`,`leave_id`);
 
 --
 -- Indexes for table `leave_balance`
 --
+-- One balance row per (user, leave type): reservations and settlements are
+-- single-row upserts on this key (Backed/leave_balance.py). Existing
+-- databases: delete the rows without a leave_type and merge duplicates first.
+--
 ALTER TABLE `leave_balance`
-  ADD KEY `user_id` (`user_id`),
+  ADD PRIMARY KEY (`user_id`,`leave_type`),
   ADD KEY `leave_type` (`leave_type`);
 
+--
+-- Indexes for table `leave_change_log`
+--
+ALTER TABLE `leave_change_log`
+  ADD PRIMARY KEY (`seq`),
+  ADD KEY `idx_change_leave` (`leave_id`),
+  ADD KEY `idx_change_time` (`changed_at`);
+
+--
+-- Indexes for table `leave_fact`
+--
+ALTER TABLE `leave_fact`
+  ADD PRIMARY KEY (`leave_id`),
+  ADD KEY `idx_fact_applied` (`applied_on`,`department_id`,`leave_type`,`leave_status`,`applied_month`,`duration_days`,`working_days`),
+  ADD KEY `idx_fact_user_start` (`user_id`,`start_month`),
+  ADD KEY `idx_fact_status_dates` (`leave_status`,`start_date`,`end_date`,`department_id`,`user_id`),
+  ADD KEY `idx_fact_status_user` (`leave_status`,`user_id`);
+
+--
+-- Indexes for table `leave_idempotency_keys`
+--
+ALTER TABLE `leave_idempotency_keys`
+  ADD PRIMARY KEY (`user_id`,`idempotency_key`);
+
+--
+-- Indexes for table `leave_summary_monthly`
+--
+ALTER TABLE `leave_summary_monthly`
+  ADD PRIMARY KEY (`applied_month`,`department_id`,`leave_type`,`leave_status`);
+
 --
 -- Indexes for table `leave_types`
 --
@@ -282,7 +464,9 @@ ALTER TABLE `users_master`
   ADD UNIQUE KEY `email` (`email`),
   ADD KEY `department_id` (`department_id`),
   ADD KEY `role_id` (`role_id`),
-  ADD KEY `approver_id` (`approver_id`);
+  ADD KEY `approver_id` (`approver_id`),
+  ADD KEY `idx_user_name` (`user_name`),
+  ADD FULLTEXT KEY `ft_user_search` (`user_name`,`email`,`designation`);
 
 --
 -- AUTO_INCREMENT for dumped tables
@@ -294,6 +478,12 @@ ALTER TABLE `users_master`
 ALTER TABLE `emergency_contacts`
   MODIFY `contact_id` int(5) NOT NULL AUTO_INCREMENT, AUTO_INCREMENT=5;
 
+--
+-- AUTO_INCREMENT for table `leave_change_log`
+--
+ALTER TABLE `leave_change_log`
+  MODIFY `seq` bigint(20) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT for table `leave_application`
 --
@@ -331,6 +521,25 @@ ALTER TABLE `users_master`
   ADD CONSTRAINT `users_master_ibfk_1` FOREIGN KEY (`department_id`) REFERENCES `department` (`department_id`),
   ADD CONSTRAINT `users_master_ibfk_2` FOREIGN KEY (`role_id`) REFERENCES `role` (`role_id`),
   ADD CONSTRAINT `users_master_ibfk_3` FOREIGN KEY (`approver_id`) REFERENCES `users_master` (`user_id`);
+
+--
+-- Backfill derived tables (same as `python leave_facts.py`). The working
+-- days need the holiday calendar, so leave_fact.working_days stays NULL
+-- ("not counted yet") here and the app counts them when it starts
+-- (leave_facts.init_app). Existing databases: ALTER TABLE `leave_fact`
+-- MODIFY `working_days` int(5) DEFAULT NULL; their zero rows are recounted too.
+--
+INSERT INTO `leave_fact` (`leave_id`, `user_id`, `department_id`, `leave_type`, `leave_status`, `applied_on`, `applied_date`, `applied_month`, `start_date`, `end_date`, `start_month`, `duration_days`)
+SELECT la.leave_id, la.user_id, u.department_id, la.leave_type, la.leave_status, la.applied_on,
+       DATE(la.applied_on), DATE_FORMAT(la.applied_on, '%Y-%m'), la.start_date, la.end_date,
+       DATE_FORMAT(la.start_date, '%Y-%m'), DATEDIFF(la.end_date, la.start_date) + 1
+FROM `leave_application` la
+LEFT JOIN `users_master` u ON la.user_id = u.user_id;
+
+INSERT INTO `leave_summary_monthly` (`applied_month`, `department_id`, `leave_type`, `leave_status`, `leave_count`, `total_days`)
+SELECT applied_month, COALESCE(department_id, 0), COALESCE(leave_type, ''), leave_status, COUNT(*), SUM(duration_days)
+FROM `leave_fact`
+GROUP BY applied_month, COALESCE(department_id, 0), COALESCE(leave_type, ''), leave_status;
 COMMIT;
 
 /*!40101 SET CHARACTER_SET_CLIENT=@OLD_CHARACTER_SET_CLIENT */;
@@ -98,8 +98,48 @@ document.addEventListener('DOMContentLoaded', function() {
                 }, 300);
             }
             
+            // One key per application: resubmitting after a timeout or network error
+            // returns the application the server already created instead of a duplicate
+            let idempotencyKey = null;
+            
+            function newIdempotencyKey() {
+                if (window.crypto && crypto.randomUUID) {
+                    return crypto.randomUUID();
+                }
+                return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            }
+            
+            async function submitApplication(leaveType, startDate, endDate, reason) {
+                if (!idempotencyKey) {
+                    idempotencyKey = newIdempotencyKey();
+                }
+                const response = await fetch('/api/leave-applications', {
+                    method: 'POST',
+                    credentials: 'include',
+                    headers: {
+                        'Content-Type': 'application/json',
+                        'Idempotency-Key': idempotencyKey
+                    },
+                    body: JSON.stringify({
+                        leave_type: leaveType,
+                        start_date: startDate,
+                        end_date: endDate,
+                        reason: reason
+                    })
+                });
+                const data = await response.json();
+                // Only a definite answer ends this application's key; on 5xx the retry reuses it
+                if (response.status < 500) {
+                    idempotencyKey = null;
+                }
+                if (!response.ok || !data.success) {
+                    throw new Error(data.message || `HTTP ${response.status}`);
+                }
+                return data.application;
+            }
+            
             // Form submission
-            document.getElementById('leaveForm').addEventListener('submit', function(e) {
+            document.getElementById('leaveForm').addEventListener('submit', async function(e) {
                 e.preventDefault();
                 
                 // Validate form
@@ -118,6 +158,18 @@ document.addEventListener('DOMContentLoaded', function() {
                     return;
                 }
                 
+                const submitButton = this.querySelector('button[type="submit"]');
+                if (submitButton) submitButton.disabled = true;
+                let application;
+                try {
+                    application = await submitApplication(leaveType, startDate, endDate, reason);
+                } catch (error) {
+                    showToast('Error', error.message, 'error');
+                    return;
+                } finally {
+                    if (submitButton) submitButton.disabled = false;
+                }
+                
                 // Create and show custom popup
                 const popup = document.createElement('div');
                 popup.className = 'custom-popup';
@@ -128,6 +180,7 @@ document.addEventListener('DOMContentLoaded', function() {
                         </div>
                         <h3>Application Submitted</h3>
                         <p>Your leave application for <strong>${leaveType}</strong> has been submitted successfully!</p>
+                        <p>${application.working_days} working day(s) reserved, awaiting approval.</p>
                         <button class="popup-close-btn">OK</button>
                     </div>
                 `;